@@ -0,0 +1,192 @@
+from collections import OrderedDict
+from typing import Callable, Hashable, List, NamedTuple, Optional, Tuple
+import numpy as np
+import pygame
+from profiler import PROFILER
+
+# Alpha mask (rows x columns) and where its top left corner sits relative to
+# the pen position the glyph is drawn at
+GlyphMask = Tuple[np.ndarray, int, int]
+
+
+class AtlasEntry(NamedTuple):
+    page: int
+    rect: pygame.Rect
+    offsetX: int
+    offsetY: int
+
+
+class Shelf:
+    y: int
+    height: int
+    x: int
+
+    def __init__(self, y: int, height: int) -> None:
+        self.y = y
+        self.height = height
+        self.x = 0
+
+
+class GlyphAtlas:
+    pageSize: int
+    maxPages: int
+    padding: int
+    pages: List[pygame.Surface]
+    shelves: List[List[Shelf]]
+    pageKeys: List[List[Hashable]]
+    pageLastUse: List[int]
+    entries: "OrderedDict[Hashable, AtlasEntry]"
+    clock: int
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(
+        self, pageSize: int = 1024, maxPages: int = 4, padding: int = 1
+    ) -> None:
+        self.pageSize = pageSize
+        self.maxPages = maxPages
+        self.padding = padding
+        self.pages = []
+        self.shelves = []
+        self.pageKeys = []
+        self.pageLastUse = []
+        self.entries = OrderedDict()
+        self.clock = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def newPage(self) -> int:
+        page = pygame.Surface((self.pageSize, self.pageSize), pygame.SRCALPHA)
+        page.fill((0, 0, 0, 0))
+        self.pages.append(page)
+        self.shelves.append([])
+        self.pageKeys.append([])
+        self.pageLastUse.append(self.clock)
+        return len(self.pages) - 1
+
+    def evictPage(self) -> int:
+        # Whole pages are recycled, shelves can't free single rectangles
+        page = min(range(len(self.pages)), key=lambda i: self.pageLastUse[i])
+        for key in self.pageKeys[page]:
+            del self.entries[key]
+        self.evictions += len(self.pageKeys[page])
+        self.pages[page].fill((0, 0, 0, 0))
+        self.shelves[page] = []
+        self.pageKeys[page] = []
+        return page
+
+    def allocateOnPage(
+        self, page: int, width: int, height: int
+    ) -> Optional[pygame.Rect]:
+        shelves = self.shelves[page]
+        for shelf in shelves:
+            if height <= shelf.height and shelf.x + width <= self.pageSize:
+                rect = pygame.Rect(shelf.x, shelf.y, width, height)
+                shelf.x += width
+                return rect
+
+        top = shelves[-1].y + shelves[-1].height if shelves else 0
+        if top + height > self.pageSize or width > self.pageSize:
+            return None
+        shelf = Shelf(top, height)
+        shelves.append(shelf)
+        shelf.x = width
+        return pygame.Rect(0, top, width, height)
+
+    def allocate(self, width: int, height: int) -> Optional[Tuple[int, pygame.Rect]]:
+        if width > self.pageSize or height > self.pageSize:
+            return None
+        for page in range(len(self.pages)):
+            rect = self.allocateOnPage(page, width, height)
+            if rect:
+                return page, rect
+        page = self.newPage() if len(self.pages) < self.maxPages else self.evictPage()
+        rect = self.allocateOnPage(page, width, height)
+        return (page, rect) if rect else None
+
+    def insert(
+        self, key: Hashable, glyphMask: GlyphMask, color
+    ) -> Optional[AtlasEntry]:
+        mask, offsetX, offsetY = glyphMask
+        height, width = mask.shape
+        if mask.size == 0:
+            # Blank glyphs (eg. space) are remembered but take no room
+            entry = AtlasEntry(
+                page=-1, rect=pygame.Rect(0, 0, 0, 0), offsetX=0, offsetY=0
+            )
+            self.entries[key] = entry
+            return entry
+
+        slot = self.allocate(width + self.padding, height + self.padding)
+        if slot is None:
+            return None
+
+        page, rect = slot
+        rect = pygame.Rect(rect.x, rect.y, width, height)
+        region = self.pages[page].subsurface(rect)
+        region.fill(tuple(color[:3]) + (0,))
+        pygame.surfarray.pixels_alpha(region)[...] = mask.T
+
+        entry = AtlasEntry(page=page, rect=rect, offsetX=offsetX, offsetY=offsetY)
+        self.entries[key] = entry
+        self.pageKeys[page].append(key)
+        self.pageLastUse[page] = self.clock
+        return entry
+
+    def lookup(self, key: Hashable) -> Optional[AtlasEntry]:
+        entry = self.entries.get(key)
+        self.clock += 1
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if entry.page >= 0:
+            self.pageLastUse[entry.page] = self.clock
+        return entry
+
+    def draw(
+        self,
+        screen: pygame.Surface,
+        key: Hashable,
+        loc: Tuple[float, float],
+        color,
+        rasterize: Callable[[], GlyphMask],
+    ) -> None:
+        entry = self.lookup(key)
+        if PROFILER.enabled:
+            PROFILER.count("atlas.misses" if entry is None else "atlas.hits")
+        if entry is None:
+            glyphMask = rasterize()
+            entry = self.insert(key, glyphMask, color)
+            if entry is None:
+                # Too big for a page, draw it without caching
+                drawMask(screen, glyphMask, loc, color)
+                return
+        if entry.page < 0:
+            return
+
+        screen.blit(
+            self.pages[entry.page],
+            (round(loc[0]) + entry.offsetX, round(loc[1]) + entry.offsetY),
+            area=entry.rect,
+        )
+        if PROFILER.enabled:
+            PROFILER.count("pixels.drawn", entry.rect.width * entry.rect.height)
+
+
+def drawMask(
+    screen: pygame.Surface, glyphMask: GlyphMask, loc: Tuple[float, float], color
+) -> None:
+    mask, offsetX, offsetY = glyphMask
+    height, width = mask.shape
+    surface = pygame.Surface((width, height), pygame.SRCALPHA)
+    surface.fill(tuple(color[:3]) + (0,))
+    pygame.surfarray.pixels_alpha(surface)[...] = mask.T
+    screen.blit(surface, (round(loc[0]) + offsetX, round(loc[1]) + offsetY))
+    if PROFILER.enabled:
+        PROFILER.count("pixels.drawn", width * height)
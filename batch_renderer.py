@@ -0,0 +1,210 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+import argparse
+import io
+import threading
+import time
+import numpy as np
+import pygame
+from atlas import GlyphMask
+from font import Font
+from styles import Colors
+
+Color = Tuple[int, ...]
+
+
+class BatchResult(NamedTuple):
+    files: List[Path]
+    seconds: float
+
+    @property
+    def stringsPerSecond(self) -> float:
+        return len(self.files) / self.seconds if self.seconds > 0 else float("inf")
+
+
+class BatchRenderer:
+    font: Font
+    fontSize: float
+    quarterPixels: int
+    letterSpacing: float
+    color: Color
+    background: Optional[Color]
+    padding: int
+    masks: Dict[Tuple[int, int], GlyphMask]
+    lock: threading.Lock
+
+    def __init__(
+        self,
+        font: Font,
+        fontSize=0.05,
+        letterSpacing=0.0,
+        color: Color = Colors.Text.value,
+        background: Optional[Color] = None,
+        padding: int = 2,
+    ) -> None:
+        self.font = font
+        # Same quarter pixel snapping as Font.drawGlyf
+        unitsPerEm = font.headTable.unitsPerEm
+        self.quarterPixels = round(fontSize * unitsPerEm * 4)
+        self.fontSize = self.quarterPixels / (unitsPerEm * 4)
+        self.letterSpacing = letterSpacing
+        self.color = color
+        self.background = background
+        self.padding = padding
+        self.masks = {}
+        self.lock = threading.Lock()
+
+    def glyphMask(self, glyphId: int) -> GlyphMask:
+        key = (glyphId, self.quarterPixels)
+        glyphMask = self.masks.get(key)
+        if glyphMask is None:
+            # The font's reader and glyph cache are shared and stateful, only
+            # the rasterization runs concurrently
+            with self.lock:
+                glyph = self.font.instanceGlyph(glyphId)
+            glyphMask = glyph.rasterize(self.fontSize)
+            self.masks[key] = glyphMask
+        return glyphMask
+
+    def renderMask(self, message: str) -> np.ndarray:
+        # Alpha of the whole string, cropped to the ink plus padding
+        placed = []
+        for glyphId, x in self.font.layoutString(
+            message, self.fontSize, self.letterSpacing
+        ):
+            mask, offsetX, offsetY = self.glyphMask(glyphId)
+            if mask.size:
+                placed.append((mask, round(x) + offsetX, offsetY))
+        return composeMasks(placed, self.padding)
+
+    def renderImage(self, message: str) -> np.ndarray:
+        return colorize(self.renderMask(message), self.color, self.background)
+
+    def renderFile(self, message: str, path: Path) -> Path:
+        path.write_bytes(pngBytes(self.renderImage(message)))
+        return path
+
+    def renderAll(
+        self, messages: Sequence[str], outputDir: str, workers: Optional[int] = None
+    ) -> BatchResult:
+        directory = Path(outputDir)
+        directory.mkdir(parents=True, exist_ok=True)
+        digits = max(5, len(str(len(messages))))
+        paths = [
+            directory / f"{index:0{digits}d}.png" for index in range(len(messages))
+        ]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            files = list(executor.map(self.renderFile, messages, paths))
+        return BatchResult(files=files, seconds=time.perf_counter() - start)
+
+
+def composeMasks(
+    placed: Sequence[Tuple[np.ndarray, int, int]], padding: int
+) -> np.ndarray:
+    # (mask, x, y) of every glyph merged into one alpha canvas, cropped to
+    # the ink plus padding
+    if not placed:
+        return np.zeros((2 * padding, 2 * padding), dtype=np.uint8)
+
+    left = min(x for _, x, _ in placed)
+    top = min(y for _, _, y in placed)
+    right = max(x + mask.shape[1] for mask, x, _ in placed)
+    bottom = max(y + mask.shape[0] for mask, _, y in placed)
+    canvas = np.zeros(
+        (bottom - top + 2 * padding, right - left + 2 * padding), dtype=np.uint8
+    )
+    for mask, x, y in placed:
+        height, width = mask.shape
+        row, column = y - top + padding, x - left + padding
+        region = canvas[row : row + height, column : column + width]
+        # Overlapping glyphs keep the stronger coverage
+        np.maximum(region, mask, out=region)
+    return canvas
+
+
+def colorize(
+    alpha: np.ndarray, color: Color, background: Optional[Color]
+) -> np.ndarray:
+    # rows x columns x RGBA, transparent unless a background is given
+    image = np.empty(alpha.shape + (4,), dtype=np.uint8)
+    image[..., :3] = color[:3]
+    if background is None:
+        image[..., 3] = alpha
+        return image
+
+    coverage = alpha[..., None] / 255
+    backgroundColor = np.array(background[:3], dtype=np.float64)
+    foreground = np.array(color[:3], dtype=np.float64)
+    image[..., :3] = np.round(
+        backgroundColor + (foreground - backgroundColor) * coverage
+    )
+    image[..., 3] = 255
+    return image
+
+
+def pngBytes(image: np.ndarray) -> bytes:
+    height, width = image.shape[:2]
+    surface = pygame.image.frombuffer(image.tobytes(), (width, height), "RGBA")
+    output = io.BytesIO()
+    pygame.image.save(surface, output, "png")
+    return output.getvalue()
+
+
+def parseColor(value: str) -> Color:
+    # "#rrggbb", "#rrggbbaa" or the name of one of the theme colors
+    for color in Colors:
+        if color.name.lower() == value.lower():
+            return color.value
+    digits = value.lstrip("#")
+    if len(digits) not in (6, 8):
+        raise argparse.ArgumentTypeError(f"not a color: {value}")
+    try:
+        return tuple(int(digits[i : i + 2], 16) for i in range(0, len(digits), 2))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a color: {value}")
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Render strings to PNG files without a window"
+    )
+    parser.add_argument("font", help="path to a .ttf file")
+    parser.add_argument("output", help="directory the PNG files are written to")
+    parser.add_argument("strings", nargs="*", help="strings to render")
+    parser.add_argument("-f", "--file", help="read strings from a file, one per line")
+    parser.add_argument("-s", "--size", type=float, default=48, help="pixels per em")
+    parser.add_argument("--spacing", type=float, default=0.0, help="letter spacing")
+    parser.add_argument("--color", type=parseColor, default=Colors.Text.value)
+    parser.add_argument("--background", type=parseColor, default=None)
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument(
+        "--cache", action="store_true", help="use the precompiled font cache"
+    )
+    args = parser.parse_args(arguments)
+
+    messages = list(args.strings)
+    if args.file:
+        messages += Path(args.file).read_text(encoding="utf-8").splitlines()
+    if not messages:
+        parser.error("no strings to render")
+
+    font = Font(args.font, cache=args.cache)
+    renderer = BatchRenderer(
+        font,
+        fontSize=args.size / font.headTable.unitsPerEm,
+        letterSpacing=args.spacing,
+        color=args.color,
+        background=args.background,
+    )
+    result = renderer.renderAll(messages, args.output, workers=args.workers)
+    print(
+        f"rendered {len(result.files)} strings in {result.seconds:.3f}s "
+        f"({result.stringsPerSecond:.1f} strings/s) to {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# Measures eager loading of a font collection with different worker counts.
+# Run from the repository root: python -m benchmarks.collection
+from pathlib import Path
+from typing import Callable
+import os
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from font_collection import FontCollection
+
+ASSETS = sorted(Path("assets").glob("*.ttf"))
+REPEATS = 3
+# Every asset is loaded this many times to get a collection worth spreading
+COPIES = 4
+
+
+def bestOf(fn: Callable[[], object], repeats: int = REPEATS) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    files = [str(file) for file in ASSETS] * COPIES
+    cores = os.cpu_count() or 1
+    workerCounts = sorted({1, 2, cores, max(cores, 4)})
+    print(f"{len(files)} fonts, {cores} cores   (ms, eager load of every glyph)")
+    print(f"{'workers':<10}{'time':>10}{'speedup':>10}")
+    serial = None
+    for workers in workerCounts:
+        elapsed = bestOf(lambda: FontCollection.fromFiles(files, workers=workers))
+        serial = serial or elapsed
+        print(f"{workers:<10}{elapsed * 1000:>10.2f}{serial / elapsed:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
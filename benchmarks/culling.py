@@ -0,0 +1,110 @@
+# Lays out documents of growing length and times viewport culling, hit tests
+# and drawing one screen of them, with the spatial index and by testing every
+# glyph box. Indexed costs should stay flat as the document grows.
+# Run from the repository root: python -m benchmarks.culling
+from typing import Callable, List, Tuple
+import os
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+from font import Font
+from spatial import SpatialIndex
+
+FONT = "assets/Roboto-Regular.ttf"
+FONT_SIZE = 0.01
+VIEWPORT = (1000, 650)
+LINE_HEIGHT = 28
+DOCUMENT_LINES = (100, 1000, 10000, 30000)
+SCROLL_STEPS = 50
+REPEATS = 3
+PARAGRAPH = (
+    "The quick brown fox jumps over the lazy dog. Pack my box with five dozen "
+    "liquor jugs! How vexingly quick daft zebras jump, 0123456789. "
+)
+
+
+def bestOf(fn: Callable[[], object], repeats: int = REPEATS) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def layoutDocument(font: Font, lines: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # (glyphIds, locs, boxes) of every glyph of a document wrapped to the
+    # viewport width, one run per line
+    text = PARAGRAPH * (lines * 2)
+    wrapped = font.layoutParagraph(text, VIEWPORT[0] - 20, FONT_SIZE)[:lines]
+    glyphIds: List[np.ndarray] = []
+    locs: List[np.ndarray] = []
+    boxes: List[np.ndarray] = []
+    runs = {}
+    for row, line in enumerate(wrapped):
+        # Lines repeat, so do their runs
+        if line.text not in runs:
+            runs[line.text] = font.layoutRun(line.text, FONT_SIZE)
+        run = runs[line.text]
+        y = row * LINE_HEIGHT - 280
+        glyphIds.append(run.glyphIds)
+        locs.append(np.stack((run.xs + 10, np.full(len(run.xs), y)), axis=1))
+        inked = (run.boxes[:, 2] > run.boxes[:, 0])[:, None]
+        boxes.append(run.boxes + np.where(inked, (10, y, 10, y), 0))
+    return np.concatenate(glyphIds), np.concatenate(locs), np.concatenate(boxes)
+
+
+def overlapping(
+    boxes: np.ndarray, left: float, top: float, right: float, bottom: float
+):
+    return np.flatnonzero(
+        (boxes[:, 0] < right)
+        & (boxes[:, 2] > left)
+        & (boxes[:, 1] < bottom)
+        & (boxes[:, 3] > top)
+    )
+
+
+def main() -> None:
+    font = Font(FONT)
+    screen = pygame.Surface(VIEWPORT)
+    print(
+        f"{'lines':>7}{'glyphs':>9}{'build ms':>10}{'cull us':>10}{'scan us':>10}"
+        f"{'hit us':>9}{'visible':>9}{'frame ms':>10}"
+    )
+    for lines in DOCUMENT_LINES:
+        glyphIds, locs, boxes = layoutDocument(font, lines)
+        index = SpatialIndex(boxes)
+        height = lines * LINE_HEIGHT
+        scrolls = np.linspace(0, max(height - VIEWPORT[1], 0), SCROLL_STEPS).tolist()
+        viewports = [(0, top, VIEWPORT[0], top + VIEWPORT[1]) for top in scrolls]
+        points = [(VIEWPORT[0] / 2, top + VIEWPORT[1] / 2) for top in scrolls]
+
+        build = bestOf(lambda: SpatialIndex(boxes))
+        cull = bestOf(lambda: [index.query(*viewport) for viewport in viewports])
+        scan = bestOf(lambda: [overlapping(boxes, *viewport) for viewport in viewports])
+        hit = bestOf(lambda: [index.queryPoint(*point) for point in points])
+        visible = index.query(*viewports[-1])
+
+        def drawFrame() -> None:
+            # The last screen of the document, only its glyphs are touched
+            screen.fill((0, 0, 0))
+            scrollY = viewports[-1][1]
+            for found in index.query(*viewports[-1]).tolist():
+                x, y = locs[found]
+                font.drawGlyf(screen, int(glyphIds[found]), (x, y - scrollY), FONT_SIZE)
+
+        drawFrame()
+        frame = bestOf(drawFrame)
+        print(
+            f"{lines:>7}{len(boxes):>9}{build * 1000:>10.2f}"
+            f"{cull / SCROLL_STEPS * 1e6:>10.1f}{scan / SCROLL_STEPS * 1e6:>10.1f}"
+            f"{hit / SCROLL_STEPS * 1e6:>9.1f}{len(visible):>9}{frame * 1000:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Routes mixed script text through a fallback chain of every bundled font,
+# with the merged coverage index and by trying each font's cmap in turn.
+# Run from the repository root: python -m benchmarks.fallback
+from typing import Callable, List
+import os
+import random
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+from fallback import FontChain
+
+FILES = [
+    "assets/Montserrat-Regular.ttf",
+    "assets/Roboto-Regular.ttf",
+    "assets/Poppins-Regular.ttf",
+]
+# Latin, Greek, Cyrillic, Devanagari and CJK that no font covers
+SCRIPTS = (
+    (0x41, 0x7A),
+    (0x3B1, 0x3C9),
+    (0x430, 0x44F),
+    (0x915, 0x939),
+    (0x4E00, 0x4E2F),
+)
+LENGTHS = (100, 10000, 1000000)
+REPEATS = 3
+
+
+def bestOf(fn: Callable[[], object], repeats: int = REPEATS) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def mixedText(length: int, seed: int = 0) -> str:
+    # Words of a few characters, each from one script
+    generator = random.Random(seed)
+    characters: List[str] = []
+    while len(characters) < length:
+        first, last = generator.choice(SCRIPTS)
+        characters += [
+            chr(generator.randint(first, last)) for _ in range(generator.randint(2, 8))
+        ]
+        characters.append(" ")
+    return "".join(characters[:length])
+
+
+def tryEach(chain: FontChain, message: str) -> List[int]:
+    # The first font whose cmap has the character, found by asking them all
+    fontIndices = []
+    for character in message:
+        found = -1
+        for fontIndex, font in enumerate(chain.fonts):
+            try:
+                if font.cmapTable.getGlyphId(ord(character)):
+                    found = fontIndex
+                    break
+            except KeyError:
+                pass
+        fontIndices.append(found)
+    return fontIndices
+
+
+def main() -> None:
+    start = time.perf_counter()
+    chain = FontChain.fromFiles(FILES)
+    load = time.perf_counter() - start
+    print(
+        f"{len(chain)} fonts, {len(chain.rangeStarts)} ranges, "
+        f"loaded and indexed in {load * 1000:.1f} ms"
+    )
+    print(
+        f"{'chars':>9}{'index chars/s':>16}{'try chars/s':>14}"
+        f"{'runs':>9}{'runs ms':>10}"
+    )
+    for length in LENGTHS:
+        message = mixedText(length)
+        indexed = bestOf(lambda: chain.route(message))
+        tried = bestOf(lambda: tryEach(chain, message), 1)
+        assert np.array_equal(chain.route(message), tryEach(chain, message))
+        runs = bestOf(lambda: chain.splitRuns(message))
+        print(
+            f"{length:>9}{length / indexed:>16.0f}{length / tried:>14.0f}"
+            f"{len(chain.splitRuns(message)):>9}{runs * 1000:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Measures glyph decode throughput, of the whole table at once and of glyphs
+# one at a time as a lazy font's cache misses decode them, and the memory
+# held by a fully decoded font.
+# Run from the repository root: python -m benchmarks.glyphs
+from pathlib import Path
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from font import Font
+
+ASSETS = sorted(Path("assets").glob("*.ttf"))
+REPEATS = 5
+
+
+def decodeAll(font: Font) -> int:
+    font.parseGlyphTable(font.reader)
+    return font.maxpTable.numGlyphs
+
+
+def decodeEach(file: Path) -> int:
+    # A fresh lazy font, every glyph is a cache miss
+    font = Font(str(file), glyphCacheSize=1 << 16)
+    for glyphId in range(font.maxpTable.numGlyphs):
+        font.glyphs[glyphId]
+    return font.maxpTable.numGlyphs
+
+
+def tracedSize(file: Path, lazy: bool) -> int:
+    tracemalloc.start()
+    font = Font(str(file), lazy=lazy)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del font
+    return size
+
+
+def glyphMemory(file: Path) -> int:
+    # A lazy font holds the same tables but no decoded glyphs
+    return tracedSize(file, lazy=False) - tracedSize(file, lazy=True)
+
+
+def main() -> None:
+    print(f"{'font':<28}{'glyphs':>8}{'glyphs/s':>12}{'single/s':>12}{'glyph KiB':>12}")
+    for file in ASSETS:
+        font = Font(str(file))
+        best = float("inf")
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            count = decodeAll(font)
+            best = min(best, time.perf_counter() - start)
+        single = float("inf")
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            decodeEach(file)
+            single = min(single, time.perf_counter() - start)
+        memory = glyphMemory(file)
+        print(
+            f"{file.name:<28}{count:>8}{count / best:>12.0f}{count / single:>12.0f}"
+            f"{memory / 1024:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
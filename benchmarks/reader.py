@@ -0,0 +1,51 @@
+# Compares the in-memory, memory-mapped and range readers on the bundled fonts.
+# Run from the repository root: python -m benchmarks.reader
+from pathlib import Path
+from typing import Callable, Type
+import os
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from file_reader import BinaryFileReader, MappedFileReader, RangeFileReader
+from font import Font
+
+ASSETS = sorted(Path("assets").glob("*.ttf"))
+READERS = [BinaryFileReader, MappedFileReader, RangeFileReader]
+REPEATS = 5
+
+
+def bestOf(fn: Callable[[], object], repeats: int = REPEATS) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def loadTables(file: Path, readerClass: Type[BinaryFileReader]) -> Font:
+    # Tables are parsed on first use, touch the ones text layout needs
+    font = Font(str(file), lazy=True, readerClass=readerClass)
+    font.headTable, font.maxpTable, font.cmapTable, font.locaTable, font.hmtxTable
+    return font
+
+
+def loadGlyphs(file: Path, readerClass: Type[BinaryFileReader]) -> Font:
+    return Font(str(file), lazy=False, readerClass=readerClass)
+
+
+def main() -> None:
+    print(f"{'font':<28}{'reader':<20}{'tables ms':>12}{'all glyphs ms':>16}")
+    for file in ASSETS:
+        for readerClass in READERS:
+            tables = bestOf(lambda: loadTables(file, readerClass))
+            glyphs = bestOf(lambda: loadGlyphs(file, readerClass))
+            print(
+                f"{file.name:<28}{readerClass.__name__:<20}"
+                f"{tables * 1000:>12.2f}{glyphs * 1000:>16.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# Load tests the render service with many concurrent keep alive connections
+# and reports latency percentiles and requests per second. Without an address
+# it starts a service on a free port first.
+# Run from the repository root:
+#   python -m benchmarks.service -n 2000 -c 16
+#   python -m benchmarks.service --url http://127.0.0.1:8000
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+
+ASSETS = sorted(Path("assets").glob("*.ttf"))
+SIZES = (12, 16, 24, 48, 96)
+WORDS = (
+    "The quick brown fox jumps over the lazy dog. Pack my box with five dozen "
+    "liquor jugs! How vexingly quick daft zebras jump, 0123456789."
+).split()
+# Share of render requests, the rest measure. Half of the renders are PNGs.
+RENDER_SHARE = 0.7
+
+# (method, target, body)
+Request = Tuple[str, str, bytes]
+
+
+def makeRequests(count: int, seed: int) -> List[Request]:
+    generator = random.Random(seed)
+    requests = []
+    for _ in range(count):
+        params = {
+            "font": generator.choice(ASSETS).stem,
+            "size": generator.choice(SIZES),
+            "text": " ".join(generator.choices(WORDS, k=generator.randint(1, 8))),
+        }
+        if generator.random() < RENDER_SHARE:
+            params["format"] = generator.choice(("png", "mask"))
+            requests.append(("GET", f"/render?{urlencode(params)}", b""))
+        else:
+            requests.append(("POST", "/measure", json.dumps(params).encode()))
+    return requests
+
+
+async def send(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, request: Request
+) -> int:
+    # Status of one request on an open connection, the body is read and dropped
+    method, target, body = request
+    writer.write(
+        f"{method} {target} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        field, _, value = line.decode("latin-1").partition(":")
+        if field.strip().lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def connect(address: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if address.startswith("unix:"):
+        return await asyncio.open_unix_connection(address[len("unix:") :])
+    url = urlsplit(address)
+    return await asyncio.open_connection(url.hostname, url.port or 80)
+
+
+async def worker(
+    address: str,
+    requests: List[Request],
+    latencies: List[float],
+    statuses: Dict[int, int],
+) -> None:
+    reader, writer = await connect(address)
+    try:
+        while requests:
+            request = requests.pop()
+            start = time.perf_counter()
+            status = await send(reader, writer, request)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def loadTest(
+    address: str, requests: List[Request], connections: int
+) -> Tuple[List[float], Dict[int, int], float]:
+    pending = list(reversed(requests))
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(worker(address, pending, latencies, statuses) for _ in range(connections))
+    )
+    return latencies, statuses, time.perf_counter() - start
+
+
+def startService(workers: Optional[int]) -> Tuple[subprocess.Popen, str]:
+    command = [sys.executable, "render_service.py", "assets", "--port", "0"]
+    if workers:
+        command += ["--workers", str(workers)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    # "serving <n> fonts on <address>"
+    line = process.stdout.readline()
+    if not line.startswith("serving"):
+        process.kill()
+        raise RuntimeError("The render service didn't start")
+    return process, line.split()[-1]
+
+
+def report(
+    name: str, latencies: List[float], statuses: Dict[int, int], seconds: float
+) -> None:
+    milliseconds = np.array(latencies) * 1000
+    p50, p90, p99 = np.percentile(milliseconds, [50, 90, 99]).tolist()
+    print(
+        f"{name:<8}{len(latencies):>9}{len(latencies) / seconds:>10.1f}"
+        f"{p50:>9.2f}{p90:>9.2f}{p99:>9.2f}{milliseconds.max():>9.2f}  {statuses}"
+    )
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the render service")
+    parser.add_argument(
+        "--url",
+        help="http://host:port or unix:/path of a running service, else one is started",
+    )
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("-c", "--connections", type=int, default=16)
+    parser.add_argument(
+        "--warmup", type=int, default=200, help="requests before measuring"
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None, help="service executor threads"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(arguments)
+
+    process = None
+    address = args.url
+    if not address:
+        process, address = startService(args.workers)
+    try:
+        print(f"{address}, {args.connections} connections")
+        print(
+            f"{'':<8}{'requests':>9}{'req/s':>10}"
+            f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        )
+        # The warmup starts cold, the measured requests find a warm glyph cache
+        requests = makeRequests(args.warmup + args.requests, args.seed)
+        if args.warmup:
+            warmup = requests[: args.warmup]
+            report("warmup", *asyncio.run(loadTest(address, warmup, args.connections)))
+        latencies, statuses, seconds = asyncio.run(
+            loadTest(address, requests[args.warmup :], args.connections)
+        )
+        report("measured", latencies, statuses, seconds)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+    return 0 if set(statuses) == {200} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+# Measures font startup with and without the precompiled font cache.
+# Run from the repository root: python -m benchmarks.startup
+from pathlib import Path
+from typing import Callable
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from font import Font
+
+ASSETS = sorted(Path("assets").glob("*.ttf"))
+REPEATS = 5
+# Glyphs touched after loading, roughly a screen of Latin text
+TOUCHED_GLYPHS = 100
+
+
+def bestOf(fn: Callable[[], object], repeats: int = REPEATS) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def loadAndTouch(file: Path, **options) -> Font:
+    font = Font(str(file), **options)
+    for glyphId in range(min(TOUCHED_GLYPHS, font.maxpTable.numGlyphs)):
+        font.glyphs[glyphId]
+    return font
+
+
+def main() -> None:
+    cacheDir = tempfile.mkdtemp(prefix="fontsa-bench-")
+    try:
+        print(
+            f"{'font':<28}{'no cache':>10}{'eager':>10}"
+            f"{'cold cache':>12}{'warm cache':>12}"
+            f"   (ms, load + {TOUCHED_GLYPHS} glyphs)"
+        )
+        for file in ASSETS:
+            uncached = bestOf(lambda: loadAndTouch(file))
+            eager = bestOf(lambda: loadAndTouch(file, lazy=False))
+
+            def cold() -> None:
+                shutil.rmtree(cacheDir, ignore_errors=True)
+                loadAndTouch(file, cache=True, cacheDir=cacheDir)
+
+            coldTime = bestOf(cold)
+            warmTime = bestOf(lambda: loadAndTouch(file, cache=True, cacheDir=cacheDir))
+            print(
+                f"{file.name:<28}{uncached * 1000:>10.2f}{eager * 1000:>10.2f}"
+                f"{coldTime * 1000:>12.2f}{warmTime * 1000:>12.2f}"
+            )
+    finally:
+        shutil.rmtree(cacheDir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Subsets every bundled font to a few character sets and reports the size of
+# the output and the time it took.
+# Run from the repository root: python -m benchmarks.subset
+from pathlib import Path
+from typing import Callable, Dict, List
+import os
+import tempfile
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from font import Font
+from subset import subsetFont
+
+ASSETS = sorted(Path("assets").glob("*.ttf"))
+REPEATS = 3
+CHARACTER_SETS: Dict[str, List[int]] = {
+    "digits": list(range(0x30, 0x3A)),
+    "ascii": list(range(0x20, 0x7F)),
+    "latin-1": list(range(0x20, 0x7F)) + list(range(0xA0, 0x100)),
+    "pangram": list(map(ord, "The quick brown fox jumps over the lazy dog")),
+}
+
+
+def bestOf(fn: Callable[[], object], repeats: int = REPEATS) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    print(
+        f"{'font':<24}{'set':<10}{'glyphs':>8}{'bytes':>10}{'of source':>11}{'ms':>9}"
+    )
+    total = 0.0
+    with tempfile.TemporaryDirectory(prefix="fontsa-subset-") as directory:
+        for file in ASSETS:
+            font = Font(str(file))
+            for name, codes in CHARACTER_SETS.items():
+                path = str(Path(directory) / f"{file.stem}-{name}.ttf")
+                elapsed = bestOf(lambda: subsetFont(font, codes, path))
+                result = subsetFont(font, codes, path)
+                # The output has to load again
+                subset = Font(path)
+                assert subset.maxpTable.numGlyphs == result.glyphs
+                subset.reader.close()
+                total += elapsed
+                print(
+                    f"{file.name:<24}{name:<10}{result.glyphs:>8}{result.size:>10}"
+                    f"{result.size / result.sourceSize:>11.1%}{elapsed * 1000:>9.2f}"
+                )
+            font.reader.close()
+    print(
+        f"\nall {len(ASSETS)} fonts and {len(CHARACTER_SETS)} sets: "
+        f"{total * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+# Times every stage from table parsing to drawing on the bundled fonts and on
+# large synthetic fonts, and writes the results as JSON so runs can be compared.
+# Run from the repository root:
+#   python -m benchmarks.suite --output results.json
+#   python -m benchmarks.suite --output new.json --compare results.json
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+from benchmarks.synthetic import synthesizeFont
+from font import Font
+from glyph import SimpleGlyph
+from outlines import svgPaths
+from sdf import SdfAtlas
+
+ASSETS = sorted(Path("assets").glob("*.ttf"))
+SYNTHETIC_SOURCE = Path("assets/Roboto-Regular.ttf")
+SYNTHETIC_SIZES = {"synthetic-16k": 16384, "synthetic-64k": 65535}
+REPEATS = 5
+FONT_SIZE = 0.05
+FRAME_SIZE = (1000, 650)
+FRAME_GLYPHS = 100
+MAX_LOOKUPS = 20000
+PARAGRAPH = (
+    "The quick brown fox jumps over the lazy dog. Pack my box with five dozen "
+    "liquor jugs! How vexingly quick daft zebras jump, 0123456789."
+)
+SCHEMA_VERSION = 1
+
+# Stage name -> {"value": number, "unit": "ms" or "<things>/s"}
+Results = Dict[str, Dict[str, object]]
+
+
+def bestOf(fn: Callable[[], object], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def milliseconds(fn: Callable[[], object], repeats: int) -> Dict[str, object]:
+    return {"value": bestOf(fn, repeats) * 1000, "unit": "ms"}
+
+
+def throughput(
+    fn: Callable[[], object], count: int, unit: str, repeats: int
+) -> Dict[str, object]:
+    return {"value": count / bestOf(fn, repeats), "unit": f"{unit}/s"}
+
+
+def lowerIsBetter(result: Dict[str, object]) -> bool:
+    return result["unit"] == "ms"
+
+
+def glyphLocations(font: Font) -> Tuple[List[Tuple[int, int]], List[int]]:
+    # ((location, numberOfContours) of simple glyphs, locations of compounds)
+    simple: List[Tuple[int, int]] = []
+    compound: List[int] = []
+    glyfOffset = font.gotoTable("glyf", font.reader).offset
+    for glyphId in range(font.maxpTable.numGlyphs):
+        if font.locaTable[glyphId + 1] == font.locaTable[glyphId]:
+            continue
+        location = glyfOffset + font.locaTable[glyphId]
+        font.reader.goto(location)
+        numberOfContours = font.reader.parseInt16()
+        if numberOfContours > 0:
+            simple.append((location, numberOfContours))
+        elif numberOfContours < 0:
+            compound.append(location)
+    return simple, compound
+
+
+def mappedCodes(font: Font) -> List[int]:
+    codes = np.concatenate(
+        [
+            np.arange(start, end + 1)
+            for start, end in zip(font.cmapTable.startCodes, font.cmapTable.endCodes)
+            if start != 0xFFFF
+        ]
+    )
+    step = max(1, len(codes) // MAX_LOOKUPS)
+    return codes[::step].tolist()
+
+
+def benchmarkFont(file: Path, repeats: int) -> Results:
+    results: Results = {}
+    font = Font(str(file))
+    reader = font.reader
+
+    results["parse.head"] = milliseconds(lambda: font.parseHeadTable(reader), repeats)
+    results["parse.maxp"] = milliseconds(lambda: font.parseMaxpTable(reader), repeats)
+    results["parse.cmap"] = milliseconds(lambda: font.parseCmapTable(reader), repeats)
+    results["parse.loca"] = milliseconds(lambda: font.parseLocaTable(reader), repeats)
+    results["parse.hmtx"] = milliseconds(lambda: font.parseHmtxtable(reader), repeats)
+    results["parse.glyf"] = milliseconds(lambda: font.parseGlyphTable(reader), repeats)
+
+    simple, compound = glyphLocations(font)
+
+    def decodeSimple() -> None:
+        for location, numberOfContours in simple:
+            reader.goto(location + 2)
+            SimpleGlyph.fromReader(reader, numberOfContours)
+
+    def resolveCompounds() -> None:
+        for location in compound:
+            reader.goto(location + 2)
+            font.parseCompoundGlyph(reader)
+
+    results["glyph.fromReader"] = throughput(
+        decodeSimple, len(simple), "glyphs", repeats
+    )
+    if compound:
+        results["glyph.compound"] = throughput(
+            resolveCompounds, len(compound), "glyphs", repeats
+        )
+
+    # Every outline packed into flat arrays, then written as SVG paths
+    numGlyphs = font.maxpTable.numGlyphs
+    results["export.outlines"] = throughput(
+        font.exportOutlines, numGlyphs, "glyphs", repeats
+    )
+    outlines = font.exportOutlines()
+    results["export.svg"] = throughput(
+        lambda: svgPaths(outlines), numGlyphs, "glyphs", repeats
+    )
+
+    codes = mappedCodes(font)
+    cmapTable = font.cmapTable
+
+    def lookupEach() -> None:
+        for code in codes:
+            cmapTable.getGlyphId(code)
+
+    results["cmap.lookup"] = throughput(lookupEach, len(codes), "lookups", repeats)
+    results["cmap.batchLookup"] = throughput(
+        lambda: cmapTable.getGlyphIds(codes), len(codes), "lookups", repeats
+    )
+
+    results["layout.string"] = throughput(
+        lambda: font.layoutString(PARAGRAPH, FONT_SIZE),
+        len(PARAGRAPH),
+        "chars",
+        repeats,
+    )
+    text = " ".join([PARAGRAPH] * 100)
+    results["layout.paragraph"] = throughput(
+        lambda: font.layoutParagraph(text, 800, FONT_SIZE), len(text), "chars", repeats
+    )
+    screen = pygame.Surface(FRAME_SIZE)
+    printString = lambda: font.printString(screen, PARAGRAPH, fontSize=FONT_SIZE)
+    printString()
+    results["render.printString"] = milliseconds(printString, repeats)
+
+    drawn = [glyph for glyph in font.glyphs if glyph.numberOfContours > 0][
+        :FRAME_GLYPHS
+    ]
+
+    def drawFrame() -> None:
+        screen.fill((0, 0, 0))
+        for index, glyph in enumerate(drawn):
+            glyph.draw(screen, (index % 10 * 90, index // 10 * 60 - 250), FONT_SIZE)
+
+    drawFrame()
+    results["draw.frame"] = milliseconds(drawFrame, repeats)
+
+    # Masks of the same glyphs from their outlines and from distance fields
+    unitsPerEm = font.headTable.unitsPerEm
+    sdfAtlas = SdfAtlas.build(drawn, unitsPerEm)
+    rasterizeOutlines = lambda: [glyph.rasterize(FONT_SIZE) for glyph in drawn]
+    renderFields = lambda: [
+        sdfAtlas.render(index, FONT_SIZE) for index in range(len(drawn))
+    ]
+    results["glyph.rasterize"] = throughput(
+        rasterizeOutlines, len(drawn), "glyphs", repeats
+    )
+    results["sdf.build"] = throughput(
+        lambda: SdfAtlas.build(drawn, unitsPerEm), len(drawn), "glyphs", repeats
+    )
+    results["sdf.render"] = throughput(renderFields, len(drawn), "glyphs", repeats)
+    reader.close()
+    return results
+
+
+def gitRevision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(repeats: int) -> Dict[str, object]:
+    return {
+        "schema": SCHEMA_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": gitRevision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeats": repeats,
+    }
+
+
+def printResults(name: str, results: Results) -> None:
+    print(name)
+    for stage, result in results.items():
+        print(f"  {stage:<22}{result['value']:>14.2f} {result['unit']}")
+
+
+def compare(old: Dict, new: Dict, threshold: float) -> List[str]:
+    # Stages that got slower by more than threshold, as printable lines
+    regressions: List[str] = []
+    print(f"\n{'font':<24}{'stage':<22}{'old':>12}{'new':>12}{'change':>9}")
+    for font, results in new["results"].items():
+        for stage, result in results.items():
+            previous = old["results"].get(font, {}).get(stage)
+            if previous is None or previous["unit"] != result["unit"]:
+                continue
+            ratio = result["value"] / previous["value"] if previous["value"] else 1.0
+            slowdown = ratio - 1 if lowerIsBetter(result) else 1 / ratio - 1
+            marker = "  <-- slower" if slowdown > threshold else ""
+            line = (
+                f"{font:<24}{stage:<22}{previous['value']:>12.2f}"
+                f"{result['value']:>12.2f}{(ratio - 1) * 100:>+8.1f}%{marker}"
+            )
+            print(line)
+            if marker:
+                regressions.append(line)
+    return regressions
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark every stage of fontsa")
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("-c", "--compare", help="JSON results of an earlier run")
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown reported as a regression (default 0.1)",
+    )
+    parser.add_argument("-r", "--repeats", type=int, default=REPEATS)
+    parser.add_argument(
+        "--no-synthetic", action="store_true", help="only run the bundled fonts"
+    )
+    args = parser.parse_args(arguments)
+
+    report = {"meta": metadata(args.repeats), "results": {}}
+    with tempfile.TemporaryDirectory(prefix="fontsa-bench-") as directory:
+        fonts = [(file.name, file) for file in ASSETS]
+        if not args.no_synthetic:
+            for name, numGlyphs in SYNTHETIC_SIZES.items():
+                path = Path(directory) / f"{name}.ttf"
+                fonts.append(
+                    (name, synthesizeFont(str(SYNTHETIC_SOURCE), str(path), numGlyphs))
+                )
+
+        for name, file in fonts:
+            results = benchmarkFont(file, args.repeats)
+            report["results"][name] = results
+            printResults(name, results)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    if args.compare:
+        old = json.loads(Path(args.compare).read_text())
+        regressions = compare(old, report, args.threshold)
+        if regressions:
+            print(
+                f"\n{len(regressions)} stages regressed by more than "
+                f"{args.threshold:.0%}"
+            )
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
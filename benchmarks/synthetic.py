@@ -0,0 +1,57 @@
+# Builds large synthetic fonts for the benchmarks by repeating the outlines of
+# a real font until the requested glyph count is reached.
+from pathlib import Path
+from typing import Dict
+from font import Font
+from font_writer import (
+    HEAD_INDEX_TO_LOC_FORMAT,
+    HHEA_NUMBER_OF_HMETRICS,
+    MAXP_NUM_GLYPHS,
+    buildCmap,
+    buildGlyf,
+    buildHmtx,
+    setField,
+    writeFont,
+)
+
+# First code point of the synthetic glyphs, past the BMP so that the font
+# also gets a format 12 cmap
+FIRST_CODE = 0x10000
+
+
+def synthesizeFont(source: str, path: str, numGlyphs: int) -> Path:
+    # Glyph i is a copy of source glyph i % sourceGlyphs, compound glyphs keep
+    # pointing at components in the first copy
+    font = Font(source)
+    sourceGlyphs = font.maxpTable.numGlyphs
+    sourceData = [font.glyphData(glyphId) for glyphId in range(sourceGlyphs)]
+    sourceMetrics = [
+        tuple(font.hmtxTable.getMetric(glyphId)) for glyphId in range(sourceGlyphs)
+    ]
+
+    glyphData = [sourceData[glyphId % sourceGlyphs] for glyphId in range(numGlyphs)]
+    metrics = [sourceMetrics[glyphId % sourceGlyphs] for glyphId in range(numGlyphs)]
+    loca, glyf, indexToLocFormat = buildGlyf(glyphData)
+    hmtx, numberOfHMetrics = buildHmtx(metrics)
+
+    mapping: Dict[int, int] = {
+        code: glyphId for code, glyphId in zip(range(0x20, 0x7F), range(1, numGlyphs))
+    }
+    mapping.update((FIRST_CODE + glyphId, glyphId) for glyphId in range(1, numGlyphs))
+
+    tables = {
+        "head": setField(
+            font.tableData("head"), HEAD_INDEX_TO_LOC_FORMAT, ">h", indexToLocFormat
+        ),
+        "hhea": setField(
+            font.tableData("hhea"), HHEA_NUMBER_OF_HMETRICS, ">H", numberOfHMetrics
+        ),
+        "maxp": setField(font.tableData("maxp"), MAXP_NUM_GLYPHS, ">H", numGlyphs),
+        "cmap": buildCmap(mapping),
+        "loca": loca,
+        "glyf": glyf,
+        "hmtx": hmtx,
+    }
+    font.reader.close()
+    writeFont(path, tables)
+    return Path(path)
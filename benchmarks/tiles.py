@@ -0,0 +1,96 @@
+# Renders full pages of text with the tile renderer on a growing number of
+# worker processes, next to drawing every glyph on one thread with
+# Font.drawGlyf. Pages are laid out once, only rasterization is timed.
+# Run from the repository root: python -m benchmarks.tiles
+from typing import Callable, List, Optional
+import argparse
+import os
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+from atlas import GlyphAtlas
+from font import Font
+from tile_renderer import TileRenderer
+
+FONT = "assets/Roboto-Regular.ttf"
+PAGE_WIDTH = 1600
+# (pixels per em, characters) of a page and of a poster
+PAGES = ((14, 20000), (96, 1500))
+REPEATS = 3
+PARAGRAPH = (
+    "The quick brown fox jumps over the lazy dog. Pack my box with five dozen "
+    "liquor jugs! How vexingly quick daft zebras jump, 0123456789. "
+)
+
+
+def bestOf(fn: Callable[[], object], repeats: int = REPEATS) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def workerCounts(maxWorkers: int) -> List[int]:
+    counts = [1]
+    while counts[-1] * 2 < maxWorkers:
+        counts.append(counts[-1] * 2)
+    if maxWorkers > 1:
+        counts.append(maxWorkers)
+    return counts
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Time tile parallel page rendering")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--tile-size", type=int, default=None)
+    args = parser.parse_args(arguments)
+
+    font = Font(FONT)
+    print(f"{os.cpu_count()} cores")
+    print(f"{'px':>4}{'glyphs':>8}{'page':>11}{'mode':>12}{'ms':>10}{'speedup':>9}")
+    for pixels, characters in PAGES:
+        fontSize = pixels / font.headTable.unitsPerEm
+        text = (PARAGRAPH * (characters // len(PARAGRAPH) + 1))[:characters]
+        options = {"tileSize": args.tile_size} if args.tile_size else {}
+        page = TileRenderer(font, fontSize, workers=1, **options).layoutPage(
+            text, PAGE_WIDTH
+        )
+        size = f"{page.width}x{page.height}"
+
+        screen = pygame.Surface((page.width, page.height))
+
+        def drawPage(cold: bool) -> None:
+            # A cold atlas rasterizes each distinct glyph once, a warm one
+            # only blits
+            if cold:
+                font.atlas = GlyphAtlas()
+            screen.fill((0, 0, 0))
+            for glyphId, loc in zip(page.glyphIds.tolist(), page.locs.tolist()):
+                font.drawGlyf(screen, glyphId, loc, fontSize)
+
+        cold = bestOf(lambda: drawPage(True))
+        warm = bestOf(lambda: drawPage(False))
+        print(
+            f"{pixels:>4}{len(page.glyphIds):>8}{size:>11}"
+            f"{'cold atlas':>12}{cold * 1000:>10.1f}"
+        )
+        print(f"{'':>23}{'warm atlas':>12}{warm * 1000:>10.1f}")
+        serial = None
+        for workers in workerCounts(args.workers):
+            with TileRenderer(font, fontSize, workers=workers, **options) as renderer:
+                # Starts the pool and fills each worker's outline cache
+                renderer.renderMask(page)
+                seconds = bestOf(lambda: renderer.renderMask(page))
+            serial = serial or seconds
+            print(
+                f"{'':>23}{f'{workers} tiles':>12}{seconds * 1000:>10.1f}"
+                f"{serial / seconds:>8.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
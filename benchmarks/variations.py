@@ -0,0 +1,91 @@
+# Animates the first axis of a variable font over a line of text like the
+# Renderer does, next to decoding and varying every glyph on each frame.
+# None of the bundled fonts is variable, pass one in.
+# Run from the repository root: python -m benchmarks.variations FONT.ttf
+from typing import Callable, List, Optional
+import argparse
+import os
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+from font import Font
+from profiler import PROFILER
+
+TEXT = "The quick brown fox jumps over the lazy dog 0123456789"
+# Axis positions per sweep, as in Renderer.axisSteps
+STEPS = 48
+REPEATS = 3
+
+
+def bestOf(fn: Callable[[], object], repeats: int = REPEATS) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Time variable font instances")
+    parser.add_argument("font", help="path to a variable .ttf file")
+    parser.add_argument("-s", "--size", type=float, default=48, help="pixels per em")
+    args = parser.parse_args(arguments)
+
+    start = time.perf_counter()
+    base = Font(args.font)
+    axes = base.fvarTable.axes
+    for name in ("avarSegments", "gvarTable"):
+        getattr(base, name)
+    print(
+        f"{' '.join(axis.tag for axis in axes)} axes, "
+        f"{len(base.fvarTable.instances)} named instances, "
+        f"tables parsed in {(time.perf_counter() - start) * 1000:.1f} ms"
+    )
+    axis = axes[0]
+    fontSize = args.size / base.headTable.unitsPerEm
+    glyphIds = sorted(set(base.shapeRun(TEXT)[0].tolist()))
+    locations = [
+        {axis.tag: axis.minValue + (axis.maxValue - axis.minValue) * step / STEPS}
+        for step in range(STEPS + 1)
+    ]
+    screen = pygame.Surface((2000, 400))
+
+    def sweep() -> None:
+        # One frame per step, each laid out and drawn at its instance
+        for location in locations:
+            font = base.instance(location)
+            screen.fill((0, 0, 0))
+            font.printString(screen, TEXT, fontSize, loc=(10, 0))
+
+    def everyGlyph() -> None:
+        # Without per glyph instances a frame varies the whole glyph set
+        fresh = Font(args.font, lazy=False, instanceCacheSize=1 << 16)
+        font = fresh.instance(locations[len(locations) // 3])
+        for glyphId in range(fresh.maxpTable.numGlyphs):
+            font.instanceGlyph(glyphId)
+
+    PROFILER.enable()
+    cold = bestOf(sweep, 1)
+    built = PROFILER.calls.get("glyph.instance", 0)
+    PROFILER.reset()
+    warm = bestOf(sweep)
+    rebuilt = PROFILER.calls.get("glyph.instance", 0)
+    PROFILER.disable()
+    full = bestOf(everyGlyph, 1)
+
+    frames = len(locations)
+    print(
+        f"{len(TEXT)} characters, {len(glyphIds)} distinct glyphs, "
+        f"{frames} frames a sweep"
+    )
+    print(f"{'mode':>24}{'ms/frame':>11}{'instances':>11}")
+    print(f"{'first sweep':>24}{cold / frames * 1000:>11.2f}{built:>11}")
+    print(f"{'later sweeps':>24}{warm / frames * 1000:>11.2f}{rebuilt // REPEATS:>11}")
+    print(f"{'whole glyph set':>24}{full * 1000:>11.2f}{base.maxpTable.numGlyphs:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+from profiler import PROFILER
+
+T = TypeVar("T")
+
+
+class LRUCache(Generic[T]):
+    maxSize: int
+    hits: int
+    misses: int
+    evictions: int
+    entries: "OrderedDict[Hashable, T]"
+
+    def __init__(self, maxSize: int = 256) -> None:
+        if maxSize <= 0:
+            raise ValueError("LRUCache size must be positive")
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def get(self, key: Hashable) -> Optional[T]:
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: T) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def resetStats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+# Sequence-like view that decodes a glyph on first access and keeps the
+# most recently used ones around
+class GlyphCache(Generic[T]):
+    size: int
+    loader: Callable[[int], T]
+    cache: LRUCache[T]
+
+    def __init__(self, loader: Callable[[int], T], size: int, maxSize: int) -> None:
+        self.loader = loader
+        self.size = size
+        self.cache = LRUCache(maxSize)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, glyphId: int) -> T:
+        if glyphId < 0:
+            glyphId += self.size
+        if not 0 <= glyphId < self.size:
+            raise IndexError(f"Glyph {glyphId} out of range")
+
+        glyph = self.cache.get(glyphId)
+        if glyph is None:
+            if PROFILER.enabled:
+                PROFILER.count("glyphCache.misses")
+            glyph = self.loader(glyphId)
+            self.cache.put(glyphId, glyph)
+        elif PROFILER.enabled:
+            PROFILER.count("glyphCache.hits")
+        return glyph
+
+    def peek(self, glyphId: int) -> Optional[T]:
+        # The cached glyph if there is one, without loading or counting
+        return self.cache.entries.get(glyphId)
+
+    def store(self, glyphId: int, glyph: T) -> None:
+        self.cache.put(glyphId, glyph)
+
+    @property
+    def hits(self) -> int:
+        return self.cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self.cache.misses
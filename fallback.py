@@ -0,0 +1,137 @@
+from typing import List, NamedTuple, Sequence, Tuple
+import numpy as np
+from pygame import Surface
+from font import Font
+from styles import Colors
+
+
+class FontRun(NamedTuple):
+    # message[start:end], drawn with fonts[fontIndex] of the chain
+    fontIndex: int
+    start: int
+    end: int
+    text: str
+
+
+class FontChain:
+    # Fonts tried in order for every character. The cmap coverage of all of
+    # them is merged once into a single list of code point ranges, each with
+    # the first font that covers it, so routing a string is one binary
+    # search per character whatever the number of fonts.
+    fonts: List[Font]
+    # Ranges start at rangeStarts[i] and run up to the next start, owners[i]
+    # is the font for them, -1 where no font covers the code
+    rangeStarts: np.ndarray
+    owners: np.ndarray
+
+    def __init__(self, fonts: Sequence[Font]) -> None:
+        if not fonts:
+            raise ValueError("A font chain needs at least one font")
+        self.fonts = list(fonts)
+        coverages = [font.cmapTable.coverageRanges() for font in self.fonts]
+        rangeStarts = np.unique(
+            np.concatenate(
+                [[0]]
+                + [bound for starts, ends in coverages for bound in (starts, ends + 1)]
+            )
+        )
+        # Every font's ranges begin and end on a boundary, so a range is
+        # wholly covered by a font or not at all. Later fonts go first and
+        # earlier ones overwrite them.
+        owners = np.full(len(rangeStarts), -1, dtype=np.int64)
+        for fontIndex in reversed(range(len(coverages))):
+            starts, ends = coverages[fontIndex]
+            found = np.searchsorted(ends, rangeStarts)
+            inside = found < len(starts)
+            inside[inside] = starts[found[inside]] <= rangeStarts[inside]
+            owners[inside] = fontIndex
+        changed = np.concatenate(([True], owners[1:] != owners[:-1]))
+        self.rangeStarts = rangeStarts[changed]
+        self.owners = owners[changed]
+
+    @staticmethod
+    def fromFiles(files: Sequence[str], **options) -> "FontChain":
+        return FontChain([Font(str(file), **options) for file in files])
+
+    def __len__(self) -> int:
+        return len(self.fonts)
+
+    def route(self, message: str) -> np.ndarray:
+        # Index of the font for every character, -1 where none covers it
+        codes = np.fromiter(map(ord, message), dtype=np.int64, count=len(message))
+        return self.owners[np.searchsorted(self.rangeStarts, codes, side="right") - 1]
+
+    def splitRuns(self, message: str) -> List[FontRun]:
+        # Consecutive characters of the same font in one run. Characters no
+        # font covers go to the first one, which draws its missing glyph.
+        if not message:
+            return []
+        fontIndices = np.maximum(self.route(message), 0)
+        bounds = np.flatnonzero(np.diff(fontIndices)) + 1
+        starts = [0] + bounds.tolist()
+        ends = bounds.tolist() + [len(message)]
+        return [
+            FontRun(fontIndex, start, end, message[start:end])
+            for fontIndex, start, end in zip(fontIndices[starts].tolist(), starts, ends)
+        ]
+
+    def scaleOf(self, fontIndex: int) -> float:
+        # fontSize is per unit of the first font, the others are scaled to
+        # the same size per em
+        return (
+            self.fonts[0].headTable.unitsPerEm
+            / self.fonts[fontIndex].headTable.unitsPerEm
+        )
+
+    def layoutString(
+        self, message: str, fontSize=0.05, letterSpacing=0, kerning: bool = True
+    ) -> List[Tuple[Font, float, int, float]]:
+        # (font, its fontSize, glyphId, pen x) for every character. Each run
+        # is shaped and kerned by its own font, starting where the last one
+        # ended.
+        placed = []
+        penX = 0.0
+        for run in self.splitRuns(message):
+            font = self.fonts[run.fontIndex]
+            scale = self.scaleOf(run.fontIndex)
+            runSize, runSpacing = fontSize * scale, letterSpacing * scale
+            glyphIds, kerningValues = font.shapeRun(run.text)
+            advances = font.charAdvances(run.text, runSize, runSpacing, kerning)
+            xs = penX + np.cumsum(advances) - advances
+            placed += [
+                (font, runSize, glyphId, x)
+                for glyphId, x in zip(glyphIds.tolist(), xs.tolist())
+            ]
+            penX += float(advances.sum())
+        return placed
+
+    def measure(
+        self, message: str, fontSize=0.05, letterSpacing=0, kerning: bool = True
+    ) -> float:
+        # Advance width of a single line in pixels, no outline is decoded
+        return sum(
+            self.fonts[run.fontIndex].measure(
+                run.text,
+                fontSize * self.scaleOf(run.fontIndex),
+                letterSpacing * self.scaleOf(run.fontIndex),
+                kerning,
+            )
+            for run in self.splitRuns(message)
+        )
+
+    def printString(
+        self,
+        screen: Surface,
+        message: str,
+        fontSize=0.05,
+        letterSpacing=0,
+        color=Colors.Text.value,
+        loc: Tuple[int, int] = (100, 80),
+    ) -> None:
+        locX, locY = loc
+        for font, runSize, glyphId, x in self.layoutString(
+            message, fontSize, letterSpacing
+        ):
+            font.drawGlyf(
+                screen, glyphId, (locX + x, locY), fontSize=runSize, color=color
+            )
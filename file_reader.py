@@ -1,4 +1,21 @@
+from array import array
+from bisect import bisect_left, bisect_right
 from pathlib import Path
+from typing import Any, BinaryIO, List, Tuple, Union
+import io
+import mmap
+import os
+import struct
+import sys
+import numpy as np
+
+INT8 = struct.Struct(">b")
+UINT16 = struct.Struct(">H")
+INT16 = struct.Struct(">h")
+UINT32 = struct.Struct(">I")
+INT64 = struct.Struct(">q")
+
+NEEDS_BYTESWAP = sys.byteorder == "little"
 
 
 class BinaryFileReader:
@@ -17,6 +34,10 @@ class BinaryFileReader:
     def skip(self, skipBytes: int) -> None:
         self.index += skipBytes
 
+    def load(self, offset: int, length: int) -> None:
+        # Makes sure a byte range is readable, the whole file already is
+        pass
+
     def getBytes(self, noOfBytes: int) -> bytes:
         return self.buf[self.index : self.index + noOfBytes]
 
@@ -59,3 +80,144 @@ class BinaryFileReader:
         data = self.getBytes(length)
         self.index += length
         return data
+
+    def parseArray(self, typecode: str, count: int) -> array:
+        data = array(typecode)
+        size = data.itemsize * count
+        data.frombytes(self.buf[self.index : self.index + size])
+        # Font data is big endian, array uses the machine's byte order
+        if NEEDS_BYTESWAP and data.itemsize > 1:
+            data.byteswap()
+        self.index += size
+        return data
+
+    def parseUint16Array(self, count: int) -> array:
+        return self.parseArray("H", count)
+
+    def parseInt16Array(self, count: int) -> array:
+        return self.parseArray("h", count)
+
+    def parseUint32Array(self, count: int) -> array:
+        return self.parseArray("I", count)
+
+    def parseRecords(self, record: struct.Struct, count: int) -> List[Tuple[Any, ...]]:
+        size = record.size * count
+        data = list(record.iter_unpack(self.buf[self.index : self.index + size]))
+        self.index += size
+        return data
+
+
+class MappedFileReader(BinaryFileReader):
+    buf: memoryview
+    map: mmap.mmap
+
+    def __init__(self, file: str) -> None:
+        self.file = file
+        with open(self.file, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buf = memoryview(self.map)
+        self.index = 0
+
+    def close(self) -> None:
+        self.buf.release()
+        self.map.close()
+
+    def parseTag(self) -> str:
+        data = bytes(self.getBytes(4)).decode("utf-8")
+        self.index += 4
+        return data
+
+    def parseUint32(self) -> int:
+        data = UINT32.unpack_from(self.buf, self.index)[0]
+        self.index += 4
+        return data
+
+    def parseUint16(self) -> int:
+        data = UINT16.unpack_from(self.buf, self.index)[0]
+        self.index += 2
+        return data
+
+    def parseUint8(self) -> int:
+        data = self.buf[self.index]
+        self.index += 1
+        return data
+
+    def parseInt8(self) -> int:
+        data = INT8.unpack_from(self.buf, self.index)[0]
+        self.index += 1
+        return data
+
+    def parseInt16(self) -> int:
+        data = INT16.unpack_from(self.buf, self.index)[0]
+        self.index += 2
+        return data
+
+    def parseLongDateTime(self) -> int:
+        data = INT64.unpack_from(self.buf, self.index)[0]
+        self.index += 8
+        return data
+
+    def takeBytes(self, length: int) -> bytes:
+        # Copy so callers never hold views that would keep the map open
+        data = bytes(self.getBytes(length))
+        self.index += length
+        return data
+
+
+class RangeFileReader(MappedFileReader):
+    # Reads only the byte ranges that get loaded, from a path or any seekable
+    # binary file object. buf spans the whole file so offsets stay absolute,
+    # it is zero filled memory the OS only backs where ranges were read.
+    file: Union[str, BinaryIO]
+    stream: BinaryIO
+    ownsStream: bool
+    data: np.ndarray
+    # Sorted, non overlapping (start, end) ranges already read
+    loaded: List[Tuple[int, int]]
+    bytesRead: int
+
+    def __init__(self, file: Union[str, BinaryIO]) -> None:
+        self.file = file
+        self.ownsStream = isinstance(file, (str, os.PathLike))
+        self.stream = open(file, "rb") if self.ownsStream else file
+        size = self.stream.seek(0, io.SEEK_END)
+        self.data = np.zeros(size, dtype=np.uint8)
+        self.buf = memoryview(self.data)
+        self.loaded = []
+        self.bytesRead = 0
+        self.index = 0
+        # Enough for the sfnt or collection header and its first records
+        self.load(0, min(size, 12))
+
+    def close(self) -> None:
+        self.buf.release()
+        if self.ownsStream:
+            self.stream.close()
+
+    def isLoaded(self, start: int, end: int) -> bool:
+        position = bisect_right(self.loaded, (start, float("inf"))) - 1
+        return position >= 0 and self.loaded[position][1] >= end
+
+    def load(self, offset: int, length: int) -> None:
+        start = max(offset, 0)
+        end = min(offset + length, len(self.data))
+        if start >= end or self.isLoaded(start, end):
+            return
+        self.stream.seek(start)
+        view = self.buf[start:end]
+        while len(view):
+            count = self.stream.readinto(view)
+            if not count:
+                raise EOFError(f"Font data ends before byte {end}")
+            view = view[count:]
+        self.bytesRead += end - start
+
+        # Merge with the ranges it overlaps or touches
+        first = bisect_left(self.loaded, (start, -1))
+        if first > 0 and self.loaded[first - 1][1] >= start:
+            first -= 1
+        last = bisect_right(self.loaded, (end, float("inf")))
+        if first < last:
+            start = min(start, self.loaded[first][0])
+            end = max(end, self.loaded[last - 1][1])
+        self.loaded[first:last] = [(start, end)]
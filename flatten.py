@@ -0,0 +1,81 @@
+from typing import List, Tuple
+import math
+import numpy as np
+
+# Maximum distance in device pixels between a curve and its polyline
+DEFAULT_TOLERANCE = 0.25
+
+# Scales are snapped up to the next step of 2 ** (1 / SCALE_STEPS) so that
+# cached polylines stay within tolerance for every scale in the bucket
+SCALE_STEPS = 4
+
+
+def quantizeScale(scale: float) -> Tuple[int, float]:
+    bucket = math.ceil(math.log2(scale) * SCALE_STEPS)
+    return bucket, 2 ** (bucket / SCALE_STEPS)
+
+
+def contourQuadratics(
+    points: np.ndarray, onCurve: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Two off curve points in a row imply an on curve point half way between
+    nextPoints = np.roll(points, -1, axis=0)
+    nextOnCurve = np.roll(onCurve, -1)
+    implied = ~onCurve & ~nextOnCurve
+    expanded = np.stack((points, (points + nextPoints) / 2), axis=1).reshape(-1, 2)
+    keep = np.stack((np.ones_like(onCurve), implied), axis=1).reshape(-1)
+    isOn = np.stack((onCurve, implied), axis=1).reshape(-1)[keep]
+    expanded = expanded[keep]
+
+    # Every on curve point starts a segment, a line when the next point is
+    # on curve and a quadratic through the next point otherwise. Lines get
+    # their midpoint as control point so every segment is a quadratic.
+    count = len(expanded)
+    starts = np.flatnonzero(isOn)
+    controls = (starts + 1) % count
+    isQuad = ~isOn[controls]
+    ends = np.where(isQuad, starts + 2, starts + 1) % count
+
+    p0 = expanded[starts]
+    p2 = expanded[ends]
+    p1 = np.where(isQuad[:, None], expanded[controls], (p0 + p2) / 2)
+    return p0, p1, p2
+
+
+def flattenQuadratics(
+    p0: np.ndarray, p1: np.ndarray, p2: np.ndarray, scale: float, tolerance: float
+) -> np.ndarray:
+    # Splitting a quadratic into n chords leaves an error of |p0 - 2p1 + p2| / 4n^2
+    curvature = np.hypot(*(p0 - 2 * p1 + p2).T) * scale
+    steps = np.maximum(1, np.ceil(np.sqrt(curvature / (4 * tolerance)))).astype(
+        np.int64
+    )
+
+    # Each segment contributes its start and interior points, the end point
+    # is the start of the next segment
+    segment = np.repeat(np.arange(len(steps)), steps)
+    firstStep = np.cumsum(steps) - steps
+    t = ((np.arange(int(steps.sum())) - firstStep[segment]) / steps[segment])[:, None]
+    mt = 1 - t
+    return mt * mt * p0[segment] + 2 * mt * t * p1[segment] + t * t * p2[segment]
+
+
+def flattenContours(
+    points: np.ndarray,
+    flags: np.ndarray,
+    endPtsOfContours: np.ndarray,
+    scale: float,
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[np.ndarray]:
+    # Closed polylines in font units, one per contour, without repeating the
+    # first point at the end
+    polylines: List[np.ndarray] = []
+    onCurve = (flags & 1) != 0
+    start = 0
+    for end in endPtsOfContours.tolist():
+        contour = points[start : end + 1].astype(np.float64)
+        if len(contour) > 1:
+            p0, p1, p2 = contourQuadratics(contour, onCurve[start : end + 1])
+            polylines.append(flattenQuadratics(p0, p1, p2, scale, tolerance))
+        start = end + 1
+    return polylines
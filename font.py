@@ -1,6 +1,7 @@
-from typing import Dict, List, Tuple
-from file_reader import BinaryFileReader
-from pygame import Surface
+from typing import BinaryIO, Dict, List, Optional, Sequence, Tuple, Type, Union
+from pathlib import Path
+from file_reader import BinaryFileReader, RangeFileReader
+from pygame import Rect, Surface
 from tables import (
     CmapTable,
     HeadTable,
@@ -8,44 +9,251 @@ from tables import (
     MaxpTable,
     TableRecord,
     HmtxTable,
+    TABLE_RECORD,
+    LONG_HOR_METRIC,
 )
-from glyph import SimpleGlyph
+from glyph import (
+    ARG_1_AND_2_ARE_WORDS,
+    ARGS_ARE_XY_VALUES,
+    MORE_COMPONENTS,
+    SCALED_COMPONENT_OFFSET,
+    WE_HAVE_A_SCALE,
+    WE_HAVE_A_TWO_BY_TWO,
+    WE_HAVE_AN_X_AND_Y_SCALE,
+    IDENTITY,
+    Component,
+    CompoundGlyph,
+    Glyph,
+    SimpleGlyph,
+    decodeSimpleGlyphs,
+    packComponents,
+    packGlyphs,
+    unpackGlyph,
+    unpackGlyphs,
+)
+from cache import GlyphCache, LRUCache
+from atlas import GlyphAtlas
+from font_cache import FontCache, cachePath, fileStats, sourceKey
+from kerning import KerningIndex, parseGposKerning, parseKernTable
+from layout import GlyphRun, Line, runBounds, wrapLines
+from outlines import SVG_PRECISION, GlyphOutlines, packOutlines, svgPaths
+from profiler import PROFILER
+from sdf import SdfAtlas
 from styles import Colors
+from variations import (
+    PHANTOM_POINTS,
+    Coords,
+    FvarTable,
+    GvarTable,
+    InstanceGlyph,
+    normalizeLocation,
+    parseAvarTable,
+    parseFvarTable,
+)
+import numpy as np
+import os
+import threading
+
+# Attributes decoded the first time they are used, with their profiler
+# stage and parse method
+LAZY_TABLES = {
+    "headTable": ("parse.head", "parseHeadTable"),
+    "maxpTable": ("parse.maxp", "parseMaxpTable"),
+    "cmapTable": ("parse.cmap", "parseCmapTable"),
+    "locaTable": ("parse.loca", "parseLocaTable"),
+    "hmtxTable": ("parse.hmtx", "parseHmtxtable"),
+    "glyphs": ("parse.glyf", "parseGlyphTable"),
+    "glyphBoxes": ("parse.boxes", "parseGlyphBoxes"),
+    "fvarTable": ("parse.fvar", "parseFvar"),
+    "avarSegments": ("parse.avar", "parseAvar"),
+    "gvarTable": ("parse.gvar", "parseGvar"),
+}
+# Instances of a variable font kept by the font they were made from
+MAX_INSTANCES = 64
 
 
 class Font:
-    fontDirectory: Dict[str, TableRecord] = {}
+    file: Union[str, BinaryIO]
+    fontNumber: int
+    fontDirectory: Dict[str, TableRecord]
     cmapTable: CmapTable
     maxpTable: MaxpTable
     headTable: HeadTable
     hmtxTable: HmtxTable
-    locaTable: List[int] = []
-    glyphs: List[SimpleGlyph] = []
-
-    def __init__(self, file: str) -> None:
-        reader = BinaryFileReader(file)
-
-        self.parseFontDirectory(reader)
-        self.parseHeadTable(reader)
-        self.parseMaxpTable(reader)
-        self.parseCmapTable(reader)
-        self.parseLocaTable(reader)
-        self.parseGlyphTable(reader)
-        self.parseHmtxtable(reader)
+    locaTable: List[int]
+    glyphs: Sequence[Glyph]
+    reader: BinaryFileReader
+    readerClass: Type[BinaryFileReader]
+    # Held while the reader is used, a table is parsed or a shared cache is
+    # updated, so threads can lay out and draw with one font. Reentrant as
+    # parsers use tables that are parsed on demand.
+    lock: threading.RLock
+    lazy: bool
+    glyphCacheSize: int
+    atlas: GlyphAtlas
+    cache: bool
+    cacheDir: Optional[str]
+    fontCache: Optional[FontCache]
+    kerningIndex: Optional[KerningIndex]
+    runCache: LRUCache[Tuple[np.ndarray, np.ndarray]]
+    sdf: bool
+    sdfAtlas: Optional[SdfAtlas]
+    # None for fonts without variations
+    fvarTable: Optional[FvarTable]
+    avarSegments: Optional[List[np.ndarray]]
+    gvarTable: Optional[GvarTable]
+    # Normalized location of this instance, empty for the default one.
+    # Instances share everything but their location with the font they were
+    # made from, including these caches.
+    coords: Coords
+    instanceCacheSize: int
+    instanceGlyphs: LRUCache[InstanceGlyph]
+    instances: LRUCache["Font"]
+
+    def __init__(
+        self,
+        file: Union[str, BinaryIO],
+        lazy: bool = True,
+        glyphCacheSize: int = 512,
+        readerClass: Type[BinaryFileReader] = RangeFileReader,
+        cache: bool = False,
+        cacheDir: Optional[str] = None,
+        fontNumber: int = 0,
+        runCacheSize: int = 1024,
+        sdf: bool = False,
+        instanceCacheSize: int = 4096,
+    ) -> None:
+        if cache and not isinstance(file, (str, os.PathLike)):
+            raise ValueError(
+                "The font cache is keyed by path, it needs a font file path"
+            )
+        reader = readerClass(file)
+        self.file = file
+        self.fontNumber = fontNumber
+        self.reader = reader
+        self.readerClass = readerClass
+        self.lock = threading.RLock()
+        self.lazy = lazy
+        self.glyphCacheSize = glyphCacheSize
+        self.atlas = GlyphAtlas()
+        self.cache = cache
+        self.cacheDir = cacheDir
+        self.fontCache = None
+        self.kerningIndex = None
+        self.runCache = LRUCache(runCacheSize)
+        self.sdf = sdf
+        self.sdfAtlas = None
+        self.coords = ()
+        self.instanceCacheSize = instanceCacheSize
+        self.instanceGlyphs = LRUCache(instanceCacheSize)
+        self.instances = LRUCache(MAX_INSTANCES)
+
+        with PROFILER.stage("parse.directory"):
+            self.parseFontDirectory(reader)
+        if cache:
+            with PROFILER.stage("cache.load"):
+                self.fontCache = self.openCache(file, cacheDir)
+                self.loadCache(self.fontCache)
+            if not lazy:
+                self.glyphs = unpackGlyphs(
+                    self.fontCache.arrays, self.maxpTable.numGlyphs
+                )
+        elif not lazy:
+            # Eager fonts decode every table up front
+            for name in LAZY_TABLES:
+                getattr(self, name)
+        # Lazy fonts only have their table directory now, see __getattr__
+
+    def __getattr__(self, name: str):
+        # Only called for attributes that aren't set yet. Tables are parsed on
+        # first use, which reads just their own bytes, and lazy fonts get a
+        # glyph cache instead of decoding the glyf table.
+        if name not in LAZY_TABLES or "reader" not in self.__dict__:
+            raise AttributeError(
+                f"{type(self).__name__!r} object has no attribute {name!r}"
+            )
+        if name == "glyphs" and self.lazy:
+            with self.lock:
+                if "glyphs" not in self.__dict__:
+                    self.glyphs = GlyphCache(
+                        self.loadGlyph, self.maxpTable.numGlyphs, self.glyphCacheSize
+                    )
+            return self.glyphs
+        # A table can be needed half way through parsing another one (loca
+        # needs head), the reader is left where that parser had it
+        stage, parse = LAZY_TABLES[name]
+        with self.lock:
+            # Another thread may have parsed it while this one waited
+            if name in self.__dict__:
+                return self.__dict__[name]
+            index = self.reader.index
+            with PROFILER.stage(stage):
+                getattr(self, parse)(self.reader)
+            self.reader.goto(index)
+            return self.__dict__[name]
+
+    def __getstate__(self) -> Dict:
+        # Readers, memory maps and atlas surfaces can't cross process
+        # boundaries, they are reopened on the other side
+        state = self.__dict__.copy()
+        for name in ("reader", "lock", "atlas", "fontCache", "sdfAtlas"):
+            del state[name]
+        # Instance outlines are varied again on demand
+        for name in ("instanceGlyphs", "instances"):
+            del state[name]
+        if self.lazy:
+            state.pop("glyphs", None)
+        else:
+            # A few flat arrays pickle much faster than thousands of glyphs
+            state["glyphs"] = {
+                **packGlyphs(self.glyphs, np.float64),
+                **packComponents(self.glyphs),
+            }
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self.reader = self.readerClass(self.file)
+        self.lock = threading.RLock()
+        self.atlas = GlyphAtlas()
+        self.sdfAtlas = None
+        self.instanceGlyphs = LRUCache(self.instanceCacheSize)
+        self.instances = LRUCache(MAX_INSTANCES)
+        self.fontCache = (
+            self.openCache(self.file, self.cacheDir) if self.cache else None
+        )
+        if not self.lazy:
+            self.glyphs = unpackGlyphs(state["glyphs"], self.maxpTable.numGlyphs)
 
     def parseFontDirectory(self, reader: BinaryFileReader) -> None:
+        if reader.parseTag() == "ttcf":
+            # TrueType Collection, pick the font's table directory
+            majorVersion = reader.parseUint16()
+            minorVersion = reader.parseUint16()
+            numFonts = reader.parseUint32()
+            reader.load(reader.index, 4 * numFonts)
+            if not 0 <= self.fontNumber < numFonts:
+                raise IndexError(
+                    f"Font {self.fontNumber} out of range, collection has {numFonts}"
+                )
+            reader.skip(4 * self.fontNumber)
+            reader.goto(reader.parseUint32())
+        else:
+            reader.goto(0)
+
+        self.fontDirectory = {}
+        reader.load(reader.index, 12)
         sfntVersion = reader.parseUint32()
         numTables = reader.parseUint16()
         searchRange = reader.parseUint16()
         entrySelector = reader.parseUint16()
         rangeShift = reader.parseUint16()
+        reader.load(reader.index, TABLE_RECORD.size * numTables)
 
-        for i in range(numTables):
-            tag = reader.parseTag()
-            checksum = reader.parseUint32()
-            offset = reader.parseUint32()
-            length = reader.parseUint32()
-
+        for tag, checksum, offset, length in reader.parseRecords(
+            TABLE_RECORD, numTables
+        ):
+            tag = tag.decode("utf-8")
             self.fontDirectory[tag] = TableRecord(
                 tag=tag, checksum=checksum, length=length, offset=offset
             )
@@ -55,13 +263,27 @@ class Font:
 
         if not tableRecord:
             raise NameError(f"{tableName} Table not found")
+        reader.load(tableRecord.offset, tableRecord.length)
         reader.goto(tableRecord.offset)
         return tableRecord
 
+    def tableData(self, tableName: str) -> bytes:
+        with self.lock:
+            tableRecord = self.gotoTable(tableName, self.reader)
+            return self.reader.takeBytes(tableRecord.length)
+
+    def glyphData(self, glyphId: int) -> bytes:
+        # Raw glyf bytes of a glyph, empty for glyphs without an outline
+        start, end = self.locaTable[glyphId], self.locaTable[glyphId + 1]
+        with self.lock:
+            self.reader.load(self.fontDirectory["glyf"].offset + start, end - start)
+            self.reader.goto(self.fontDirectory["glyf"].offset + start)
+            return self.reader.takeBytes(end - start)
+
     def parseCmapTable(self, reader: BinaryFileReader) -> None:
         self.gotoTable("cmap", reader)
 
-        self.cmapTable = CmapTable(reader)
+        self.cmapTable = CmapTable.fromReader(reader)
 
     def parseMaxpTable(self, reader: BinaryFileReader) -> None:
         self.gotoTable("maxp", reader)
@@ -113,95 +335,358 @@ class Font:
 
         isShort = self.headTable.indexToLocFormat == 0
 
-        for _ in range(self.maxpTable.numGlyphs):
-            self.locaTable.append(
-                reader.parseUint16() * 2 if isShort else reader.parseUint32()
-            )
-
-        endAddress = reader.parseUint16() * 2 if isShort else reader.parseUint32()
+        # numGlyphs + 1 entries, the last one marks the end of the glyf table
+        count = self.maxpTable.numGlyphs + 1
+        if isShort:
+            self.locaTable = [offset * 2 for offset in reader.parseUint16Array(count)]
+        else:
+            self.locaTable = reader.parseUint32Array(count).tolist()
+
+    def loadGlyph(self, glyphId: int) -> Glyph:
+        with self.lock, PROFILER.stage("glyph.decode"):
+            if self.fontCache:
+                return self.loadCachedGlyph(glyphId)
+            return self.parseGlyph(self.reader, glyphId)
+
+    def openCache(self, file: str, cacheDir: Optional[str]) -> FontCache:
+        path = cachePath(file, cacheDir, self.fontNumber)
+        fontCache = FontCache.load(path)
+        # The font is only read whole and hashed when its cache is written,
+        # opening it again just compares its size and modification time
+        if fontCache is None or fontCache.key[:2] != fileStats(file):
+            # Missing or stale, decode the font once and write a fresh cache
+            key = sourceKey(file)
+            self.parseHeadTable(self.reader)
+            self.parseMaxpTable(self.reader)
+            self.parseCmapTable(self.reader)
+            self.parseLocaTable(self.reader)
+            self.parseGlyphTable(self.reader)
+            self.parseHmtxtable(self.reader)
+            FontCache.write(path, key, self.cacheArrays())
+            fontCache = FontCache.load(path)
+            # Glyphs are read back from the cache, the same as on a warm start
+            del self.glyphs
+        return fontCache
+
+    def cacheArrays(self) -> Dict[str, np.ndarray]:
+        advances, lsbs = zip(*self.hmtxTable.hMetrics)
+
+        return {
+            "head": np.array(self.headTable, dtype=np.int64),
+            "maxp": np.array(self.maxpTable, dtype=np.int64),
+            "loca": np.array(self.locaTable, dtype=np.int64),
+            "cmapFormat": np.array([self.cmapTable.format], dtype=np.int64),
+            "cmapStarts": np.array(self.cmapTable.startCodes, dtype=np.int64),
+            "cmapEnds": np.array(self.cmapTable.endCodes, dtype=np.int64),
+            "cmapDeltas": np.array(self.cmapTable.idDeltas, dtype=np.int64),
+            "cmapRanges": np.array(self.cmapTable.idRangeOffsets, dtype=np.int64),
+            "cmapGlyphs": np.array(self.cmapTable.glyphIdArray, dtype=np.int64),
+            "advances": np.array(advances, dtype=np.int32),
+            "lsbs": np.array(lsbs, dtype=np.int32),
+            "extraLsbs": np.array(self.hmtxTable.leftSideBearings, dtype=np.int32),
+            "boxes": self.glyphBoxes.reshape(-1),
+            **packGlyphs(list(self.glyphs), np.float32),
+            **packComponents(list(self.glyphs)),
+        }
+
+    def loadCache(self, fontCache: FontCache) -> None:
+        self.headTable = HeadTable(*fontCache["head"].tolist())
+        self.maxpTable = MaxpTable(*fontCache["maxp"].tolist())
+        self.locaTable = fontCache["loca"].tolist()
+        self.cmapTable = CmapTable(
+            format=int(fontCache["cmapFormat"][0]),
+            startCodes=fontCache["cmapStarts"].tolist(),
+            endCodes=fontCache["cmapEnds"].tolist(),
+            idDeltas=fontCache["cmapDeltas"].tolist(),
+            idRangeOffsets=fontCache["cmapRanges"].tolist(),
+            glyphIdArray=fontCache["cmapGlyphs"].tolist(),
+        )
+        self.hmtxTable = HmtxTable(
+            hMetrics=list(
+                zip(fontCache["advances"].tolist(), fontCache["lsbs"].tolist())
+            ),
+            leftSideBearings=fontCache["extraLsbs"].tolist(),
+        )
+        self.glyphBoxes = fontCache["boxes"].reshape(-1, 4)
+
+    def getSdfAtlas(self) -> SdfAtlas:
+        # Built from every outline on first use, cached fonts keep it on disk
+        # next to their glyph cache so it is only built once per font
+        if self.sdfAtlas is None:
+            with PROFILER.stage("sdf.load"):
+                self.sdfAtlas = self.loadSdfAtlas()
+        return self.sdfAtlas
+
+    def loadSdfAtlas(self) -> SdfAtlas:
+        # Fields are built as glyphs are first drawn, cached fonts start from
+        # the ones saved by saveSdfCache
+        unitsPerEm = self.headTable.unitsPerEm
+        if self.cache:
+            # Saved with the key of the glyph cache, which was checked against
+            # the font when it was opened
+            sdfCache = FontCache.load(self.sdfCachePath())
+            sdfAtlas = None
+            if sdfCache is not None and sdfCache.key == self.fontCache.key:
+                sdfAtlas = SdfAtlas.fromArrays(sdfCache.arrays, unitsPerEm)
+            # Missing, stale or built with other field parameters otherwise
+            if sdfAtlas is not None and len(sdfAtlas) == self.maxpTable.numGlyphs:
+                sdfAtlas.glyphs = self.glyphs
+                return sdfAtlas
+        return SdfAtlas.lazy(self.glyphs, unitsPerEm)
+
+    def sdfCachePath(self) -> Path:
+        return cachePath(
+            self.file, self.cacheDir, self.fontNumber, extension="sdfcache"
+        )
 
-    def parseGlyph(self, reader: BinaryFileReader, loc: int) -> SimpleGlyph:
-        reader.goto(loc)
+    def saveSdfCache(self) -> None:
+        # Writes the distance fields built since the last save next to the
+        # glyph cache, nothing to do for fonts without a cache
+        if self.cache and self.sdfAtlas is not None and self.sdfAtlas.added:
+            with PROFILER.stage("sdf.save"):
+                arrays = self.sdfAtlas.toArrays()
+                try:
+                    FontCache.write(self.sdfCachePath(), self.fontCache.key, arrays)
+                except OSError:
+                    # Only a cache, the fields are built again next time
+                    pass
+
+    def loadCachedGlyph(self, glyphId: int) -> Glyph:
+        return unpackGlyph(self.fontCache.arrays, glyphId, self.cachedComponent)
+
+    def cachedComponent(self, glyphId: int) -> Glyph:
+        # Shared through the glyph cache, like components decoded from glyf
+        glyph = self.glyphs.peek(glyphId)
+        if glyph is None:
+            glyph = self.loadCachedGlyph(glyphId)
+            self.glyphs.store(glyphId, glyph)
+        return glyph
+
+    def parseGlyph(
+        self,
+        reader: BinaryFileReader,
+        glyphId: int,
+        depth: int = 1,
+        decoded: Optional[Dict[int, Glyph]] = None,
+    ) -> Glyph:
+        if self.locaTable[glyphId + 1] == self.locaTable[glyphId]:
+            # Glyphs without an outline (eg. space) have no data in glyf
+            return SimpleGlyph.empty()
+
+        # Only this glyph's bytes are read, not the whole glyf table
+        start = self.fontDirectory["glyf"].offset + self.locaTable[glyphId]
+        reader.load(start, self.locaTable[glyphId + 1] - self.locaTable[glyphId])
+        reader.goto(start)
         numContours = reader.parseInt16()
-        isSimple = numContours >= 0
+        if numContours == 0:
+            return SimpleGlyph.empty()
+        isSimple = numContours > 0
         if isSimple:
             return SimpleGlyph.fromReader(reader, numContours)
-        return self.parseCompoundGlyph(reader)
-
-    def parseCompoundGlyph(self, reader: BinaryFileReader) -> SimpleGlyph:
-        compGlyph = SimpleGlyph(
-            numberOfContours=0,
-            endPtsOfContours=[],
-            flags=[],
-            points=[],
-        )
+        return self.parseCompoundGlyph(reader, depth, decoded)
+
+    def parseCompoundGlyph(
+        self,
+        reader: BinaryFileReader,
+        depth: int = 1,
+        decoded: Optional[Dict[int, Glyph]] = None,
+    ) -> CompoundGlyph:
+        # depth is the nesting level of this glyph's components, 1 for a
+        # compound made of simple glyphs. Checking it before reading the
+        # components also stops glyphs that contain themselves.
+        maxDepth = max(self.maxpTable.maxComponentDepth, 1)
+        if depth > maxDepth:
+            raise ValueError(
+                f"Compound glyph nested deeper than maxComponentDepth ({maxDepth})"
+            )
+
         xMin = reader.parseInt16()
         yMin = reader.parseInt16()
         xMax = reader.parseInt16()
         yMax = reader.parseInt16()
 
-        hasMoreComponents = 1
-        p = 0
-        while hasMoreComponents:
+        components: List[Component] = []
+        flags = MORE_COMPONENTS
+        while flags & MORE_COMPONENTS:
             flags = reader.parseUint16()
             glyphIndex = reader.parseUint16()
-            argsAreWord = flags & 1
-            areSignedValues = flags & (1 << 1)
-            hasAScale = flags & (1 << 3)
-            hasMoreComponents = flags & (1 << 5)
-            hasXYScale = flags & (1 << 6)
-            has2by2 = flags & (1 << 7)
-
-            scaleX = 1.0
-            scaleY = 1.0
-            offsetX = 0.0
-            offsetY = 0.0
-
-            if areSignedValues:
-                if argsAreWord:
-                    offsetX = reader.parseInt16()
-                    offsetY = reader.parseInt16()
-                else:
-                    offsetX = reader.parseInt8()
-                    offsetY = reader.parseInt8()
-
-            if hasAScale:
-                scaleX = scaleY = reader.parseInt16()
-            elif hasXYScale:
-                scaleX = reader.parseInt16()
-                scaleY = reader.parseInt16()
-            elif has2by2:
-                reader.parseInt16()
-                reader.parseInt16()
-                reader.parseInt16()
-                reader.parseInt16()
-
-            p += 1
-            curLoc = reader.index
-            compLoc = self.fontDirectory["glyf"].offset + self.locaTable[glyphIndex]
-            glyphComponent = self.parseGlyph(reader, compLoc)
-            glyphComponent.transform(
-                scaleX=scaleX, scaleY=scaleY, offsetX=offsetX, offsetY=offsetY
-            )
-            reader.goto(curLoc)
 
-            currentPoints = len(compGlyph.points)
-            compGlyph.numberOfContours += glyphComponent.numberOfContours
-            compGlyph.flags += glyphComponent.flags
-            compGlyph.points += glyphComponent.points
-            compGlyph.endPtsOfContours += [
-                x + currentPoints for x in glyphComponent.endPtsOfContours
-            ]
+            # Offsets are signed, point numbers for anchoring are not
+            isXY = flags & ARGS_ARE_XY_VALUES
+            if flags & ARG_1_AND_2_ARE_WORDS:
+                parse = reader.parseInt16 if isXY else reader.parseUint16
+            else:
+                parse = reader.parseInt8 if isXY else reader.parseUint8
+            arg1 = parse()
+            arg2 = parse()
+
+            # Scales are F2Dot14 fixed point numbers
+            matrix = IDENTITY
+            if flags & WE_HAVE_A_SCALE:
+                matrix = IDENTITY * (reader.parseInt16() / (1 << 14))
+            elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+                scaleX = reader.parseInt16() / (1 << 14)
+                scaleY = reader.parseInt16() / (1 << 14)
+                matrix = np.diag([scaleX, scaleY])
+            elif flags & WE_HAVE_A_TWO_BY_TWO:
+                matrix = np.array(
+                    [reader.parseInt16() / (1 << 14) for _ in range(4)]
+                ).reshape(2, 2)
 
-        return compGlyph
+            curLoc = reader.index
+            glyph = self.componentGlyph(reader, glyphIndex, depth + 1, decoded)
+            reader.goto(curLoc)
+            if depth + glyph.depth > maxDepth:
+                # An already decoded component can still nest too deep here
+                raise ValueError(
+                    f"Compound glyph nested deeper than maxComponentDepth ({maxDepth})"
+                )
+
+            if isXY:
+                offset = np.array([arg1, arg2], dtype=np.float64)
+                if flags & SCALED_COMPONENT_OFFSET:
+                    offset = offset @ matrix
+            else:
+                # Move the component so its point arg2 lands on point arg1
+                # of the glyph built so far
+                placed = (
+                    CompoundGlyph(components).points if components else np.zeros((0, 2))
+                )
+                if arg1 >= len(placed) or arg2 >= len(glyph.points):
+                    raise ValueError(
+                        f"Component anchor point out of range in glyph {glyphIndex}"
+                    )
+                offset = placed[arg1] - glyph.points[arg2] @ matrix
+            components.append(Component(glyphIndex, glyph, matrix, offset))
+
+        return CompoundGlyph(components)
+
+    def componentGlyph(
+        self,
+        reader: BinaryFileReader,
+        glyphId: int,
+        depth: int,
+        decoded: Optional[Dict[int, Glyph]] = None,
+    ) -> Glyph:
+        # Components are decoded once and shared by every compound using them.
+        # Bulk decoding passes its own decoded glyphs and keeps the new ones
+        # there instead of in the glyph cache.
+        if decoded is not None:
+            glyph = decoded.get(glyphId)
+            if glyph is None and isinstance(self.glyphs, GlyphCache):
+                glyph = self.glyphs.peek(glyphId)
+            if glyph is None:
+                glyph = self.parseGlyph(reader, glyphId, depth, decoded)
+                decoded[glyphId] = glyph
+            return glyph
+        if isinstance(self.glyphs, GlyphCache):
+            glyph = self.glyphs.peek(glyphId)
+        else:
+            glyph = self.glyphs[glyphId]
+        if glyph is None:
+            glyph = self.parseGlyph(reader, glyphId, depth)
+            if isinstance(self.glyphs, GlyphCache):
+                self.glyphs.store(glyphId, glyph)
+            else:
+                self.glyphs[glyphId] = glyph
+        return glyph
+
+    def decodeSimpleGlyphs(
+        self, reader: BinaryFileReader, glyphIds: Sequence[int]
+    ) -> Dict[int, SimpleGlyph]:
+        # The simple glyphs among glyphIds decoded in one batch, glyphs
+        # without an outline and compounds are left out
+        glyfTableRecord = self.gotoTable("glyf", reader)
+        simpleIds: List[int] = []
+        simpleLocations: List[int] = []
+        for glyphId in glyphIds:
+            if self.locaTable[glyphId + 1] == self.locaTable[glyphId]:
+                continue
+            loc = glyfTableRecord.offset + self.locaTable[glyphId]
+            reader.goto(loc)
+            if reader.parseInt16() > 0:
+                simpleIds.append(glyphId)
+                simpleLocations.append(loc)
+        return dict(zip(simpleIds, decodeSimpleGlyphs(reader, simpleLocations)))
 
     def parseGlyphTable(self, reader: BinaryFileReader) -> None:
+        # Simple glyphs are decoded in one batch, the rest one at a time
+        simple = self.decodeSimpleGlyphs(reader, range(self.maxpTable.numGlyphs))
+        glyphs: List[Glyph] = [None] * self.maxpTable.numGlyphs
+        for glyphId, glyph in simple.items():
+            glyphs[glyphId] = glyph
+        self.glyphs = glyphs
+
+        for glyphId in range(self.maxpTable.numGlyphs):
+            if glyphs[glyphId] is None:
+                glyphs[glyphId] = self.parseGlyph(reader, glyphId)
+
+    def outlineGlyphs(self, glyphIds: Sequence[int]) -> List[Glyph]:
+        # Glyphs for bulk work. Lazy fonts decode the simple glyphs they
+        # don't have cached in one batch and leave the glyph cache as it is.
+        if self.coords:
+            return [self.instanceGlyph(glyphId) for glyphId in glyphIds]
+        if not isinstance(self.glyphs, GlyphCache) or self.fontCache:
+            return [self.glyphs[glyphId] for glyphId in glyphIds]
+        with self.lock:
+            missing = [
+                glyphId for glyphId in glyphIds if self.glyphs.peek(glyphId) is None
+            ]
+            decoded: Dict[int, Glyph] = self.decodeSimpleGlyphs(self.reader, missing)
+            glyphs = []
+            for glyphId in glyphIds:
+                glyph = decoded.get(glyphId)
+                if glyph is None:
+                    glyph = self.glyphs.peek(glyphId)
+                if glyph is None:
+                    glyph = self.parseGlyph(self.reader, glyphId, decoded=decoded)
+                    decoded[glyphId] = glyph
+                glyphs.append(glyph)
+        return glyphs
+
+    def exportOutlines(
+        self, glyphIds: Optional[Sequence[int]] = None, matrix=None
+    ) -> GlyphOutlines:
+        # Outlines of glyphIds, every glyph by default, packed into flat
+        # arrays and moved by the affine matrix if there is one
+        if glyphIds is None:
+            glyphIds = range(self.maxpTable.numGlyphs)
+        glyphIds = [int(glyphId) for glyphId in glyphIds]
+        for glyphId in glyphIds:
+            if not 0 <= glyphId < self.maxpTable.numGlyphs:
+                raise IndexError(f"Glyph {glyphId} out of range")
+        with PROFILER.stage("export.outlines"):
+            outlines = packOutlines(glyphIds, self.outlineGlyphs(glyphIds))
+            if matrix is not None:
+                outlines = outlines.transformed(matrix)
+        return outlines
+
+    def exportSvgPaths(
+        self,
+        glyphIds: Optional[Sequence[int]] = None,
+        matrix=None,
+        precision: int = SVG_PRECISION,
+    ) -> List[str]:
+        # SVG path data of glyphIds in font units, y up unless the matrix
+        # flips it
+        outlines = self.exportOutlines(glyphIds, matrix)
+        with PROFILER.stage("export.svg"):
+            return svgPaths(outlines, precision)
+
+    def parseGlyphBoxes(self, reader: BinaryFileReader) -> None:
+        # (xMin, yMin, xMax, yMax) of every glyph from its glyf header, all
+        # zero for glyphs without an outline. Headers are spread over the
+        # whole table, which is read in one go.
         glyfTableRecord = self.gotoTable("glyf", reader)
-
-        for offset in self.locaTable:
-            glyphLoc = glyfTableRecord.offset + offset
-            glyph = self.parseGlyph(reader, glyphLoc)
-            self.glyphs.append(glyph)
+        loca = np.asarray(self.locaTable, dtype=np.int64)
+        inked = np.flatnonzero(loca[1:] > loca[:-1])
+        data = np.frombuffer(reader.buf, dtype=np.uint8)
+        # The box follows numberOfContours
+        starts = glyfTableRecord.offset + loca[inked] + 2
+        headers = data[starts[:, None] + np.arange(8)]
+        glyphBoxes = np.zeros((self.maxpTable.numGlyphs, 4), dtype=np.int32)
+        glyphBoxes[inked] = headers.view(">i2").reshape(-1, 4)
+        self.glyphBoxes = glyphBoxes
 
     def parseHmtxtable(self, reader: BinaryFileReader) -> None:
         self.gotoTable("hhea", reader)
@@ -210,18 +695,249 @@ class Font:
 
         self.gotoTable("hmtx", reader)
 
-        hMetrics: List[Tuple[int, int]] = []
-        leftSideBearings: List[int] = []
-        for i in range(numOfLongHorMetrics):
-            advanceWidth = reader.parseUint16()
-            leftSideBearing = reader.parseInt16()
-            hMetrics.append((advanceWidth, leftSideBearing))
-
-        for i in range(self.maxpTable.numGlyphs - numOfLongHorMetrics):
-            leftSideBearings.append(reader.parseUint16())
+        hMetrics: List[Tuple[int, int]] = reader.parseRecords(
+            LONG_HOR_METRIC, numOfLongHorMetrics
+        )
+        leftSideBearings: List[int] = reader.parseInt16Array(
+            self.maxpTable.numGlyphs - numOfLongHorMetrics
+        ).tolist()
 
         self.hmtxTable = HmtxTable(hMetrics=hMetrics, leftSideBearings=leftSideBearings)
 
+    def parseFvar(self, reader: BinaryFileReader) -> None:
+        self.fvarTable = None
+        if "fvar" in self.fontDirectory:
+            record = self.gotoTable("fvar", reader)
+            self.fvarTable = parseFvarTable(reader, record.offset)
+
+    def parseAvar(self, reader: BinaryFileReader) -> None:
+        self.avarSegments = None
+        if "avar" in self.fontDirectory:
+            record = self.gotoTable("avar", reader)
+            self.avarSegments = parseAvarTable(reader, record.offset)
+
+    def parseGvar(self, reader: BinaryFileReader) -> None:
+        # Only the header and offsets, glyph data is read per glyph
+        self.gvarTable = None
+        if "gvar" in self.fontDirectory:
+            self.gvarTable = GvarTable.fromReader(
+                reader, self.fontDirectory["gvar"].offset
+            )
+
+    def instance(self, location: Dict[str, float]) -> "Font":
+        # The font at {axis tag: value}, eg. {"wght": 700}. Instances are
+        # cheap copies that share tables, glyph caches and the atlas with
+        # this font and vary outlines glyph by glyph as they are drawn.
+        if self.fvarTable is None:
+            raise ValueError("Not a variable font, it has no fvar table")
+        coords = normalizeLocation(self.fvarTable.axes, self.avarSegments, location)
+        if coords == self.coords:
+            return self
+        font = self.instances.get(coords)
+        if font is None:
+            # Parsed here once so that instances don't each parse their own
+            shared = ("headTable", "maxpTable", "locaTable", "cmapTable", "hmtxTable")
+            for name in shared + ("glyphs", "gvarTable"):
+                getattr(self, name)
+            self.getKerningIndex()
+            # Not copy.copy, which would go through __getstate__
+            font = Font.__new__(Font)
+            font.__dict__.update(self.__dict__)
+            font.coords = coords
+            # Instance outlines are drawn as outlines, the distance fields
+            # are of the default ones
+            font.sdf = False
+            self.instances.put(coords, font)
+        return font
+
+    def instanceEntry(self, glyphId: int) -> InstanceGlyph:
+        key = (glyphId, self.coords)
+        with self.lock:
+            entry = self.instanceGlyphs.get(key)
+            if entry is None:
+                with PROFILER.stage("glyph.instance"):
+                    entry = self.buildInstanceGlyph(glyphId)
+                self.instanceGlyphs.put(key, entry)
+            return entry
+
+    def buildInstanceGlyph(self, glyphId: int) -> InstanceGlyph:
+        # A simple glyph's points move by their deltas. A compound's points
+        # are its component offsets, the components are their own instances.
+        glyph = self.glyphs[glyphId]
+        if glyph.isCompound:
+            points = np.array([component.offset for component in glyph.components])
+            endPts = np.arange(len(points))
+        else:
+            points, endPts = glyph.points, glyph.endPtsOfContours
+        deltas = None
+        if self.gvarTable is not None:
+            deltas = self.gvarTable.glyphDeltas(
+                self.reader, glyphId, self.coords, points, endPts
+            )
+        if deltas is None:
+            deltas = np.zeros((len(points) + PHANTOM_POINTS, 2))
+        numPoints = len(points)
+        # Glyphs are drawn with the left phantom point at the pen
+        shift = np.array([deltas[numPoints, 0], 0])
+        advanceDelta = float(deltas[numPoints + 1, 0] - deltas[numPoints, 0])
+
+        def varied(pointDeltas: np.ndarray) -> Glyph:
+            if not glyph.isCompound:
+                return SimpleGlyph(
+                    glyph.numberOfContours,
+                    glyph.endPtsOfContours,
+                    glyph.flags,
+                    points + pointDeltas,
+                )
+            # Scaled and anchored offsets move by the plain delta too
+            return CompoundGlyph(
+                [
+                    Component(
+                        component.glyphId,
+                        self.instanceEntry(component.glyphId).component,
+                        component.matrix,
+                        component.offset + delta,
+                    )
+                    for component, delta in zip(glyph.components, pointDeltas)
+                ]
+            )
+
+        component = varied(deltas[:numPoints])
+        drawn = varied(deltas[:numPoints] - shift) if shift.any() else component
+        return InstanceGlyph(drawn, component, advanceDelta)
+
+    def instanceGlyph(self, glyphId: int) -> Glyph:
+        # The outline of a glyph at this font's location
+        if not self.coords:
+            return self.glyphs[glyphId]
+        return self.instanceEntry(glyphId).glyph
+
+    def instanceBoxes(self, glyphIds: np.ndarray) -> np.ndarray:
+        # Like glyphBoxes, from the varied points
+        unique, inverse = np.unique(glyphIds, return_inverse=True)
+        boxes = np.zeros((len(unique), 4))
+        for index, glyphId in enumerate(unique.tolist()):
+            points = self.instanceGlyph(glyphId).points
+            if len(points):
+                boxes[index] = np.concatenate((points.min(axis=0), points.max(axis=0)))
+        return boxes[inverse.reshape(-1)]
+
+    def advanceDeltas(self, glyphIds: np.ndarray) -> np.ndarray:
+        # Without HVAR the phantom points are the only source of varied
+        # advances, and finding them takes the glyph's point count, so
+        # instances decode the outlines they measure
+        unique, inverse = np.unique(glyphIds, return_inverse=True)
+        deltas = np.array(
+            [self.instanceEntry(glyphId).advanceDelta for glyphId in unique.tolist()]
+        )
+        return deltas[inverse.reshape(-1)] if len(deltas) else np.zeros(0)
+
+    def getKerningIndex(self) -> KerningIndex:
+        # Built on first use, GPOS pair adjustments win over a legacy kern table
+        with self.lock:
+            if self.kerningIndex is None:
+                kerningIndex = KerningIndex([])
+                numGlyphs = self.maxpTable.numGlyphs
+                if "GPOS" in self.fontDirectory:
+                    record = self.gotoTable("GPOS", self.reader)
+                    kerningIndex = parseGposKerning(
+                        self.reader, record.offset, numGlyphs
+                    )
+                if not kerningIndex and "kern" in self.fontDirectory:
+                    record = self.gotoTable("kern", self.reader)
+                    kerningIndex = parseKernTable(self.reader, record.offset)
+                self.kerningIndex = kerningIndex
+            return self.kerningIndex
+
+    def shapeRun(self, message: str) -> Tuple[np.ndarray, np.ndarray]:
+        # Glyph ids of a string and the kerning after each of them in font
+        # units. Characters the font doesn't cover get the missing glyph.
+        with self.lock:
+            run = self.runCache.get(message)
+            if run is None:
+                glyphIds = self.cmapTable.getGlyphIds(map(ord, message), default=0)
+                run = (glyphIds, self.getKerningIndex().pairValues(glyphIds))
+                self.runCache.put(message, run)
+            return run
+
+    def charAdvances(
+        self, message: str, fontSize=0.05, letterSpacing=0, kerning: bool = True
+    ) -> np.ndarray:
+        # Pixels the pen moves after each character, from cmap and hmtx only
+        glyphIds, kerningValues = self.shapeRun(message)
+        advances, leftSideBearings = self.hmtxTable.getMetrics(glyphIds)
+        if self.coords:
+            advances = advances + self.advanceDeltas(glyphIds)
+        if kerning:
+            advances = advances + kerningValues
+        return advances * (fontSize + letterSpacing)
+
+    def layoutString(
+        self, message: str, fontSize=0.05, letterSpacing=0, kerning: bool = True
+    ) -> List[Tuple[int, float]]:
+        # (glyphId, pen x) for every character, starting from x = 0. Outlines
+        # already carry the left side bearing, so glyphs go at the pen.
+        glyphIds, kerningValues = self.shapeRun(message)
+        advances = self.charAdvances(message, fontSize, letterSpacing, kerning)
+        return list(zip(glyphIds.tolist(), (np.cumsum(advances) - advances).tolist()))
+
+    def pixelBoxes(self, glyphIds: Sequence[int], fontSize=0.05) -> np.ndarray:
+        # (left, top, right, bottom) of the masks of glyphIds relative to the
+        # loc they're drawn at, from the glyf headers without decoding any
+        # outline. These are the rects of glyphRect, but a compound's header
+        # can be a unit off its outline, so use them to cull, not to draw.
+        # Glyphs without an outline get an empty box at 0.
+        quarterPixels, fontSize = self.snapFontSize(fontSize)
+        glyphIds = np.asarray(glyphIds, dtype=np.int64)
+        if self.coords:
+            glyphBoxes = self.instanceBoxes(glyphIds)
+        else:
+            glyphBoxes = self.glyphBoxes[glyphIds]
+        scaled = glyphBoxes * fontSize
+        pad = 1
+        boxes = np.stack(
+            (
+                np.floor(scaled[:, 0]) - pad,
+                np.floor(300 - scaled[:, 3]) - pad,
+                np.ceil(scaled[:, 2]) + pad,
+                np.ceil(300 - scaled[:, 1]) + pad,
+            ),
+            axis=1,
+        )
+        boxes[~glyphBoxes.any(axis=1)] = 0
+        return boxes
+
+    def layoutRun(
+        self, message: str, fontSize=0.05, letterSpacing=0, kerning: bool = True
+    ) -> GlyphRun:
+        # layoutString with the box of every glyph and of the whole run
+        glyphIds, kerningValues = self.shapeRun(message)
+        advances = self.charAdvances(message, fontSize, letterSpacing, kerning)
+        xs = np.cumsum(advances) - advances
+        boxes = self.pixelBoxes(glyphIds, fontSize)
+        inked = boxes[:, 2] > boxes[:, 0]
+        boxes[inked] += np.round(xs[inked])[:, None] * (1, 0, 1, 0)
+        return GlyphRun(glyphIds, xs, boxes, runBounds(boxes[inked]))
+
+    def measure(
+        self, message: str, fontSize=0.05, letterSpacing=0, kerning: bool = True
+    ) -> float:
+        # Advance width of a single line in pixels, the default instance
+        # decodes no outline
+        return float(self.charAdvances(message, fontSize, letterSpacing, kerning).sum())
+
+    def layoutParagraph(
+        self,
+        message: str,
+        width: float,
+        fontSize=0.05,
+        letterSpacing=0,
+        kerning: bool = True,
+    ) -> List[Line]:
+        # Greedy word wrap into lines no wider than width pixels
+        advances = self.charAdvances(message, fontSize, letterSpacing, kerning)
+        return wrapLines(message, advances, width)
+
     def printString(
         self,
         screen: Surface,
@@ -229,14 +945,28 @@ class Font:
         fontSize=0.05,
         letterSpacing=0,
         color=Colors.Text.value,
+        loc: Tuple[int, int] = (100, 80),
     ) -> None:
-        x = 100
-        for i, letter in enumerate(message):
-            glyphId = self.cmapTable.getGlyphId(ord(letter))
-            advancedWidth, leftSideBearing = self.hmtxTable.getMetric(glyphId)
-            x += leftSideBearing * (fontSize + letterSpacing)
-            self.glyphs[glyphId].draw(screen, (x, 80), fontSize=fontSize, color=color)
-            x += advancedWidth * (fontSize + letterSpacing)
+        locX, locY = loc
+        for glyphId, x in self.layoutString(message, fontSize, letterSpacing):
+            self.drawGlyf(
+                screen, glyphId, (locX + x, locY), fontSize=fontSize, color=color
+            )
+
+    def snapFontSize(self, fontSize: float) -> Tuple[int, float]:
+        # Sizes are snapped to quarter pixels per em so that nearby sizes
+        # share atlas entries
+        quarterPixels = round(fontSize * self.headTable.unitsPerEm * 4)
+        return quarterPixels, quarterPixels / (self.headTable.unitsPerEm * 4)
+
+    def glyphRect(self, glyphId: int, loc: Tuple[int, int], fontSize=0.05) -> Rect:
+        # Screen area drawGlyf covers, without drawing anything
+        quarterPixels, fontSize = self.snapFontSize(fontSize)
+        if self.sdf:
+            left, top, width, height = self.getSdfAtlas().bounds(glyphId, fontSize)
+        else:
+            left, top, width, height = self.instanceGlyph(glyphId).bounds(fontSize)
+        return Rect(round(loc[0]) + left, round(loc[1]) + top, width, height)
 
     def drawGlyf(
         self,
@@ -246,5 +976,12 @@ class Font:
         fontSize=0.05,
         color=Colors.Text.value,
     ):
-        glyph = self.glyphs[glyphId]
-        glyph.draw(screen, loc, fontSize=fontSize, color=color)
+        quarterPixels, fontSize = self.snapFontSize(fontSize)
+        if self.sdf:
+            # Sampled from the distance field, no outline work at any size
+            rasterize = lambda: self.getSdfAtlas().render(glyphId, fontSize)
+        else:
+            rasterize = lambda: self.instanceGlyph(glyphId).rasterize(fontSize)
+        # Instances share the atlas, their masks are keyed by location
+        key = (glyphId, quarterPixels, tuple(color), self.sdf, self.coords)
+        self.atlas.draw(screen, key, loc, color, rasterize)
@@ -0,0 +1,140 @@
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+import hashlib
+import mmap
+import os
+import struct
+import numpy as np
+
+CACHE_MAGIC = b"FNTSACHE"
+# 2: trailing left side bearings are signed
+# 3: glyph bounding boxes
+# 4: modification time of the font
+# 5: components of compound glyphs
+CACHE_VERSION = 5
+CACHE_HEADER = struct.Struct("<8sIQq16sI")
+CACHE_ENTRY = struct.Struct("<16s8sQQ")
+ALIGNMENT = 8
+
+
+class SourceKey(NamedTuple):
+    # The font a cache was built from. Hashing reads the whole font, so it is
+    # only done when a cache is written, later opens compare size and mtime.
+    size: int
+    mtime: int
+    checksum: bytes
+
+
+def defaultCacheDir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "fontsa"
+
+
+def fileStats(file: str) -> Tuple[int, int]:
+    stat = os.stat(file)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def sourceKey(file: str) -> SourceKey:
+    size, mtime = fileStats(file)
+    data = Path(file).read_bytes()
+    return SourceKey(size, mtime, hashlib.blake2b(data, digest_size=16).digest())
+
+
+def cachePath(
+    file: str,
+    cacheDir: Optional[str] = None,
+    fontNumber: int = 0,
+    extension: str = "fontcache",
+) -> Path:
+    directory = Path(cacheDir) if cacheDir else defaultCacheDir()
+    resolved = str(Path(file).resolve()).encode("utf-8")
+    name = hashlib.blake2b(resolved, digest_size=8).hexdigest()
+    # Every font of a collection gets its own cache
+    suffix = f"-{fontNumber}" if fontNumber else ""
+    return directory / f"{Path(file).stem}-{name}{suffix}.{extension}"
+
+
+class FontCache:
+    path: Path
+    map: mmap.mmap
+    key: SourceKey
+    arrays: Dict[str, np.ndarray]
+
+    def __init__(
+        self, path: Path, map: mmap.mmap, key: SourceKey, arrays: Dict[str, np.ndarray]
+    ) -> None:
+        self.path = path
+        self.map = map
+        self.key = key
+        self.arrays = arrays
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    @staticmethod
+    def load(path: Path) -> Optional["FontCache"]:
+        # Returns None when the cache is missing or unreadable, callers check
+        # its key against their font
+        try:
+            with open(path, "rb") as f:
+                map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        if len(map) < CACHE_HEADER.size:
+            return None
+        magic, version, size, mtime, checksum, count = CACHE_HEADER.unpack_from(map, 0)
+        if (
+            magic != CACHE_MAGIC
+            or version != CACHE_VERSION
+            or len(map) < CACHE_HEADER.size + count * CACHE_ENTRY.size
+        ):
+            return None
+
+        arrays: Dict[str, np.ndarray] = {}
+        index = CACHE_HEADER.size
+        for _ in range(count):
+            name, dtype, length, offset = CACHE_ENTRY.unpack_from(map, index)
+            index += CACHE_ENTRY.size
+            dtype = np.dtype(dtype.rstrip(b"\0").decode("ascii"))
+            if offset + length * dtype.itemsize > len(map):
+                return None
+            arrays[name.rstrip(b"\0").decode("ascii")] = np.frombuffer(
+                map, dtype=dtype, count=length, offset=offset
+            )
+        return FontCache(path, map, SourceKey(size, mtime, checksum), arrays)
+
+    @staticmethod
+    def write(path: Path, key: SourceKey, arrays: Dict[str, np.ndarray]) -> None:
+        header = CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, *key, len(arrays))
+        offset = len(header) + len(arrays) * CACHE_ENTRY.size
+
+        entries = []
+        chunks = []
+        for name, array in arrays.items():
+            if len(name) > 16:
+                raise ValueError(f"Cache array name {name!r} is over 16 characters")
+            array = np.ascontiguousarray(array).reshape(-1)
+            padding = -offset % ALIGNMENT
+            offset += padding
+            entries.append(
+                CACHE_ENTRY.pack(
+                    name.encode("ascii"),
+                    array.dtype.str.encode("ascii"),
+                    len(array),
+                    offset,
+                )
+            )
+            chunks.append(b"\0" * padding)
+            chunks.append(array.tobytes())
+            offset += array.nbytes
+
+        # Write next to the target and rename so readers never see half a file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary, "wb") as f:
+            f.write(header)
+            f.writelines(entries)
+            f.writelines(chunks)
+        os.replace(temporary, path)
@@ -0,0 +1,86 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from file_reader import RangeFileReader
+from font import Font
+
+FONT_PATTERNS = ("*.ttf", "*.ttc")
+
+# (file, font number inside the file)
+FontFace = Tuple[str, int]
+
+
+def collectionFaces(file: str) -> List[FontFace]:
+    # Only the 12 byte header is read
+    reader = RangeFileReader(file)
+    try:
+        if reader.parseTag() != "ttcf":
+            return [(file, 0)]
+        majorVersion = reader.parseUint16()
+        minorVersion = reader.parseUint16()
+        numFonts = reader.parseUint32()
+    finally:
+        reader.close()
+    return [(file, fontNumber) for fontNumber in range(numFonts)]
+
+
+def loadFace(face: FontFace, options: Dict) -> Font:
+    file, fontNumber = face
+    return Font(file, fontNumber=fontNumber, **options)
+
+
+class FontCollection:
+    fonts: List[Font]
+    names: Dict[str, Font]
+
+    def __init__(self, fonts: Sequence[Font]) -> None:
+        self.fonts = list(fonts)
+        self.names = {}
+        for font in self.fonts:
+            name = Path(font.file).stem
+            if font.fontNumber:
+                name = f"{name}#{font.fontNumber}"
+            self.names[name] = font
+
+    def __len__(self) -> int:
+        return len(self.fonts)
+
+    def __iter__(self) -> Iterator[Font]:
+        return iter(self.fonts)
+
+    def __getitem__(self, key) -> Font:
+        # By position or by file stem, "#n" picks a font inside a .ttc
+        if isinstance(key, str):
+            return self.names[key]
+        return self.fonts[key]
+
+    @staticmethod
+    def fromFiles(
+        files: Sequence[str],
+        workers: Optional[int] = None,
+        lazy: bool = False,
+        **options,
+    ) -> "FontCollection":
+        # Eager by default, decoding every glyph is the work worth spreading
+        # over processes, a lazy font loads faster than a process starts
+        faces = [face for file in files for face in collectionFaces(str(file))]
+        options = dict(options, lazy=lazy)
+        if workers == 1 or len(faces) <= 1:
+            return FontCollection([loadFace(face, options) for face in faces])
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            fonts = list(executor.map(loadFace, faces, [options] * len(faces)))
+        return FontCollection(fonts)
+
+    @staticmethod
+    def fromDirectory(
+        directory: str, workers: Optional[int] = None, lazy: bool = False, **options
+    ) -> "FontCollection":
+        files = sorted(
+            {
+                file
+                for pattern in FONT_PATTERNS
+                for file in Path(directory).glob(pattern)
+            }
+        )
+        return FontCollection.fromFiles(files, workers=workers, lazy=lazy, **options)
@@ -0,0 +1,211 @@
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+from kerning import KERN_HORIZONTAL
+from tables import HeadTable, MaxpTable
+import struct
+
+SFNT_VERSION = 0x00010000
+SFNT_HEADER = struct.Struct(">IHHHH")
+TABLE_RECORD = struct.Struct(">4sIII")
+CHECKSUM_MAGIC = 0xB1B0AFBA
+HEAD_TABLE = struct.Struct(">HHIIIHHqqhhhhHHhhh")
+MAXP_TABLE = struct.Struct(">I14H")
+KERN_PAIR = struct.Struct(">HHh")
+POST_HEADER_SIZE = 32
+POST_FORMAT_3 = 0x00030000
+# A format 0 kern subtable has a 16 bit length
+MAX_KERN_PAIRS = (0xFFFF - 14) // KERN_PAIR.size
+
+# Byte offsets of the fields rewritten in copied tables
+HEAD_CHECKSUM_ADJUSTMENT = 8
+HEAD_INDEX_TO_LOC_FORMAT = 50
+HHEA_NUMBER_OF_HMETRICS = 34
+# advanceWidthMax, minLeftSideBearing, minRightSideBearing and xMaxExtent
+HHEA_EXTREMES = 10
+MAXP_NUM_GLYPHS = 4
+
+
+def pad4(data: bytes) -> bytes:
+    return data + b"\0" * (-len(data) % 4)
+
+
+def tableChecksum(data: bytes) -> int:
+    data = pad4(data)
+    return sum(struct.unpack(f">{len(data) // 4}I", data)) & 0xFFFFFFFF
+
+
+def searchParams(count: int, unit: int) -> Tuple[int, int, int]:
+    # (searchRange, entrySelector, rangeShift) as used by the sfnt header
+    # and cmap format 4
+    entrySelector = max(count.bit_length() - 1, 0)
+    searchRange = (1 << entrySelector) * unit
+    return searchRange, entrySelector, count * unit - searchRange
+
+
+def setField(data: bytes, offset: int, format: str, *values: int) -> bytes:
+    patched = bytearray(data)
+    struct.pack_into(format, patched, offset, *values)
+    return bytes(patched)
+
+
+def buildFont(tables: Dict[str, bytes]) -> bytes:
+    tags = sorted(tables)
+    if "head" in tables:
+        tables = dict(
+            tables, head=setField(tables["head"], HEAD_CHECKSUM_ADJUSTMENT, ">I", 0)
+        )
+
+    searchRange, entrySelector, rangeShift = searchParams(len(tags), 16)
+    header = SFNT_HEADER.pack(
+        SFNT_VERSION, len(tags), searchRange, entrySelector, rangeShift
+    )
+    offset = len(header) + len(tags) * TABLE_RECORD.size
+
+    records = []
+    for tag in tags:
+        data = tables[tag]
+        records.append(
+            TABLE_RECORD.pack(
+                tag.encode("ascii"), tableChecksum(data), offset, len(data)
+            )
+        )
+        offset += len(pad4(data))
+    font = header + b"".join(records) + b"".join(pad4(tables[tag]) for tag in tags)
+
+    if "head" not in tables:
+        return font
+    # The adjustment makes the checksum of the whole file come out to the magic
+    adjustment = (CHECKSUM_MAGIC - tableChecksum(font)) & 0xFFFFFFFF
+    headOffset = TABLE_RECORD.unpack_from(records[tags.index("head")])[2]
+    return setField(font, headOffset + HEAD_CHECKSUM_ADJUSTMENT, ">I", adjustment)
+
+
+def writeFont(path: str, tables: Dict[str, bytes]) -> None:
+    Path(path).write_bytes(buildFont(tables))
+
+
+def buildHead(headTable: HeadTable) -> bytes:
+    return HEAD_TABLE.pack(*headTable)
+
+
+def buildMaxp(maxpTable: MaxpTable) -> bytes:
+    # Version 1.0, the one TrueType outlines use
+    return MAXP_TABLE.pack(*maxpTable)
+
+
+def buildPost(post: bytes) -> bytes:
+    # Keeps the header of an existing table and drops its glyph names
+    return setField(post[:POST_HEADER_SIZE], 0, ">I", POST_FORMAT_3)
+
+
+def buildGlyf(glyphData: Sequence[bytes]) -> Tuple[bytes, bytes, int]:
+    # Returns (loca, glyf, indexToLocFormat), glyphs are 4 byte aligned
+    offsets = [0]
+    for data in glyphData:
+        offsets.append(offsets[-1] + len(pad4(data)))
+    glyf = b"".join(pad4(data) for data in glyphData)
+    if offsets[-1] < 0x20000:
+        return struct.pack(f">{len(offsets)}H", *(o // 2 for o in offsets)), glyf, 0
+    return struct.pack(f">{len(offsets)}I", *offsets), glyf, 1
+
+
+def buildHmtx(metrics: Sequence[Tuple[int, int]]) -> Tuple[bytes, int]:
+    # (advanceWidth, leftSideBearing) per glyph. Returns the table and its
+    # numberOfHMetrics, trailing glyphs sharing the last advance are stored
+    # as bare side bearings.
+    count = len(metrics)
+    while count > 1 and metrics[count - 2][0] == metrics[-1][0]:
+        count -= 1
+    longMetrics = b"".join(struct.pack(">Hh", *metric) for metric in metrics[:count])
+    bearings = [lsb for _, lsb in metrics[count:]]
+    return longMetrics + struct.pack(f">{len(bearings)}h", *bearings), count
+
+
+def mappingRuns(mapping: Dict[int, int]) -> List[Tuple[int, int, int]]:
+    # (startCode, endCode, startGlyphId) for runs of consecutive codes that
+    # map to consecutive glyphs
+    runs: List[Tuple[int, int, int]] = []
+    for code in sorted(mapping):
+        glyphId = mapping[code]
+        if runs:
+            start, end, startGlyph = runs[-1]
+            if code == end + 1 and glyphId == startGlyph + code - start:
+                runs[-1] = (start, code, startGlyph)
+                continue
+        runs.append((code, code, glyphId))
+    return runs
+
+
+def buildCmapFormat4(mapping: Dict[int, int]) -> bytes:
+    # Format 4 only reaches the BMP and must end with a 0xFFFF segment
+    runs = [
+        (start, min(end, 0xFFFE), glyphId)
+        for start, end, glyphId in mappingRuns(mapping)
+        if start < 0xFFFF
+    ]
+    runs.append((0xFFFF, 0xFFFF, 0))
+    segCountX2 = 2 * len(runs)
+    searchRange, entrySelector, rangeShift = searchParams(len(runs), 2)
+    length = 16 + 4 * segCountX2
+    return b"".join(
+        (
+            struct.pack(
+                ">7H", 4, length, 0, segCountX2, searchRange, entrySelector, rangeShift
+            ),
+            struct.pack(f">{len(runs)}H", *(end for _, end, _ in runs)),
+            struct.pack(">H", 0),
+            struct.pack(f">{len(runs)}H", *(start for start, _, _ in runs)),
+            struct.pack(
+                f">{len(runs)}H",
+                *((glyphId - start) & 0xFFFF for start, _, glyphId in runs),
+            ),
+            struct.pack(f">{len(runs)}H", *([0] * len(runs))),
+        )
+    )
+
+
+def buildCmapFormat12(mapping: Dict[int, int]) -> bytes:
+    runs = mappingRuns(mapping)
+    groups = b"".join(struct.pack(">III", *run) for run in runs)
+    return struct.pack(">HHIII", 12, 0, 16 + len(groups), 0, len(runs)) + groups
+
+
+def buildCmap(mapping: Dict[int, int]) -> bytes:
+    # Windows BMP subtable, plus a full repertoire one when codes go past it
+    subtables = [((3, 1), buildCmapFormat4(mapping))]
+    if any(code > 0xFFFF for code in mapping):
+        subtables.append(((3, 10), buildCmapFormat12(mapping)))
+
+    offset = 4 + 8 * len(subtables)
+    header = struct.pack(">HH", 0, len(subtables))
+    for (platformId, encodingId), data in subtables:
+        header += struct.pack(">HHI", platformId, encodingId, offset)
+        offset += len(data)
+    return header + b"".join(data for _, data in subtables)
+
+
+def buildKern(pairs: Sequence[Tuple[int, int, int]]) -> bytes:
+    # Legacy kern table of (left, right, value) pairs in format 0 subtables.
+    # Subtables add up, pairs that don't fit one go into the next.
+    pairs = sorted(pairs)
+    chunks = [
+        pairs[i : i + MAX_KERN_PAIRS] for i in range(0, len(pairs), MAX_KERN_PAIRS)
+    ]
+    subtables = []
+    for chunk in chunks:
+        searchRange, entrySelector, rangeShift = searchParams(
+            len(chunk), KERN_PAIR.size
+        )
+        body = b"".join(KERN_PAIR.pack(*pair) for pair in chunk)
+        header = struct.pack(
+            ">7H",
+            0,
+            14 + len(body),
+            KERN_HORIZONTAL,
+            len(chunk),
+            searchRange,
+            entrySelector,
+            rangeShift,
+        )
+        subtables.append(header + body)
+    return struct.pack(">HH", 0, len(subtables)) + b"".join(subtables)
@@ -1,128 +1,314 @@
-from typing import List, Tuple
-from utils import isNthBitOn
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, NamedTuple, Sequence, Tuple
 from file_reader import BinaryFileReader
+from flatten import DEFAULT_TOLERANCE, flattenContours, quantizeScale
+from profiler import PROFILER
+from rasterizer import rasterize
 from styles import Colors
-import pygame.gfxdraw
+import math
+import numpy as np
 import pygame
 
+# Coordinate bits of a simple glyph flag
+ON_CURVE = 1
+X_SHORT = 1 << 1
+Y_SHORT = 1 << 2
+REPEAT = 1 << 3
+X_SAME_OR_POSITIVE = 1 << 4
+Y_SAME_OR_POSITIVE = 1 << 5
 
-class SimpleGlyph:
-    isCompound: bool
-    numberOfContours: int
-    endPtsOfContours: List[int]
-    flags: List[bytes]
-    points: List[Tuple[int, int]]
+# Component flags of a compound glyph
+ARG_1_AND_2_ARE_WORDS = 1
+ARGS_ARE_XY_VALUES = 1 << 1
+ROUND_XY_TO_GRID = 1 << 2
+WE_HAVE_A_SCALE = 1 << 3
+MORE_COMPONENTS = 1 << 5
+WE_HAVE_AN_X_AND_Y_SCALE = 1 << 6
+WE_HAVE_A_TWO_BY_TWO = 1 << 7
+WE_HAVE_INSTRUCTIONS = 1 << 8
+USE_MY_METRICS = 1 << 9
+SCALED_COMPONENT_OFFSET = 1 << 11
 
-    def __init__(
-        self,
-        numberOfContours: int,
-        endPtsOfContours: List[int],
-        flags: List[bytes],
-        points: List[Tuple[int, int]],
-    ) -> None:
-        self.isCompound = False
-        self.numberOfContours = numberOfContours
-        self.endPtsOfContours = endPtsOfContours
-        self.flags = flags
-        self.points = points
+# Lookup tables indexed by (flag >> 1) & 9 for x and (flag >> 2) & 9 for y,
+# which puts the SHORT bit at 1 and the SAME_OR_POSITIVE bit at 8
+COORD_SIZE = np.zeros(16, dtype=np.int64)
+COORD_SIZE[[0, 1, 8, 9]] = [2, 1, 0, 1]
+SHORT_SIGN = np.zeros(16, dtype=np.int64)
+SHORT_SIGN[[1, 9]] = [-1, 1]
+IS_WORD = np.zeros(16, dtype=np.int64)
+IS_WORD[0] = 1
+
+# A single glyph up to this many points decodes faster point by point than
+# through the array pipeline, whose fixed cost is a few dozen NumPy calls
+SMALL_GLYPH_POINTS = 500
 
-    @staticmethod
-    def fromReader(reader: BinaryFileReader, numberOfContours: int):
-        xMin = reader.parseInt16()
-        yMin = reader.parseInt16()
-        xMax = reader.parseInt16()
-        yMax = reader.parseInt16()
 
-        endPtsOfContours: List[int] = []
-        for _ in range(numberOfContours):
-            endPtsOfContours.append(reader.parseUint16())
+def segmentStarts(lengths: np.ndarray) -> np.ndarray:
+    return np.cumsum(lengths) - lengths
 
-        numberOfPoints = endPtsOfContours[-1] + 1
+
+def segmentCumsum(values: np.ndarray, segments: np.ndarray, starts: np.ndarray):
+    total = np.cumsum(values)
+    before = total - values
+    return total - before[starts][segments]
+
+
+def decodeSimpleGlyphs(
+    reader: BinaryFileReader, locations: Sequence[int]
+) -> List["SimpleGlyph"]:
+    if not locations:
+        return []
+
+    # Headers are variable length and are walked one glyph at a time, the
+    # flag and coordinate streams of every glyph are then decoded together
+    endPts: List[np.ndarray] = []
+    flagStarts: List[int] = []
+    pointCounts: List[int] = []
+    for loc in locations:
+        reader.goto(loc)
+        numberOfContours = reader.parseInt16()
+        reader.skip(8)
+        endPtsOfContours = reader.parseUint16Array(numberOfContours)
         instructionLength = reader.parseUint16()
-        instructions: List[int] = []
-        for _ in range(instructionLength):
-            instructions.append(reader.parseUint8())
+        reader.skip(instructionLength)
+        endPts.append(np.asarray(endPtsOfContours, dtype=np.int32))
+        flagStarts.append(reader.index)
+        pointCounts.append(endPtsOfContours[-1] + 1)
 
-        flags: List[bytes] = []
+    data = np.frombuffer(reader.buf, dtype=np.uint8)
+    last = len(data) - 1
+    numGlyphs = len(locations)
+    glyphIds = np.arange(numGlyphs)
+    counts = np.array(pointCounts, dtype=np.int64)
+    starts = np.array(flagStarts, dtype=np.int64)
 
-        while len(flags) < numberOfPoints:
-            flag = reader.takeBytes(1)
-            repeat = isNthBitOn(flag, 3)
-            flags.append(flag)
+    # Flags and repeat counts of a glyph fit in 2 bytes per point
+    windows = np.minimum(2 * counts, len(data) - starts)
+    windowStarts = segmentStarts(windows)
+    windowGlyph = np.repeat(glyphIds, windows)
+    positions = np.arange(int(windows.sum()))
+    stream = data[starts[windowGlyph] + positions - windowStarts[windowGlyph]]
 
-            if repeat:
-                repeatCount = reader.parseUint8()
-                for _ in range(repeatCount):
-                    flags.append(flag)
+    # A byte is a repeat count only when it follows a flag with the REPEAT bit,
+    # so inside a run of REPEAT bytes flags and counts alternate. The byte
+    # before each window acts as a barrier so runs never cross glyphs.
+    clear = np.where((stream & REPEAT) != 0, -1, positions)
+    clear[windowStarts[1:] - 1] = windowStarts[1:] - 1
+    lastClear = np.maximum.accumulate(clear)
+    runBefore = np.zeros(len(stream), dtype=np.int64)
+    runBefore[1:] = positions[1:] - 1 - lastClear[:-1]
+    runBefore[windowStarts] = 0
+    flagPositions = np.flatnonzero(runBefore % 2 == 0)
 
-        xCoords: List[int] = []
-        yCoords: List[int] = []
-        xAcc: int = 0
-        yAcc: int = 0
+    runFlags = stream[flagPositions]
+    repeatCounts = stream[np.minimum(flagPositions + 1, len(stream) - 1)]
+    runLengths = 1 + np.where(runFlags & REPEAT, repeatCounts, 0).astype(np.int64)
+    runGlyph = windowGlyph[flagPositions]
+    firstRun = np.searchsorted(runGlyph, glyphIds)
+    runEnds = segmentCumsum(runLengths, runGlyph, firstRun)
 
-        for flag in flags:
-            xShort = isNthBitOn(flag, 1)
-            yOffset: int
-
-            if xShort:
-                yOffset = reader.parseUint8()
-                isPositive = isNthBitOn(flag, 4)
-                if not isPositive:
-                    yOffset *= -1
-            else:
-                isRepeat = isNthBitOn(flag, 4)
-                if isRepeat:
-                    yOffset = 0
-                else:
-                    yOffset = reader.parseInt16()
-
-            xAcc += yOffset
-            xCoords.append(xAcc)
+    # Drop runs past the last point and trim the one that overshoots it
+    keep = runEnds - runLengths < counts[runGlyph]
+    runLengths = np.minimum(runLengths, counts[runGlyph] - (runEnds - runLengths))
+    flags = np.repeat(runFlags[keep], runLengths[keep])
 
-        for flag in flags:
-            yShort = isNthBitOn(flag, 2)
-            yOffset: int
-
-            if yShort:
-                yOffset = reader.parseUint8()
-                isPositive = isNthBitOn(flag, 5)
-                if not isPositive:
-                    yOffset *= -1
-            else:
-                isRepeat = isNthBitOn(flag, 5)
-                if isRepeat:
-                    yOffset = 0
-                else:
-                    yOffset = reader.parseInt16()
-
-            yAcc += yOffset
-            yCoords.append(yAcc)
+    lastRun = firstRun + np.bincount(runGlyph[keep], minlength=numGlyphs) - 1
+    lastFlag = flagPositions[lastRun]
+    flagEnds = (
+        starts + lastFlag - windowStarts + 1 + ((runFlags[lastRun] & REPEAT) != 0)
+    )
 
-        return SimpleGlyph(
-            numberOfContours=numberOfContours,
-            endPtsOfContours=endPtsOfContours,
-            flags=flags,
-            points=[(xCoords[i], yCoords[i]) for i in range(endPtsOfContours[-1] + 1)],
+    # The x stream of a glyph is followed by its y stream
+    pointStarts = segmentStarts(counts)
+    pointGlyph = np.repeat(glyphIds, counts)
+    xCodes = (flags >> 1) & 9
+    yCodes = (flags >> 2) & 9
+    xSizes = COORD_SIZE[xCodes]
+    ySizes = COORD_SIZE[yCodes]
+    xEnds = segmentCumsum(xSizes, pointGlyph, pointStarts)
+    yEnds = segmentCumsum(ySizes, pointGlyph, pointStarts)
+    xLengths = xEnds[pointStarts + counts - 1]
+    xOffsets = flagEnds[pointGlyph] + xEnds - xSizes
+    yOffsets = (flagEnds + xLengths)[pointGlyph] + yEnds - ySizes
+
+    coords: List[np.ndarray] = []
+    for offsets, codes in ((xOffsets, xCodes), (yOffsets, yCodes)):
+        # Coordinates that take no bytes still read a valid index, unused
+        first = data[np.minimum(offsets, last)].astype(np.int64)
+        second = data[np.minimum(offsets + 1, last)].astype(np.int64)
+        words = ((first << 8) | second).astype(np.uint16).view(np.int16)
+        deltas = first * SHORT_SIGN[codes] + words * IS_WORD[codes]
+        coords.append(segmentCumsum(deltas, pointGlyph, pointStarts))
+
+    points = np.stack(coords, axis=1).astype(np.int32)
+    glyphs: List[SimpleGlyph] = []
+    for i, (start, count) in enumerate(zip(pointStarts.tolist(), pointCounts)):
+        glyphs.append(
+            SimpleGlyph(
+                numberOfContours=len(endPts[i]),
+                endPtsOfContours=endPts[i],
+                flags=flags[start : start + count],
+                points=points[start : start + count],
+            )
         )
+    return glyphs
 
-    def drawSpline(
-        self,
-        screen: pygame.Surface,
-        points: List[Tuple[int, int]],
-        color,
+
+def decodeSmallGlyph(
+    reader: BinaryFileReader, numberOfContours: int, endPtsOfContours: np.ndarray
+) -> "SimpleGlyph":
+    # The reader sits at the instruction length, just past endPtsOfContours
+    count = int(endPtsOfContours[-1]) + 1
+    instructionLength = reader.parseUint16()
+    start = reader.index + instructionLength
+    # Flags and repeat counts take at most 2 bytes a point, coordinates 4
+    data = bytes(reader.buf[start : start + 6 * count])
+
+    flags: List[int] = []
+    index = 0
+    while len(flags) < count:
+        flag = data[index]
+        index += 1
+        if flag & REPEAT:
+            flags += [flag] * (data[index] + 1)
+            index += 1
+        else:
+            flags.append(flag)
+    del flags[count:]
+
+    points = np.empty((count, 2), dtype=np.int32)
+    for axis, short, same in (
+        (0, X_SHORT, X_SAME_OR_POSITIVE),
+        (1, Y_SHORT, Y_SAME_OR_POSITIVE),
     ):
-        steps = 1000
-        startPoint = points[0]
-        for i, point in enumerate(points[1:-1]):
-            pb = points[i + 2]
-            midPoint = (point[0] + pb[0]) / 2, (point[1] + pb[1]) / 2
-            pygame.gfxdraw.bezier(screen, [startPoint, point, midPoint], steps, color)
-            startPoint = midPoint
-
-        pygame.gfxdraw.bezier(
-            screen, [startPoint, points[-2], points[-1]], steps, color
+        value = 0
+        values: List[int] = []
+        for flag in flags:
+            if flag & short:
+                value += data[index] if flag & same else -data[index]
+                index += 1
+            elif not flag & same:
+                value += ((data[index] << 8 | data[index + 1]) ^ 0x8000) - 0x8000
+                index += 2
+            values.append(value)
+        points[:, axis] = values
+    return SimpleGlyph(
+        numberOfContours=numberOfContours,
+        endPtsOfContours=endPtsOfContours,
+        flags=np.frombuffer(bytes(flags), dtype=np.uint8),
+        points=points,
+    )
+
+
+def packGlyphs(glyphs: Sequence["Glyph"], pointType) -> Dict[str, np.ndarray]:
+    # Flat arrays for a whole glyph set, glyph i spans
+    # pointStarts[i]:pointStarts[i + 1] and contourStarts[i]:contourStarts[i + 1]
+    pointCounts = [len(glyph.points) for glyph in glyphs]
+    contourCounts = [len(glyph.endPtsOfContours) for glyph in glyphs]
+    return {
+        "pointStarts": np.cumsum([0] + pointCounts, dtype=np.int64),
+        "contourStarts": np.cumsum([0] + contourCounts, dtype=np.int64),
+        "points": np.concatenate(
+            [glyph.points for glyph in glyphs], dtype=pointType
+        ).reshape(-1),
+        "flags": np.concatenate([glyph.flags for glyph in glyphs]),
+        "endPts": np.concatenate(
+            [glyph.endPtsOfContours for glyph in glyphs], dtype=np.int32
+        ),
+    }
+
+
+def packComponents(glyphs: Sequence["Glyph"]) -> Dict[str, np.ndarray]:
+    # Component references to go with packGlyphs so compounds unpack as
+    # compounds, glyph i's span componentStarts[i]:componentStarts[i + 1]
+    components = [
+        component
+        for glyph in glyphs
+        if glyph.isCompound
+        for component in glyph.components
+    ]
+    counts = [len(glyph.components) if glyph.isCompound else 0 for glyph in glyphs]
+    return {
+        "componentStarts": np.cumsum([0] + counts, dtype=np.int64),
+        "componentIds": np.array(
+            [component.glyphId for component in components], dtype=np.int64
+        ),
+        # The matrix then the offset of each component, 6 numbers
+        "transforms": np.array(
+            [(*component.matrix.flat, *component.offset) for component in components],
+            dtype=np.float64,
+        ).reshape(-1),
+    }
+
+
+def unpackGlyph(
+    arrays: Dict[str, np.ndarray],
+    glyphId: int,
+    componentGlyph: Callable[[int], "Glyph"],
+) -> "Glyph":
+    # componentGlyph returns the glyph a component refers to, callers share
+    # them between compounds
+    componentStart, componentEnd = arrays["componentStarts"][
+        glyphId : glyphId + 2
+    ].tolist()
+    if componentEnd > componentStart:
+        componentIds = arrays["componentIds"][componentStart:componentEnd].tolist()
+        transforms = arrays["transforms"][6 * componentStart : 6 * componentEnd]
+        transforms = transforms.reshape(-1, 6)
+        return CompoundGlyph(
+            [
+                Component(
+                    componentId,
+                    componentGlyph(componentId),
+                    transform[:4].reshape(2, 2),
+                    transform[4:],
+                )
+                for componentId, transform in zip(componentIds, transforms)
+            ]
         )
 
+    pointStart, pointEnd = arrays["pointStarts"][glyphId : glyphId + 2].tolist()
+    contourStart, contourEnd = arrays["contourStarts"][glyphId : glyphId + 2].tolist()
+    return SimpleGlyph(
+        numberOfContours=contourEnd - contourStart,
+        endPtsOfContours=arrays["endPts"][contourStart:contourEnd],
+        flags=arrays["flags"][pointStart:pointEnd],
+        points=arrays["points"][2 * pointStart : 2 * pointEnd],
+    )
+
+
+def unpackGlyphs(arrays: Dict[str, np.ndarray], numGlyphs: int) -> List["Glyph"]:
+    # A whole packed glyph set, with every component unpacked once
+    glyphs: Dict[int, Glyph] = {}
+
+    def unpack(glyphId: int) -> Glyph:
+        glyph = glyphs.get(glyphId)
+        if glyph is None:
+            glyph = glyphs[glyphId] = unpackGlyph(arrays, glyphId, unpack)
+        return glyph
+
+    return [unpack(glyphId) for glyphId in range(numGlyphs)]
+
+
+class Glyph(ABC):
+    # Drawing shared by simple and compound glyphs, both provide points,
+    # flags, endPtsOfContours and flatten
+    __slots__ = ()
+
+    isCompound: bool
+    numberOfContours: int
+    endPtsOfContours: np.ndarray
+    flags: np.ndarray
+    points: np.ndarray
+    # Levels of components below the glyph, 0 for a simple glyph
+    depth: int
+
+    @abstractmethod
+    def flatten(
+        self, scale: float, tolerance: float = DEFAULT_TOLERANCE
+    ) -> List[np.ndarray]:
+        pass
+
     def draw(
         self,
         screen: pygame.Surface,
@@ -131,39 +317,201 @@ class SimpleGlyph:
         color=Colors.Text.value,
     ):
         locX, locY = loc
-        newPoints = [
-            (x * fontSize + locX, 300 - y * fontSize + locY) for x, y in self.points
+        if fontSize <= 0:
+            return
+        for polyline in self.flatten(fontSize):
+            screenPoints = polyline * (fontSize, -fontSize) + (locX, 300 + locY)
+            rect = pygame.draw.aalines(screen, color, True, screenPoints.tolist())
+            if PROFILER.enabled:
+                PROFILER.count("pixels.drawn", rect.width * rect.height)
+
+    def bounds(self, fontSize=0.05) -> Tuple[int, int, int, int]:
+        # (left, top, width, height) of the rasterized mask, left and top are
+        # relative to the loc passed to draw
+        points = self.points
+        # Sizes under a quarter pixel snap to 0 and draw nothing
+        if len(points) == 0 or fontSize <= 0:
+            return 0, 0, 0, 0
+
+        pad = 1
+        xMin, yMin = (points.min(axis=0) * fontSize).tolist()
+        xMax, yMax = (points.max(axis=0) * fontSize).tolist()
+        left = math.floor(xMin) - pad
+        top = math.floor(300 - yMax) - pad
+        width = math.ceil(xMax) - math.floor(xMin) + 2 * pad
+        height = math.ceil(yMax) - math.floor(yMin) + 2 * pad
+        return left, top, width, height
+
+    def rasterize(self, fontSize=0.05) -> Tuple[np.ndarray, int, int]:
+        left, top, width, height = self.bounds(fontSize)
+        if width == 0:
+            return np.zeros((0, 0), dtype=np.uint8), 0, 0
+
+        polylines = [
+            polyline * (fontSize, -fontSize) + (-left, 300 - top)
+            for polyline in self.flatten(fontSize)
         ]
+        with PROFILER.stage("rasterize"):
+            mask = rasterize(polylines, width, height)
+        if PROFILER.enabled:
+            PROFILER.count("rasterize.pixels", width * height)
+        return mask, left, top
+
+
+class SimpleGlyph(Glyph):
+    __slots__ = (
+        "isCompound",
+        "numberOfContours",
+        "endPtsOfContours",
+        "flags",
+        "points",
+        "flattened",
+    )
+
+    isCompound: bool
+    numberOfContours: int
+    endPtsOfContours: np.ndarray
+    flags: np.ndarray
+    points: np.ndarray
+    flattened: Dict[Tuple[int, float], List[np.ndarray]]
+    depth = 0
+
+    def __init__(
+        self,
+        numberOfContours: int,
+        endPtsOfContours: Sequence[int],
+        flags: Sequence[int],
+        points: Sequence[Tuple[int, int]],
+    ) -> None:
+        self.isCompound = False
+        self.numberOfContours = numberOfContours
+        self.endPtsOfContours = np.asarray(endPtsOfContours, dtype=np.int32)
+        self.flags = np.asarray(flags, dtype=np.uint8)
+        points = np.asarray(points)
+        if points.dtype.kind != "f":
+            points = points.astype(np.int32, copy=False)
+        self.points = points.reshape(-1, 2)
+        self.flattened = {}
 
-        startIndex = 0
-
-        spline: List[Tuple[int, int]] = []
-        for endIndex in self.endPtsOfContours:
-            spline = []
-            for _i, p in enumerate(newPoints[startIndex : endIndex + 1]):
-                i = _i + startIndex
-                onTheCurve = isNthBitOn(self.flags[i], 0)
-                if not onTheCurve:
-                    spline.append(p)
-                elif len(spline) == 1:
-                    pygame.draw.aaline(screen, color, spline[0], p)
-                    spline = [p]
-                elif len(spline) > 1:
-                    spline.append(p)
-                    self.drawSpline(screen, spline, color)
-                    spline = [p]
-                else:
-                    spline.append(p)
-            # Last countour with starting point
-            if len(spline) == 1:
-                pygame.draw.aaline(screen, color, spline[0], newPoints[startIndex])
-            else:
-                spline.append(newPoints[startIndex])
-                self.drawSpline(screen, spline, color)
-
-            startIndex = endIndex + 1
+    @staticmethod
+    def empty() -> "SimpleGlyph":
+        return SimpleGlyph(numberOfContours=0, endPtsOfContours=[], flags=[], points=[])
+
+    @staticmethod
+    def fromReader(reader: BinaryFileReader, numberOfContours: int):
+        # The reader sits just past numberOfContours at the start of the glyph
+        start = reader.index - 2
+        reader.skip(8)
+        endPtsOfContours = np.asarray(
+            reader.parseUint16Array(numberOfContours), dtype=np.int32
+        )
+        if endPtsOfContours[-1] < SMALL_GLYPH_POINTS:
+            return decodeSmallGlyph(reader, numberOfContours, endPtsOfContours)
+        return decodeSimpleGlyphs(reader, [start])[0]
+
+    def copy(self) -> "SimpleGlyph":
+        return SimpleGlyph(
+            numberOfContours=self.numberOfContours,
+            endPtsOfContours=self.endPtsOfContours,
+            flags=self.flags,
+            points=self.points,
+        )
+
+    def flatten(
+        self, scale: float, tolerance: float = DEFAULT_TOLERANCE
+    ) -> List[np.ndarray]:
+        bucket, quantizedScale = quantizeScale(scale)
+        key = (bucket, tolerance)
+        polylines = self.flattened.get(key)
+        if polylines is None:
+            with PROFILER.stage("flatten"):
+                polylines = flattenContours(
+                    self.points,
+                    self.flags,
+                    self.endPtsOfContours,
+                    quantizedScale,
+                    tolerance,
+                )
+            self.flattened[key] = polylines
+            if PROFILER.enabled:
+                PROFILER.count("flatten.segments", sum(map(len, polylines)))
+        return polylines
 
     def transform(self, scaleX: int, scaleY: int, offsetX: int, offsetY: int) -> None:
-        self.points = [
-            (scaleX * x + offsetX, scaleY * y + offsetY) for (x, y) in self.points
-        ]
+        self.points = self.points * (scaleX, scaleY) + (offsetX, offsetY)
+        self.flattened = {}
+
+
+# Shared by every component that is only moved, never written to
+IDENTITY = np.eye(2)
+IDENTITY.flags.writeable = False
+
+
+class Component(NamedTuple):
+    glyphId: int
+    glyph: Glyph
+    # Applied to row vectors, points @ matrix + offset
+    matrix: np.ndarray
+    offset: np.ndarray
+
+    def apply(self, points: np.ndarray) -> np.ndarray:
+        return points @ self.matrix + self.offset
+
+
+class CompoundGlyph(Glyph):
+    # Only references its components, the outline is assembled from their
+    # shared data whenever it's needed
+    __slots__ = ("numberOfContours", "components", "depth", "flattened")
+
+    isCompound = True
+    components: List[Component]
+    flattened: Dict[Tuple[int, float], List[np.ndarray]]
+
+    def __init__(self, components: Sequence[Component]) -> None:
+        self.components = list(components)
+        self.numberOfContours = sum(
+            component.glyph.numberOfContours for component in self.components
+        )
+        self.depth = 1 + max(
+            (component.glyph.depth for component in self.components), default=0
+        )
+        self.flattened = {}
+
+    @property
+    def points(self) -> np.ndarray:
+        return np.concatenate(
+            [component.apply(component.glyph.points) for component in self.components]
+        )
+
+    @property
+    def flags(self) -> np.ndarray:
+        return np.concatenate([component.glyph.flags for component in self.components])
+
+    @property
+    def endPtsOfContours(self) -> np.ndarray:
+        endPts = []
+        numberOfPoints = 0
+        for component in self.components:
+            endPts.append(component.glyph.endPtsOfContours + numberOfPoints)
+            numberOfPoints += len(component.glyph.points)
+        return np.concatenate(endPts).astype(np.int32)
+
+    def flatten(
+        self, scale: float, tolerance: float = DEFAULT_TOLERANCE
+    ) -> List[np.ndarray]:
+        bucket, quantizedScale = quantizeScale(scale)
+        key = (bucket, tolerance)
+        polylines = self.flattened.get(key)
+        if polylines is None:
+            polylines = []
+            for component in self.components:
+                # The matrix stretches curves by at most its largest singular
+                # value, flattening at that much finer scale keeps the error
+                # within tolerance after the transform
+                stretch = float(np.linalg.norm(component.matrix, 2))
+                if stretch == 0:
+                    continue
+                flattened = component.glyph.flatten(quantizedScale * stretch, tolerance)
+                polylines += [component.apply(polyline) for polyline in flattened]
+            self.flattened[key] = polylines
+        return polylines
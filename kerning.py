@@ -0,0 +1,365 @@
+from typing import Iterable, List, NamedTuple, Optional, Tuple, Union
+from file_reader import BinaryFileReader
+import numpy as np
+import struct
+
+# GPOS lookup types holding pair adjustments, directly or through an extension
+PAIR_ADJUSTMENT = 2
+EXTENSION = 9
+
+FEATURE_RECORD = struct.Struct(">4sH")
+
+# Value record fields, only the first glyph's advance matters for kerning
+X_ADVANCE = 0x0004
+
+# Coverage bits of a legacy kern subtable (Microsoft and Apple layouts)
+KERN_HORIZONTAL = 0x0001
+KERN_MINIMUM = 0x0002
+KERN_CROSS_STREAM = 0x0004
+APPLE_KERN_VERTICAL = 0x8000
+APPLE_KERN_CROSS_STREAM = 0x4000
+APPLE_KERN_VARIATION = 0x2000
+
+
+class PairList(NamedTuple):
+    # Individual pairs, keys are left << 16 | right in ascending order
+    keys: np.ndarray
+    values: np.ndarray
+
+    def lookup(
+        self, lefts: np.ndarray, rights: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # (which pairs the subtable has, their adjustments)
+        keys = (lefts.astype(np.uint32) << 16) | rights.astype(np.uint32)
+        if len(self.keys) == 0:
+            return np.zeros(len(keys), dtype=bool), np.zeros(len(keys), dtype=np.int32)
+        index = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[index] == keys
+        return found, np.where(found, self.values[index], 0)
+
+
+class ClassPairs(NamedTuple):
+    # Adjustments between classes of glyphs, firstClasses is -1 for glyphs
+    # outside the subtable's coverage
+    firstClasses: np.ndarray
+    secondClasses: np.ndarray
+    values: np.ndarray
+
+    def lookup(
+        self, lefts: np.ndarray, rights: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        first = self.firstClasses[np.minimum(lefts, len(self.firstClasses) - 1)]
+        second = self.secondClasses[np.minimum(rights, len(self.secondClasses) - 1)]
+        covered = (first >= 0) & (lefts < len(self.firstClasses))
+        first = np.where(covered, first, 0)
+        return covered, np.where(covered, self.values[first, second], 0)
+
+
+PairSubtable = Union[PairList, ClassPairs]
+
+
+class KerningIndex:
+    # Lookups apply one after another and their adjustments add up. Inside a
+    # lookup the first subtable that has the pair decides it.
+    lookups: List[List[PairSubtable]]
+
+    def __init__(self, lookups: List[List[PairSubtable]]) -> None:
+        self.lookups = [lookup for lookup in lookups if lookup]
+
+    def __len__(self) -> int:
+        # Number of explicitly listed pairs, class based pairs aren't counted
+        return sum(
+            len(subtable.keys)
+            for lookup in self.lookups
+            for subtable in lookup
+            if isinstance(subtable, PairList)
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.lookups)
+
+    def pairValues(self, glyphIds: Iterable[int]) -> np.ndarray:
+        # Adjustment in font units after each glyph of a run, the last is 0
+        glyphIds = np.fromiter(glyphIds, dtype=np.int64)
+        kerning = np.zeros(len(glyphIds), dtype=np.int32)
+        if len(glyphIds) >= 2:
+            kerning[:-1] = self.adjustments(glyphIds[:-1], glyphIds[1:])
+        return kerning
+
+    def adjustments(self, lefts: np.ndarray, rights: np.ndarray) -> np.ndarray:
+        # Adjustment in font units of every (lefts[i], rights[i]) pair
+        kerning = np.zeros(len(lefts), dtype=np.int32)
+        for lookup in self.lookups:
+            pending = np.ones(len(lefts), dtype=bool)
+            for subtable in lookup:
+                applies, values = subtable.lookup(lefts, rights)
+                applies &= pending
+                kerning += np.where(applies, values, 0)
+                pending &= ~applies
+                if not pending.any():
+                    break
+        return kerning
+
+    def getKerning(self, left: int, right: int) -> int:
+        return int(self.pairValues((left, right))[0])
+
+
+def valueRecordSize(valueFormat: int) -> int:
+    return 2 * bin(valueFormat & 0xFF).count("1")
+
+
+def xAdvanceIndex(valueFormat: int) -> Optional[int]:
+    # Position of XAdvance among the 16-bit fields of a value record
+    if not valueFormat & X_ADVANCE:
+        return None
+    return bin(valueFormat & (X_ADVANCE - 1)).count("1")
+
+
+def parseCoverage(reader: BinaryFileReader, offset: int) -> np.ndarray:
+    # Glyph ids in coverage index order
+    reader.goto(offset)
+    format = reader.parseUint16()
+    if format == 1:
+        return np.asarray(reader.parseUint16Array(reader.parseUint16()), dtype=np.int64)
+    if format == 2:
+        ranges = np.asarray(
+            reader.parseUint16Array(3 * reader.parseUint16()), dtype=np.int64
+        ).reshape(-1, 3)
+        if len(ranges) == 0:
+            return np.zeros(0, dtype=np.int64)
+        ranges = ranges[np.argsort(ranges[:, 2], kind="stable")]
+        return np.concatenate([np.arange(start, end + 1) for start, end, _ in ranges])
+    raise ValueError(f"Unknown coverage format {format}")
+
+
+def parseClassDef(reader: BinaryFileReader, offset: int, numGlyphs: int) -> np.ndarray:
+    # Class of every glyph id, 0 where the table doesn't list it
+    classes = np.zeros(numGlyphs, dtype=np.int32)
+    reader.goto(offset)
+    format = reader.parseUint16()
+    if format == 1:
+        start = reader.parseUint16()
+        values = np.asarray(
+            reader.parseUint16Array(reader.parseUint16()), dtype=np.int32
+        )
+        end = min(start + len(values), numGlyphs)
+        if start < end:
+            classes[start:end] = values[: end - start]
+    elif format == 2:
+        ranges = np.asarray(reader.parseUint16Array(3 * reader.parseUint16())).reshape(
+            -1, 3
+        )
+        for start, end, value in ranges.tolist():
+            classes[start : min(end + 1, numGlyphs)] = value
+    else:
+        raise ValueError(f"Unknown class definition format {format}")
+    return classes
+
+
+def parsePairFormat1(
+    reader: BinaryFileReader,
+    offset: int,
+    coverageOffset: int,
+    valueFormat1: int,
+    valueFormat2: int,
+) -> PairList:
+    pairSetCount = reader.parseUint16()
+    pairSetOffsets = reader.parseUint16Array(pairSetCount).tolist()
+    firstGlyphs = parseCoverage(reader, offset + coverageOffset)
+
+    # A pair value record is the second glyph followed by two value records
+    recordWords = (
+        1 + (valueRecordSize(valueFormat1) + valueRecordSize(valueFormat2)) // 2
+    )
+    advance = xAdvanceIndex(valueFormat1)
+    keys: List[np.ndarray] = []
+    values: List[np.ndarray] = []
+    for firstGlyph, pairSetOffset in zip(firstGlyphs.tolist(), pairSetOffsets):
+        reader.goto(offset + pairSetOffset)
+        count = reader.parseUint16()
+        records = np.asarray(
+            reader.parseUint16Array(count * recordWords), dtype=np.uint16
+        ).reshape(count, recordWords)
+        keys.append((firstGlyph << 16) | records[:, 0].astype(np.uint32))
+        if advance is None:
+            values.append(np.zeros(count, dtype=np.int16))
+        else:
+            values.append(records[:, 1 + advance].view(np.int16))
+
+    if not keys:
+        return PairList(np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int16))
+    # The first record of a duplicated pair wins
+    keys, first = np.unique(np.concatenate(keys).astype(np.uint32), return_index=True)
+    return PairList(keys, np.concatenate(values)[first])
+
+
+def parsePairFormat2(
+    reader: BinaryFileReader,
+    offset: int,
+    coverageOffset: int,
+    valueFormat1: int,
+    valueFormat2: int,
+    numGlyphs: int,
+) -> ClassPairs:
+    classDef1Offset = reader.parseUint16()
+    classDef2Offset = reader.parseUint16()
+    class1Count = reader.parseUint16()
+    class2Count = reader.parseUint16()
+
+    recordWords = (valueRecordSize(valueFormat1) + valueRecordSize(valueFormat2)) // 2
+    advance = xAdvanceIndex(valueFormat1)
+    if advance is None:
+        values = np.zeros((class1Count, class2Count), dtype=np.int16)
+    else:
+        records = np.asarray(
+            reader.parseUint16Array(class1Count * class2Count * recordWords),
+            dtype=np.uint16,
+        ).reshape(class1Count, class2Count, recordWords)
+        values = np.ascontiguousarray(records[:, :, advance]).view(np.int16)
+
+    covered = parseCoverage(reader, offset + coverageOffset)
+    covered = covered[covered < numGlyphs]
+    classes1 = parseClassDef(reader, offset + classDef1Offset, numGlyphs)
+    classes2 = parseClassDef(reader, offset + classDef2Offset, numGlyphs)
+
+    firstClasses = np.full(numGlyphs, -1, dtype=np.int32)
+    firstClasses[covered] = classes1[covered]
+    # Classes past the matrix mean the subtable doesn't apply
+    firstClasses[firstClasses >= class1Count] = -1
+    classes2[classes2 >= class2Count] = 0
+    # Class arrays are as small as the class counts allow
+    return ClassPairs(
+        firstClasses.astype(np.min_scalar_type(-max(class1Count, 1))),
+        classes2.astype(np.min_scalar_type(class2Count)),
+        values,
+    )
+
+
+def parsePairSubtable(
+    reader: BinaryFileReader, offset: int, numGlyphs: int
+) -> Optional[PairSubtable]:
+    reader.goto(offset)
+    format = reader.parseUint16()
+    coverageOffset = reader.parseUint16()
+    valueFormat1 = reader.parseUint16()
+    valueFormat2 = reader.parseUint16()
+    if format == 1:
+        return parsePairFormat1(
+            reader, offset, coverageOffset, valueFormat1, valueFormat2
+        )
+    if format == 2:
+        return parsePairFormat2(
+            reader, offset, coverageOffset, valueFormat1, valueFormat2, numGlyphs
+        )
+    return None
+
+
+def kernLookupIndices(
+    reader: BinaryFileReader, offset: int, featureListOffset: int
+) -> List[int]:
+    # Lookups of every 'kern' feature, whatever script or language uses it
+    reader.goto(offset + featureListOffset)
+    featureCount = reader.parseUint16()
+    featureOffsets = [
+        featureOffset
+        for tag, featureOffset in reader.parseRecords(FEATURE_RECORD, featureCount)
+        if tag == b"kern"
+    ]
+    indices = set()
+    for featureOffset in featureOffsets:
+        reader.goto(offset + featureListOffset + featureOffset)
+        featureParamsOffset = reader.parseUint16()
+        indices.update(reader.parseUint16Array(reader.parseUint16()).tolist())
+    return sorted(indices)
+
+
+def parseGposKerning(
+    reader: BinaryFileReader, offset: int, numGlyphs: int
+) -> KerningIndex:
+    reader.goto(offset)
+    majorVersion = reader.parseUint16()
+    minorVersion = reader.parseUint16()
+    scriptListOffset = reader.parseUint16()
+    featureListOffset = reader.parseUint16()
+    lookupListOffset = reader.parseUint16()
+
+    lookupList = offset + lookupListOffset
+    reader.goto(lookupList)
+    lookupOffsets = reader.parseUint16Array(reader.parseUint16()).tolist()
+
+    lookups: List[List[PairSubtable]] = []
+    for index in kernLookupIndices(reader, offset, featureListOffset):
+        if index >= len(lookupOffsets):
+            continue
+        lookupOffset = lookupList + lookupOffsets[index]
+        reader.goto(lookupOffset)
+        lookupType = reader.parseUint16()
+        lookupFlag = reader.parseUint16()
+        subtableOffsets = reader.parseUint16Array(reader.parseUint16()).tolist()
+
+        subtables: List[PairSubtable] = []
+        for subtableOffset in subtableOffsets:
+            subtableOffset += lookupOffset
+            subtableType = lookupType
+            if lookupType == EXTENSION:
+                # format, wrapped lookup type and a 32 bit offset
+                reader.goto(subtableOffset + 2)
+                subtableType = reader.parseUint16()
+                subtableOffset += reader.parseUint32()
+            if subtableType != PAIR_ADJUSTMENT:
+                continue
+            subtable = parsePairSubtable(reader, subtableOffset, numGlyphs)
+            if subtable is not None:
+                subtables.append(subtable)
+        lookups.append(subtables)
+    return KerningIndex(lookups)
+
+
+def parseKernPairs(reader: BinaryFileReader) -> PairList:
+    # Format 0 subtable body after its header: nPairs and the search fields
+    nPairs = reader.parseUint16()
+    reader.skip(6)
+    records = np.asarray(reader.parseUint16Array(3 * nPairs), dtype=np.uint16).reshape(
+        -1, 3
+    )
+    keys = (records[:, 0].astype(np.uint32) << 16) | records[:, 1]
+    keys, first = np.unique(keys, return_index=True)
+    return PairList(keys, records[first, 2].view(np.int16))
+
+
+def parseKernTable(reader: BinaryFileReader, offset: int) -> KerningIndex:
+    # Only format 0 subtables with horizontal, non cross-stream kerning
+    # values are used. Every subtable acts as its own lookup so their values
+    # add up.
+    reader.goto(offset)
+    version = reader.parseUint16()
+    lookups: List[List[PairSubtable]] = []
+    if version == 0:
+        nTables = reader.parseUint16()
+        for _ in range(nTables):
+            start = reader.index
+            subtableVersion = reader.parseUint16()
+            length = reader.parseUint16()
+            coverage = reader.parseUint16()
+            format = coverage >> 8
+            horizontal = coverage & (KERN_HORIZONTAL | KERN_MINIMUM | KERN_CROSS_STREAM)
+            if format == 0 and horizontal == KERN_HORIZONTAL:
+                lookups.append([parseKernPairs(reader)])
+            reader.goto(start + length)
+    elif version == 1:
+        # Apple layout, a 32 bit version and table count
+        reader.skip(2)
+        nTables = reader.parseUint32()
+        for _ in range(nTables):
+            start = reader.index
+            length = reader.parseUint32()
+            coverage = reader.parseUint16()
+            tupleIndex = reader.parseUint16()
+            format = coverage & 0xFF
+            skipped = (
+                APPLE_KERN_VERTICAL | APPLE_KERN_CROSS_STREAM | APPLE_KERN_VARIATION
+            )
+            if format == 0 and not coverage & skipped:
+                lookups.append([parseKernPairs(reader)])
+            reader.goto(start + length)
+    return KerningIndex(lookups)
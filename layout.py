@@ -0,0 +1,71 @@
+from typing import List, NamedTuple, Tuple
+import re
+import numpy as np
+
+WORD = re.compile(r"\S+")
+
+
+class Line(NamedTuple):
+    # text[start:end] without the spaces around it, width in pixels
+    start: int
+    end: int
+    width: float
+    text: str
+
+
+class GlyphRun(NamedTuple):
+    # A laid out line of glyphs. boxes are (left, top, right, bottom) of every
+    # glyph's mask in pixels from the run's loc, bounds is their union.
+    glyphIds: np.ndarray
+    xs: np.ndarray
+    boxes: np.ndarray
+    bounds: Tuple[float, float, float, float]
+
+
+def runBounds(boxes: np.ndarray) -> Tuple[float, float, float, float]:
+    if not len(boxes):
+        return 0.0, 0.0, 0.0, 0.0
+    left, top = boxes[:, :2].min(axis=0).tolist()
+    right, bottom = boxes[:, 2:].max(axis=0).tolist()
+    return left, top, right, bottom
+
+
+def wrapLines(text: str, advances: np.ndarray, width: float) -> List[Line]:
+    # Greedy word wrap given the advance of every character. Newlines always
+    # break, words wider than a line are broken between characters.
+    prefix = np.concatenate(([0.0], np.cumsum(advances))).tolist()
+    lines: List[Line] = []
+
+    def addLine(start: int, end: int) -> None:
+        lines.append(Line(start, end, prefix[end] - prefix[start], text[start:end]))
+
+    paragraphStart = 0
+    for paragraph in text.split("\n"):
+        lineStart = lineEnd = None
+        for word in WORD.finditer(paragraph):
+            start = paragraphStart + word.start()
+            end = paragraphStart + word.end()
+            if lineStart is not None and prefix[end] - prefix[lineStart] <= width:
+                lineEnd = end
+                continue
+            if lineStart is not None:
+                addLine(lineStart, lineEnd)
+
+            # Split words that don't fit on a line of their own, at least one
+            # character goes on every line
+            while prefix[end] - prefix[start] > width and end - start > 1:
+                split = max(
+                    int(np.searchsorted(prefix, prefix[start] + width, side="right"))
+                    - 1,
+                    start + 1,
+                )
+                addLine(start, split)
+                start = split
+            lineStart, lineEnd = start, end
+
+        if lineStart is None:
+            lines.append(Line(paragraphStart, paragraphStart, 0.0, ""))
+        else:
+            addLine(lineStart, lineEnd)
+        paragraphStart += len(paragraph) + 1
+    return lines
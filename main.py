@@ -1,7 +1,7 @@
 from renderer import Renderer
 from font import Font
 
-font = Font("assets/Montserrat-Regular.ttf")
+font = Font("assets/Montserrat-Regular.ttf", cache=True, sdf=True)
 
 rend = Renderer(font)
 rend.mainloop()
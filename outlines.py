@@ -0,0 +1,210 @@
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence
+import argparse
+import numpy as np
+from glyph import ON_CURVE, Glyph, packGlyphs
+
+# Decimals written for every SVG coordinate
+SVG_PRECISION = 2
+
+
+class GlyphOutlines(NamedTuple):
+    # Outlines of many glyphs in flat arrays. Glyph i spans
+    # pointStarts[i]:pointStarts[i + 1] of points and flags, and
+    # contourStarts[i]:contourStarts[i + 1] of contourEnds. contourEnds index
+    # points directly, a contour ends just before its end.
+    glyphIds: np.ndarray
+    points: np.ndarray
+    flags: np.ndarray
+    pointStarts: np.ndarray
+    contourStarts: np.ndarray
+    contourEnds: np.ndarray
+
+    def glyphPoints(self, index: int) -> np.ndarray:
+        start, end = self.pointStarts[index : index + 2].tolist()
+        return self.points[start:end]
+
+    def transformed(self, matrix) -> "GlyphOutlines":
+        # Every point moved by one affine matrix in one go
+        return self._replace(points=transformPoints(self.points, matrix))
+
+
+def affineMatrix(matrix) -> np.ndarray:
+    # 2x3 matrix [[a, c, e], [b, d, f]] from itself or a 3x3 one, the same
+    # numbers as SVG's matrix(a b c d e f)
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if matrix.shape not in ((2, 3), (3, 3)):
+        raise ValueError(f"Affine matrix must be 2x3 or 3x3, got {matrix.shape}")
+    return matrix[:2]
+
+
+def transformPoints(points: np.ndarray, matrix) -> np.ndarray:
+    matrix = affineMatrix(matrix)
+    return points @ matrix[:, :2].T + matrix[:, 2]
+
+
+def packOutlines(glyphIds: Sequence[int], glyphs: Sequence[Glyph]) -> GlyphOutlines:
+    if not glyphs:
+        empty = np.zeros(0, dtype=np.int64)
+        return GlyphOutlines(
+            np.asarray(glyphIds, dtype=np.int64),
+            np.zeros((0, 2)),
+            np.zeros(0, dtype=np.uint8),
+            np.zeros(1, dtype=np.int64),
+            np.zeros(1, dtype=np.int64),
+            empty,
+        )
+    arrays = packGlyphs(glyphs, np.float64)
+    pointStarts = arrays["pointStarts"]
+    contourStarts = arrays["contourStarts"]
+    # endPts count from the start of their own glyph
+    contourEnds = (
+        arrays["endPts"] + 1 + np.repeat(pointStarts[:-1], np.diff(contourStarts))
+    )
+    return GlyphOutlines(
+        glyphIds=np.asarray(glyphIds, dtype=np.int64),
+        points=arrays["points"].reshape(-1, 2),
+        flags=arrays["flags"],
+        pointStarts=pointStarts,
+        contourStarts=contourStarts,
+        contourEnds=contourEnds.astype(np.int64),
+    )
+
+
+def insertAfter(
+    values: np.ndarray, where: np.ndarray, inserted: np.ndarray
+) -> np.ndarray:
+    # values with inserted[k] placed right after the kth True of where
+    counts = 1 + where.astype(np.int64)
+    result = np.repeat(values, counts, axis=0)
+    result[np.cumsum(counts)[where] - 1] = inserted
+    return result
+
+
+def formatNumbers(values: np.ndarray, precision: int) -> np.ndarray:
+    # Shortest text of every value rounded to precision decimals. It's built
+    # from integers, numpy turns those into text much faster than floats.
+    scale = 10 ** max(precision, 0)
+    scaled = np.round(np.asarray(values) * scale).astype(np.int64)
+    text = np.char.add(
+        np.where(scaled < 0, "-", ""), (np.abs(scaled) // scale).astype(str)
+    )
+    fraction = np.abs(scaled) % scale
+    if not fraction.any():
+        return text
+    # Adding scale keeps the leading zeros of the fraction behind a 1
+    digits = np.char.replace((fraction + scale).astype(str), "1", "", 1)
+    digits = np.char.add(".", np.char.rstrip(digits, "0"))
+    return np.char.add(text, np.where(fraction > 0, digits, ""))
+
+
+def svgPaths(outlines: GlyphOutlines, precision: int = SVG_PRECISION) -> List[str]:
+    # SVG path data of every glyph, built for all of them at once. Curves are
+    # TrueType's quadratics: two off curve points in a row have an implied
+    # on curve point half way between them.
+    points = outlines.points
+    contourEnds = outlines.contourEnds
+    numGlyphs = len(outlines.glyphIds)
+    if not len(points):
+        return [""] * numGlyphs
+    lengths = np.diff(np.concatenate(([0], contourEnds)))
+    contourStarts = contourEnds - lengths
+    contour = np.repeat(np.arange(len(lengths)), lengths)
+    glyph = np.repeat(np.arange(numGlyphs), np.diff(outlines.pointStarts))
+
+    index = np.arange(len(points))
+    following = np.where(
+        index + 1 == contourEnds[contour], contourStarts[contour], index + 1
+    )
+    onCurve = (outlines.flags & ON_CURVE) != 0
+    implied = ~onCurve & ~onCurve[following]
+    midpoints = (points[implied] + points[following[implied]]) / 2
+    points = insertAfter(points, implied, midpoints)
+    onCurve = insertAfter(onCurve, implied, True)
+    contour = insertAfter(contour, implied, contour[implied])
+    glyph = insertAfter(glyph, implied, glyph[implied])
+
+    # Every contour is rotated to start on its first on curve point, one
+    # always exists now
+    lengths = np.bincount(contour, minlength=len(lengths))
+    contourEnds = np.cumsum(lengths)
+    contourStarts = contourEnds - lengths
+    first = np.flatnonzero(onCurve)[
+        np.searchsorted(np.flatnonzero(onCurve), contourStarts[lengths > 0])
+    ]
+    shift = np.zeros(len(lengths), dtype=np.int64)
+    shift[lengths > 0] = first - contourStarts[lengths > 0]
+    local = np.arange(len(points)) - contourStarts[contour]
+    order = np.empty(len(points), dtype=np.int64)
+    order[contourStarts[contour] + (local - shift[contour]) % lengths[contour]] = (
+        np.arange(len(points))
+    )
+    points, onCurve = points[order], onCurve[order]
+
+    # A curve running back into the start point needs that point again
+    last = contourEnds[lengths > 0] - 1
+    closing = np.zeros(len(points), dtype=bool)
+    closing[last[~onCurve[last]]] = True
+    points = insertAfter(points, closing, points[contourStarts[contour[closing]]])
+    onCurve = insertAfter(onCurve, closing, True)
+    contour = insertAfter(contour, closing, contour[closing])
+    glyph = insertAfter(glyph, closing, glyph[closing])
+
+    starts = np.ones(len(points), dtype=bool)
+    starts[1:] = contour[1:] != contour[:-1]
+    ends = np.ones(len(points), dtype=bool)
+    ends[:-1] = starts[1:]
+    afterCurve = np.zeros(len(points), dtype=bool)
+    afterCurve[1:] = ~onCurve[:-1]
+    commands = np.where(
+        starts, "M", np.where(~onCurve, "Q", np.where(afterCurve, " ", "L"))
+    )
+
+    numbers = formatNumbers(points, precision)
+    tokens = np.char.add(np.char.add(commands, numbers[:, 0]), " ")
+    tokens = np.char.add(np.char.add(tokens, numbers[:, 1]), np.where(ends, "Z", ""))
+    text = "".join(tokens.tolist())
+    offsets = np.concatenate(([0], np.cumsum(np.char.str_len(tokens))))
+    bounds = offsets[np.searchsorted(glyph, np.arange(numGlyphs + 1))].tolist()
+    return [text[bounds[i] : bounds[i + 1]] for i in range(numGlyphs)]
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    from font import Font
+
+    parser = argparse.ArgumentParser(
+        description="Write every glyph of a font as SVG paths"
+    )
+    parser.add_argument("font", help="path to a .ttf file")
+    parser.add_argument("output", help="path of the .svg file")
+    parser.add_argument("-c", "--columns", type=int, default=32, help="glyphs per row")
+    parser.add_argument("-p", "--precision", type=int, default=SVG_PRECISION)
+    args = parser.parse_args(arguments)
+
+    font = Font(args.font)
+    head = font.headTable
+    cellWidth = head.xMax - head.xMin
+    cellHeight = head.yMax - head.yMin
+    # y points down in SVG, glyphs are flipped about their baseline
+    paths = font.exportSvgPaths(
+        matrix=[[1, 0, 0], [0, -1, 0]], precision=args.precision
+    )
+    elements = []
+    for glyphId, path in enumerate(paths):
+        x = glyphId % args.columns * cellWidth - head.xMin
+        y = glyphId // args.columns * cellHeight + head.yMax
+        elements.append(
+            f'<path id="glyph{glyphId}" transform="translate({x} {y})" d="{path}"/>'
+        )
+    rows = -(-len(paths) // args.columns)
+    Path(args.output).write_text(
+        '<svg xmlns="http://www.w3.org/2000/svg" '
+        f'viewBox="0 0 {args.columns * cellWidth} {rows * cellHeight}">\n'
+        + "\n".join(elements)
+        + "\n</svg>\n"
+    )
+    print(f"{len(paths)} glyphs written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+from collections import deque
+from typing import Deque, Dict, Optional
+import os
+import time
+
+
+class Stage:
+    profiler: "Profiler"
+    name: str
+    start: float
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self) -> "Stage":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+class NullStage:
+    __slots__ = ()
+
+    def __enter__(self) -> "NullStage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+class Profiler:
+    # Stage timings are inclusive, a stage nested in another counts in both.
+    # Totals accumulate until reset, the frame dicts cover the frame in
+    # progress and lastFrame the one before it.
+    enabled: bool
+    totals: Dict[str, float]
+    calls: Dict[str, int]
+    counters: Dict[str, int]
+    frameTimes: Dict[str, float]
+    frameCounters: Dict[str, int]
+    lastFrame: Dict[str, Dict[str, float]]
+    frameDurations: Deque[float]
+    frameStart: Optional[float]
+
+    def __init__(self, enabled: bool = False, history: int = 60) -> None:
+        self.enabled = enabled
+        self.frameDurations = deque(maxlen=history)
+        self.reset()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+        self.frameStart = None
+
+    def reset(self) -> None:
+        self.totals = {}
+        self.calls = {}
+        self.counters = {}
+        self.frameTimes = {}
+        self.frameCounters = {}
+        self.lastFrame = {"stages": {}, "counters": {}}
+        self.frameDurations.clear()
+        self.frameStart = None
+
+    def stage(self, name: str):
+        # Meant for `with`, costs one attribute check when disabled
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.frameTimes[name] = self.frameTimes.get(name, 0.0) + seconds
+
+    def count(self, name: str, amount: int = 1) -> None:
+        # Hot paths check `enabled` themselves before calling this
+        self.counters[name] = self.counters.get(name, 0) + amount
+        self.frameCounters[name] = self.frameCounters.get(name, 0) + amount
+
+    def endFrame(self) -> None:
+        now = time.perf_counter()
+        if self.frameStart is not None:
+            self.frameDurations.append(now - self.frameStart)
+        self.frameStart = now
+        self.lastFrame = {"stages": self.frameTimes, "counters": self.frameCounters}
+        self.frameTimes = {}
+        self.frameCounters = {}
+
+    @property
+    def frameTime(self) -> float:
+        # Average over the recent frames, in seconds
+        if not self.frameDurations:
+            return 0.0
+        return sum(self.frameDurations) / len(self.frameDurations)
+
+    @property
+    def fps(self) -> float:
+        frameTime = self.frameTime
+        return 1 / frameTime if frameTime > 0 else 0.0
+
+    def report(self) -> Dict:
+        return {
+            "stages": {
+                name: {"calls": self.calls[name], "seconds": total}
+                for name, total in self.totals.items()
+            },
+            "counters": dict(self.counters),
+            "lastFrame": self.lastFrame,
+            "frameTime": self.frameTime,
+            "fps": self.fps,
+        }
+
+
+# Shared by the whole library, FONTSA_PROFILE=1 turns it on from the start
+PROFILER = Profiler(enabled=os.environ.get("FONTSA_PROFILE", "") not in ("", "0"))
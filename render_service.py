@@ -0,0 +1,422 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlsplit
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+from atlas import GlyphMask
+from batch_renderer import Color, colorize, composeMasks, parseColor, pngBytes
+from cache import LRUCache
+from font import Font
+from font_collection import FONT_PATTERNS, FontCollection
+from styles import Colors
+
+# Requests larger than this are refused, text comes in the query or a JSON body
+MAX_BODY = 1 << 20
+MAX_TEXT = 10000
+MAX_PIXELS_PER_EM = 1000
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+# (font name, glyph id, quarter pixels per em)
+MaskKey = Tuple[str, int, int]
+
+
+class Response(NamedTuple):
+    status: int
+    contentType: str
+    body: bytes
+    headers: Dict[str, str] = {}
+
+
+class RequestError(Exception):
+    status: int
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def jsonResponse(value: object, status: int = 200) -> Response:
+    return Response(status, "application/json", json.dumps(value).encode())
+
+
+class RenderService:
+    # Keeps every font parsed and the glyph masks of all of them in one LRU
+    # cache. Fonts are only touched on the event loop thread, so their
+    # readers and caches need no locks. Rasterizing and composing run in the
+    # executor.
+    fonts: FontCollection
+    masks: LRUCache[GlyphMask]
+    pending: Dict[MaskKey, asyncio.Future]
+    executor: ThreadPoolExecutor
+    padding: int
+    requests: int
+    started: float
+
+    def __init__(
+        self,
+        fonts: FontCollection,
+        cacheSize: int = 8192,
+        workers: Optional[int] = None,
+        padding: int = 2,
+    ) -> None:
+        self.fonts = fonts
+        self.masks = LRUCache(cacheSize)
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.padding = padding
+        self.requests = 0
+        self.started = time.perf_counter()
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False)
+
+    def font(self, name: str) -> Font:
+        try:
+            return self.fonts[name]
+        except KeyError:
+            raise RequestError(404, f"No font named {name!r}")
+
+    async def glyphMasks(
+        self,
+        name: str,
+        font: Font,
+        glyphIds: Sequence[int],
+        quarterPixels: int,
+        fontSize: float,
+    ) -> Dict[int, GlyphMask]:
+        # Masks come from the shared cache. The missing ones are rasterized in
+        # one executor job, and requests that need a glyph another request is
+        # already rasterizing wait for that instead of doing it again.
+        masks: Dict[int, GlyphMask] = {}
+        waiting: Dict[int, asyncio.Future] = {}
+        missing: List[int] = []
+        for glyphId in set(glyphIds):
+            key = (name, glyphId, quarterPixels)
+            mask = self.masks.get(key)
+            if mask is not None:
+                masks[glyphId] = mask
+            elif key in self.pending:
+                waiting[glyphId] = self.pending[key]
+            else:
+                missing.append(glyphId)
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            futures = [loop.create_future() for _ in missing]
+            for glyphId, future in zip(missing, futures):
+                self.pending[(name, glyphId, quarterPixels)] = future
+                waiting[glyphId] = future
+            glyphs = [font.instanceGlyph(glyphId) for glyphId in missing]
+            try:
+                rasterized = await loop.run_in_executor(
+                    self.executor,
+                    lambda: [glyph.rasterize(fontSize) for glyph in glyphs],
+                )
+            except Exception as error:
+                for future in futures:
+                    future.set_exception(error)
+                    # Retrieved here so that an unawaited one isn't logged
+                    future.exception()
+                raise
+            finally:
+                for glyphId in missing:
+                    del self.pending[(name, glyphId, quarterPixels)]
+            for glyphId, future, mask in zip(missing, futures, rasterized):
+                self.masks.put((name, glyphId, quarterPixels), mask)
+                future.set_result(mask)
+
+        for glyphId, future in waiting.items():
+            masks[glyphId] = await future
+        return masks
+
+    async def renderMask(
+        self, name: str, pixelsPerEm: float, text: str, letterSpacing: float = 0
+    ) -> np.ndarray:
+        font = self.font(name)
+        quarterPixels, fontSize = font.snapFontSize(
+            pixelsPerEm / font.headTable.unitsPerEm
+        )
+        layout = font.layoutString(text, fontSize, letterSpacing)
+        masks = await self.glyphMasks(
+            name, font, [glyphId for glyphId, _ in layout], quarterPixels, fontSize
+        )
+        placed = [
+            (masks[glyphId][0], round(x) + masks[glyphId][1], masks[glyphId][2])
+            for glyphId, x in layout
+            if masks[glyphId][0].size
+        ]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, composeMasks, placed, self.padding
+        )
+
+    async def render(self, params: Dict[str, str]) -> Response:
+        text = textParam(params)
+        alpha = await self.renderMask(
+            params.get("font", ""),
+            numberParam(params, "size", 48, 1, MAX_PIXELS_PER_EM),
+            text,
+            numberParam(params, "spacing", 0, -1000, 1000),
+        )
+        height, width = alpha.shape
+        if params.get("format", "png") == "mask":
+            # Raw rows of 8 bit alpha, the shape is in the headers
+            return Response(
+                200,
+                "application/octet-stream",
+                alpha.tobytes(),
+                {"X-Width": str(width), "X-Height": str(height)},
+            )
+        if params.get("format", "png") != "png":
+            raise RequestError(400, "format must be png or mask")
+        color = colorParam(params, "color", Colors.Text.value)
+        background = colorParam(params, "background", None)
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(
+            self.executor, lambda: pngBytes(colorize(alpha, color, background))
+        )
+        return Response(
+            200, "image/png", png, {"X-Width": str(width), "X-Height": str(height)}
+        )
+
+    def measure(self, params: Dict[str, str]) -> Response:
+        # Layout only needs metrics, it's answered right on the loop
+        font = self.font(params.get("font", ""))
+        text = textParam(params)
+        pixelsPerEm = numberParam(params, "size", 48, 1, MAX_PIXELS_PER_EM)
+        fontSize = pixelsPerEm / font.headTable.unitsPerEm
+        letterSpacing = numberParam(params, "spacing", 0, -1000, 1000)
+        result = {"width": font.measure(text, fontSize, letterSpacing)}
+        if "wrap" in params:
+            lines = font.layoutParagraph(
+                text, numberParam(params, "wrap", 0, 1, 1e9), fontSize, letterSpacing
+            )
+            result["lines"] = [
+                {"text": line.text, "width": line.width} for line in lines
+            ]
+        return jsonResponse(result)
+
+    def stats(self) -> Response:
+        return jsonResponse(
+            {
+                "fonts": list(self.fonts.names),
+                "requests": self.requests,
+                "uptime": time.perf_counter() - self.started,
+                "masks": {
+                    "size": len(self.masks),
+                    "maxSize": self.masks.maxSize,
+                    "hits": self.masks.hits,
+                    "misses": self.masks.misses,
+                    "evictions": self.masks.evictions,
+                },
+            }
+        )
+
+    async def respond(self, method: str, target: str, body: bytes) -> Response:
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+        if method == "POST" and body:
+            try:
+                posted = json.loads(body)
+            except ValueError:
+                raise RequestError(400, "Body must be a JSON object")
+            if not isinstance(posted, dict):
+                raise RequestError(400, "Body must be a JSON object")
+            params.update({key: str(value) for key, value in posted.items()})
+        elif method not in ("GET", "POST"):
+            raise RequestError(405, f"{method} not allowed")
+
+        if url.path == "/render":
+            return await self.render(params)
+        if url.path == "/measure":
+            return self.measure(params)
+        if url.path in ("/", "/stats"):
+            return self.stats()
+        raise RequestError(404, f"Nothing at {url.path}")
+
+    async def handle(self, method: str, target: str, body: bytes) -> Response:
+        try:
+            return await self.respond(method, target, body)
+        except RequestError as error:
+            return jsonResponse({"error": str(error)}, error.status)
+        except Exception as error:
+            return jsonResponse({"error": repr(error)}, 500)
+
+    async def handleConnection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        # HTTP/1.1 with keep alive, one request at a time per connection
+        try:
+            while True:
+                requestLine = await reader.readline()
+                if not requestLine.strip():
+                    break
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    field, _, value = line.decode("latin-1").partition(":")
+                    headers[field.strip().lower()] = value.strip()
+
+                try:
+                    method, target, version = requestLine.decode("latin-1").split()
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    method = None
+                keepAlive = (
+                    method is not None
+                    and version == "HTTP/1.1"
+                    and headers.get("connection", "").lower() != "close"
+                )
+                if method is None:
+                    response = jsonResponse({"error": "Malformed request"}, 400)
+                elif not 0 <= length <= MAX_BODY:
+                    keepAlive = False
+                    response = jsonResponse({"error": "Request body too large"}, 413)
+                else:
+                    body = await reader.readexactly(length)
+                    response = await self.handle(method, target, body)
+                self.requests += 1
+
+                head = [
+                    f"HTTP/1.1 {response.status} {REASONS[response.status]}",
+                    f"Content-Type: {response.contentType}",
+                    f"Content-Length: {len(response.body)}",
+                    f"Connection: {'keep-alive' if keepAlive else 'close'}",
+                    *(f"{field}: {value}" for field, value in response.headers.items()),
+                ]
+                writer.write(
+                    "\r\n".join(head).encode("latin-1") + b"\r\n\r\n" + response.body
+                )
+                await writer.drain()
+                if not keepAlive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def textParam(params: Dict[str, str]) -> str:
+    text = params.get("text", "")
+    if len(text) > MAX_TEXT:
+        raise RequestError(400, f"text is limited to {MAX_TEXT} characters")
+    return text
+
+
+def numberParam(
+    params: Dict[str, str], name: str, default: float, low: float, high: float
+) -> float:
+    try:
+        value = float(params.get(name, default))
+    except ValueError:
+        raise RequestError(400, f"{name} must be a number")
+    if not low <= value <= high:
+        raise RequestError(400, f"{name} must be between {low} and {high}")
+    return value
+
+
+def colorParam(
+    params: Dict[str, str], name: str, default: Optional[Color]
+) -> Optional[Color]:
+    if name not in params:
+        return default
+    try:
+        return parseColor(params[name])
+    except argparse.ArgumentTypeError as error:
+        raise RequestError(400, str(error))
+
+
+def fontFiles(paths: Sequence[str]) -> List[Path]:
+    # Font files given directly or found in the given directories
+    files: List[Path] = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files += sorted(
+                file for pattern in FONT_PATTERNS for file in path.glob(pattern)
+            )
+        else:
+            files.append(path)
+    return files
+
+
+async def serve(
+    service: RenderService,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    unixPath: Optional[str] = None,
+) -> None:
+    if unixPath:
+        server = await asyncio.start_unix_server(service.handleConnection, unixPath)
+        address = f"unix:{unixPath}"
+    else:
+        server = await asyncio.start_server(service.handleConnection, host, port)
+        host, port = server.sockets[0].getsockname()[:2]
+        address = f"http://{host}:{port}"
+    # The load test reads this line to find the service
+    print(f"serving {len(service.fonts)} fonts on {address}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Render and measure text over HTTP")
+    parser.add_argument(
+        "fonts",
+        nargs="*",
+        default=["assets"],
+        help="font files or directories (default assets)",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument(
+        "-p", "--port", type=int, default=8000, help="0 picks a free port"
+    )
+    parser.add_argument("--unix", help="listen on this Unix socket instead")
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=8192,
+        help="glyph masks kept for all fonts together",
+    )
+    parser.add_argument(
+        "--eager", action="store_true", help="decode every glyph at startup"
+    )
+    parser.add_argument(
+        "--cache", action="store_true", help="use the precompiled font cache"
+    )
+    args = parser.parse_args(arguments)
+
+    files = fontFiles(args.fonts)
+    if not files:
+        parser.error("no fonts found")
+    # Lazy fonts load faster than worker processes start
+    fonts = FontCollection.fromFiles(
+        [str(file) for file in files],
+        workers=None if args.eager else 1,
+        lazy=not args.eager,
+        cache=args.cache,
+    )
+    service = RenderService(fonts, cacheSize=args.cache_size, workers=args.workers)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
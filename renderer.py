@@ -1,8 +1,18 @@
+from typing import List, Optional, Set, Tuple
+import time
+import numpy as np
 import pygame
 import pygame.gfxdraw
 from font import Font
+from profiler import PROFILER
+from spatial import SpatialIndex
 from styles import Colors
 
+# (glyphId, loc, color) of a glyph in the scene
+Placement = Tuple[int, Tuple[float, float], Tuple[int, int, int]]
+# (fontSize, letterSpacing, input, coords) the scene is drawn with
+SceneState = Tuple[float, float, str, Tuple[int, ...]]
+
 
 class Renderer:
     screen: pygame.Surface
@@ -10,10 +20,38 @@ class Renderer:
     height: int = 650
     title: str = "Fontsa"
     running: bool
+    # The font passed in and the instance of it being drawn, the same font
+    # unless it is variable and its first axis was moved
+    variableFont: Font
     font: Font
     fontSize = 0.05
     letterSpacing = 0.0
     input: str = ""
+    # Position of the first variation axis, from 0 at its minimum to
+    # axisSteps at its maximum. Only these positions are drawn, so a
+    # repeating animation reuses instance outlines and atlas masks.
+    axisStep: int = 0
+    axisSteps: int = 48
+    animating: bool = False
+    # Seconds to go from the minimum to the maximum and back
+    animationPeriod: float = 2.0
+    animationStart: float = 0.0
+    showOverlay: bool = False
+    overlaySize: int = 14
+    overlayRect: Optional[pygame.Rect]
+    maxFps: int = 60
+    # Distance fields built while drawing are written to the font's cache at
+    # most this often, and once more when the window closes
+    sdfSaveInterval: float = 5.0
+    sdfSavedAt: float
+    maxDirtyRects: int = 16
+    fullRedraw: bool
+    drawnState: Optional[SceneState]
+    drawnRects: Set[Tuple]
+    pendingRects: List[pygame.Rect]
+    # (state, placements, index of their boxes) of the last layout
+    scene: Optional[Tuple[SceneState, List[Placement], SpatialIndex]]
+    hovered: Optional[Placement]
 
     def __init__(self, parser: Font) -> None:
         pygame.init()
@@ -22,40 +60,251 @@ class Renderer:
         pygame.display.set_caption(self.title)
         self.screen = pygame.display.set_mode([self.width, self.height])
         self.running = True
+        self.variableFont = parser
         self.font = parser
+        if parser.fvarTable is not None:
+            axis = parser.fvarTable.axes[0]
+            span = axis.maxValue - axis.minValue
+            self.axisStep = round(
+                (axis.defaultValue - axis.minValue) / span * self.axisSteps
+            )
+        self.overlayRect = None
+        self.fullRedraw = True
+        self.drawnState = None
+        self.drawnRects = set()
+        self.pendingRects = []
+        self.scene = None
+        self.hovered = None
+        self.sdfSavedAt = time.perf_counter()
 
     def mainloop(self) -> None:
+        # Sleeps in pygame.event.wait until something happens, then redraws
+        # only the parts of the window whose glyphs changed
+        clock = pygame.time.Clock()
         while self.running:
-            self.update()
-            self.draw()
-            self.handleEvents()
-            pygame.display.update()
+            with PROFILER.stage("events"):
+                self.handleEvents(wait=self.isIdle())
+            with PROFILER.stage("update"):
+                self.update()
+            with PROFILER.stage("draw"):
+                dirtyRects = self.redraw()
+            if time.perf_counter() - self.sdfSavedAt >= self.sdfSaveInterval:
+                self.saveSdfCache()
+            if self.showOverlay:
+                with PROFILER.stage("overlay"):
+                    dirtyRects.append(self.drawOverlay())
+            if dirtyRects:
+                with PROFILER.stage("display"):
+                    pygame.display.update(dirtyRects)
+            if PROFILER.enabled:
+                PROFILER.endFrame()
+            clock.tick(self.maxFps)
+        self.saveSdfCache()
+
+    def saveSdfCache(self) -> None:
+        self.variableFont.saveSdfCache()
+        self.sdfSavedAt = time.perf_counter()
+
+    def isIdle(self) -> bool:
+        # Nothing to draw until an event changes something
+        return not (
+            self.showOverlay or self.fullRedraw or self.pendingRects or self.animating
+        )
 
     def update(self) -> None:
-        pass
-
-    def draw(self) -> None:
-        self.screen.fill(Colors.BackGround.value)
-        # self.font.printString(
-        #     self.screen,
-        #     self.input,
-        #     fontSize=self.fontSize,
-        #     letterSpacing=self.letterSpacing,
-        #     color=Colors.Primary.value,
-        # )
-        self.font.glyphs[0].draw(self.screen, (10, 10), self.fontSize)
-        self.font.glyphs[1].draw(self.screen, (100, 10), self.fontSize)
-        self.font.drawGlyf(self.screen, 2, (200, 10), self.fontSize)
-        self.font.drawGlyf(self.screen, 3, (300, 10), self.fontSize)
-        self.font.drawGlyf(self.screen, 4, (400, 10), self.fontSize)
-        self.font.drawGlyf(self.screen, 5, (500, 10), self.fontSize)
-
-    def handleEvents(self) -> None:
-        for event in pygame.event.get():
+        if self.animating:
+            # Back and forth over the axis, one step per frame at most
+            phase = (
+                (time.perf_counter() - self.animationStart) / self.animationPeriod % 2
+            )
+            self.setAxisStep(round(min(phase, 2 - phase) * self.axisSteps))
+
+    def state(self) -> SceneState:
+        return (self.fontSize, self.letterSpacing, self.input, self.font.coords)
+
+    def setAxisStep(self, step: int) -> None:
+        # Draws the instance at a step of the first axis. Instances are
+        # cached by the font and only vary the glyphs that get drawn.
+        self.axisStep = min(max(step, 0), self.axisSteps)
+        axis = self.variableFont.fvarTable.axes[0]
+        self.font = self.variableFont.instance({axis.tag: self.axisValue()})
+
+    def axisValue(self) -> float:
+        axis = self.variableFont.fvarTable.axes[0]
+        return (
+            axis.minValue
+            + (axis.maxValue - axis.minValue) * self.axisStep / self.axisSteps
+        )
+
+    def toggleAnimation(self) -> None:
+        if self.variableFont.fvarTable is None:
+            return
+        self.animating = not self.animating
+        # Picks up from the current step
+        self.animationStart = (
+            time.perf_counter() - self.axisStep / self.axisSteps * self.animationPeriod
+        )
+
+    def layout(self) -> List[Placement]:
+        # Every glyph the scene draws as (glyphId, loc, color)
+        placements = [
+            (glyphId, (100 + x, 80), Colors.Primary.value)
+            for glyphId, x in self.font.layoutString(
+                self.input, self.fontSize, self.letterSpacing
+            )
+        ]
+        for glyphId, x in enumerate((10, 100, 200, 300, 400, 500)):
+            placements.append((glyphId, (x, 10), Colors.Text.value))
+        return placements
+
+    def sceneIndex(self) -> Tuple[List[Placement], SpatialIndex]:
+        # The layout and a spatial index of its glyph boxes, only laid out
+        # again when the text, its size or the instance changes
+        state = self.state()
+        if self.scene is None or self.scene[0] != state:
+            placements = self.layout()
+            boxes = self.font.pixelBoxes(
+                [glyphId for glyphId, _, _ in placements], self.fontSize
+            )
+            locs = np.round([loc for _, loc, _ in placements]).reshape(-1, 2)
+            inked = boxes[:, 2] > boxes[:, 0]
+            boxes[inked] += np.tile(locs[inked], 2)
+            self.scene = (state, placements, SpatialIndex(boxes))
+        return self.scene[1], self.scene[2]
+
+    def visible(self, rect: pygame.Rect) -> List[Placement]:
+        # Placements whose glyphs reach into rect, in drawing order. The cost
+        # follows what is inside rect, not the length of the text.
+        placements, index = self.sceneIndex()
+        found = index.query(rect.left, rect.top, rect.right, rect.bottom)
+        return [placements[i] for i in found.tolist()]
+
+    def glyphAt(self, point: Tuple[int, int]) -> Optional[Placement]:
+        # The topmost glyph whose box holds point
+        placements, index = self.sceneIndex()
+        found = index.queryPoint(*point)
+        return placements[found[-1]] if len(found) else None
+
+    def sceneRects(self) -> Set[Tuple]:
+        # (glyphId, color, coords, rect) of every visible glyph, the same
+        # glyph drawn at the same place needs no redraw
+        rects = set()
+        coords = self.font.coords
+        for glyphId, loc, color in self.visible(self.screen.get_rect()):
+            rect = self.font.glyphRect(glyphId, loc, self.fontSize)
+            if rect.width and rect.height:
+                rects.add((glyphId, color, coords, tuple(rect)))
+        return rects
+
+    def draw(self, rect: Optional[pygame.Rect] = None) -> None:
+        # Only the glyphs reaching into rect, the whole window by default
+        rect = rect or self.screen.get_rect()
+        self.screen.fill(Colors.BackGround.value, rect)
+        for glyphId, loc, color in self.visible(rect):
+            self.font.drawGlyf(self.screen, glyphId, loc, self.fontSize, color=color)
+
+    def redraw(self) -> List[pygame.Rect]:
+        dirtyRects = self.pendingRects
+        self.pendingRects = []
+        if self.fullRedraw:
+            self.fullRedraw = False
+            self.drawnState = self.state()
+            self.drawnRects = self.sceneRects()
+            self.draw()
+            return [self.screen.get_rect()]
+
+        state = self.state()
+        if state != self.drawnState:
+            self.drawnState = state
+            rects = self.sceneRects()
+            changed = rects ^ self.drawnRects
+            self.drawnRects = rects
+            dirtyRects += [pygame.Rect(rect) for _, _, _, rect in changed]
+        if not dirtyRects:
+            return []
+
+        if len(dirtyRects) > self.maxDirtyRects:
+            # Past a point one big redraw is cheaper than many clipped ones
+            dirtyRects = [dirtyRects[0].unionall(dirtyRects[1:])]
+        for rect in dirtyRects:
+            self.screen.set_clip(rect)
+            self.draw(rect)
+        self.screen.set_clip(None)
+        return dirtyRects
+
+    def overlayLines(self) -> List[str]:
+        frame = PROFILER.lastFrame
+        lines = [f"frame {PROFILER.frameTime * 1000:.2f} ms  {PROFILER.fps:.0f} fps"]
+        stages = sorted(frame["stages"].items(), key=lambda item: -item[1])
+        lines += [f"{name} {seconds * 1000:.2f} ms" for name, seconds in stages]
+        lines += [
+            f"{name} {count}" for name, count in sorted(frame["counters"].items())
+        ]
+        if self.hovered:
+            lines.append(f"glyph {self.hovered[0]} under the cursor")
+        if self.variableFont.fvarTable is not None:
+            axis = self.variableFont.fvarTable.axes[0]
+            lines.append(f"{axis.tag} {self.axisValue():.0f}")
+        return lines
+
+    def drawOverlay(self) -> pygame.Rect:
+        lines = self.overlayLines()
+        # Always the default instance, the numbers shouldn't change shape
+        font = self.variableFont
+        fontSize = self.overlaySize / font.headTable.unitsPerEm
+        lineHeight = round(self.overlaySize * 1.3)
+        width = 260
+        top = self.height - lineHeight * len(lines) - 10
+        rect = pygame.Rect(self.width - width, top, width, self.height - top)
+        # The overlay can shrink, the scene shows again where it was
+        if self.overlayRect and not rect.contains(self.overlayRect):
+            self.pendingRects.append(self.overlayRect)
+        self.overlayRect = rect
+        self.screen.fill(Colors.Secondary.value, rect)
+        for index, line in enumerate(lines):
+            # Glyphs hang from a baseline 300 px below the location they get
+            baseline = top + lineHeight * (index + 1)
+            font.printString(
+                self.screen,
+                line,
+                fontSize=fontSize,
+                color=Colors.Text.value,
+                loc=(self.width - width + 8, baseline - 300),
+            )
+        return rect
+
+    def toggleOverlay(self) -> None:
+        # The profiler only runs while its numbers are on screen
+        self.showOverlay = not self.showOverlay
+        if self.showOverlay:
+            PROFILER.reset()
+            PROFILER.enable()
+        else:
+            PROFILER.disable()
+            self.pendingRects.append(self.overlayRect)
+            self.overlayRect = None
+
+    def handleEvents(self, wait: bool = False) -> None:
+        events = pygame.event.get()
+        if wait and not events:
+            events = [pygame.event.wait()]
+        for event in events:
             if event.type == pygame.QUIT:
                 self.running = False
+            if event.type in (pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED):
+                self.fullRedraw = True
+            if event.type == pygame.MOUSEMOTION and self.showOverlay:
+                self.hovered = self.glyphAt(event.pos)
             if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_LEFT:
+                if event.key == pygame.K_F3:
+                    self.toggleOverlay()
+                elif event.key == pygame.K_F4:
+                    self.toggleAnimation()
+                elif event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+                    if self.variableFont.fvarTable is not None and not self.animating:
+                        step = 1 if event.key == pygame.K_PAGEUP else -1
+                        self.setAxisStep(self.axisStep + step)
+                elif event.key == pygame.K_LEFT:
                     self.fontSize *= 0.95
                 elif event.key == pygame.K_RIGHT:
                     self.fontSize *= 1.05
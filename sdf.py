@@ -0,0 +1,362 @@
+from typing import Dict, Optional, Sequence, Tuple
+import math
+import numpy as np
+from atlas import GlyphMask
+from glyph import Glyph
+from profiler import PROFILER
+from rasterizer import rasterize
+
+# Field pixels per em, the resolution glyphs are sampled from at every size
+SDF_EM_SIZE = 64
+# Distance in field pixels on either side of the outline that the 0..255
+# range covers, 128 is the outline itself
+SDF_SPREAD = 4
+# How far to either side of an edge the fill is probed, in field pixels
+BURIED_OFFSET = 0.1
+# Point and edge pairs tested at once, bounds the temporary arrays
+MAX_PAIRS = 1 << 20
+
+
+def windingNumbers(
+    points: np.ndarray, starts: np.ndarray, ends: np.ndarray
+) -> np.ndarray:
+    # Nonzero winding number of every point against the closed edges
+    winding = np.zeros(len(points), dtype=np.int64)
+    direction = np.where(ends[:, 1] > starts[:, 1], 1, -1)
+    slopes = (ends[:, 0] - starts[:, 0]) / np.where(
+        ends[:, 1] == starts[:, 1], 1, ends[:, 1] - starts[:, 1]
+    )
+    chunk = max(1, MAX_PAIRS // len(starts))
+    for begin in range(0, len(points), chunk):
+        x = points[begin : begin + chunk, 0, None]
+        y = points[begin : begin + chunk, 1, None]
+        crosses = (starts[:, 1] <= y) != (ends[:, 1] <= y)
+        crossingX = starts[:, 0] + (y - starts[:, 1]) * slopes
+        winding[begin : begin + chunk] = np.where(
+            crosses & (crossingX > x), direction, 0
+        ).sum(axis=1)
+    return winding
+
+
+def outlineSegments(polylines: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    # (starts, ends) of the edges that bound the filled area. Overlapping
+    # contours leave edges buried in the ink and the field would dip around
+    # them, so parts with ink right next to them on both sides are dropped.
+    # Edges are probed in pixel long pieces so that only the buried part of
+    # an edge goes.
+    starts = np.concatenate(polylines)
+    ends = np.concatenate([np.roll(polyline, -1, axis=0) for polyline in polylines])
+    edges = ends - starts
+    lengths = np.hypot(edges[:, 0], edges[:, 1])
+    pieces = np.maximum(np.ceil(lengths), 1).astype(np.int64)
+    edge = np.repeat(np.arange(len(pieces)), pieces)
+    step = (np.arange(int(pieces.sum())) - (np.cumsum(pieces) - pieces)[edge]) / pieces[
+        edge
+    ]
+    pieceStarts = starts[edge] + edges[edge] * step[:, None]
+    pieceEdges = edges[edge] / pieces[edge, None]
+
+    middles = pieceStarts + pieceEdges / 2
+    normals = edges[:, ::-1] * (1, -1) / np.maximum(lengths, 1e-12)[:, None]
+    offsets = normals[edge] * BURIED_OFFSET
+    keep = (windingNumbers(middles + offsets, starts, ends) == 0) | (
+        windingNumbers(middles - offsets, starts, ends) == 0
+    )
+
+    # Runs of kept pieces are joined again, fewer segments to measure
+    sameEdge = edge[1:] == edge[:-1]
+    first = keep.copy()
+    first[1:] &= ~(keep[:-1] & sameEdge)
+    last = keep.copy()
+    last[:-1] &= ~(keep[1:] & sameEdge)
+    return pieceStarts[first], pieceStarts[last] + pieceEdges[last]
+
+
+def distanceField(
+    polylines: Sequence[np.ndarray], width: int, height: int, reach: float
+) -> np.ndarray:
+    # Polylines are closed and in pixel coordinates with y pointing down.
+    # Returns a height x width float field of the distance from every pixel
+    # center to the outline, positive inside and negative outside. Distances
+    # are only measured up to reach, farther pixels get reach.
+    distances = np.full(max(height, 0) * max(width, 0), float(reach))
+    if not polylines or width <= 0 or height <= 0:
+        return distances.reshape(max(height, 0), max(width, 0))
+
+    starts, ends = outlineSegments(polylines)
+    edges = ends - starts
+    lengths = np.maximum((edges * edges).sum(axis=1), 1e-12)
+
+    # Every segment only measures the pixels of its bounding box grown by
+    # reach, which keeps the work proportional to the outline's length
+    low = np.minimum(starts, ends) - reach
+    high = np.maximum(starts, ends) + reach
+    x0 = np.clip(np.ceil(low[:, 0] - 0.5), 0, width).astype(np.int64)
+    y0 = np.clip(np.ceil(low[:, 1] - 0.5), 0, height).astype(np.int64)
+    boxWidths = (
+        np.clip(np.floor(high[:, 0] - 0.5), -1, width - 1).astype(np.int64) + 1 - x0
+    )
+    boxHeights = (
+        np.clip(np.floor(high[:, 1] - 0.5), -1, height - 1).astype(np.int64) + 1 - y0
+    )
+    counts = np.maximum(boxWidths, 0) * np.maximum(boxHeights, 0)
+
+    segment = np.repeat(np.arange(len(counts)), counts)
+    local = np.arange(int(counts.sum())) - (np.cumsum(counts) - counts)[segment]
+    columns = x0[segment] + local % boxWidths[segment]
+    rows = y0[segment] + local // boxWidths[segment]
+
+    relative = np.stack((columns + 0.5, rows + 0.5), axis=1) - starts[segment]
+    t = np.clip((relative * edges[segment]).sum(axis=1) / lengths[segment], 0, 1)
+    offsets = relative - t[:, None] * edges[segment]
+    np.minimum.at(
+        distances, rows * width + columns, np.hypot(offsets[:, 0], offsets[:, 1])
+    )
+
+    # Inside is decided by the same nonzero rule the masks are filled with
+    inside = rasterize(list(polylines), width, height).reshape(-1) >= 128
+    return np.where(inside, distances, -distances).reshape(height, width)
+
+
+def samplePositions(
+    positions: np.ndarray, size: int
+) -> Tuple[Tuple[np.ndarray, np.ndarray], np.ndarray]:
+    # Neighbouring indices and the weight of the second one for linear
+    # interpolation, clamped to the edge of the field
+    positions = np.clip(positions, 0, size - 1)
+    first = np.floor(positions).astype(np.int64)
+    second = np.minimum(first + 1, size - 1)
+    return (first, second), (positions - first).astype(np.float32)
+
+
+def glyphField(
+    glyph: Glyph, scale: float, spread: int
+) -> Tuple[np.ndarray, Tuple[int, int]]:
+    # Encoded field of one glyph and its (left, top) in field pixels from the
+    # glyph origin, an empty field for glyphs without an outline
+    points = glyph.points
+    if len(points) == 0:
+        return np.zeros((0, 0), dtype=np.uint8), (0, 0)
+    # Room for the whole falloff outside the outline
+    pad = spread + 1
+    xMin, yMin = (points.min(axis=0) * scale).tolist()
+    xMax, yMax = (points.max(axis=0) * scale).tolist()
+    left = math.floor(xMin) - pad
+    top = math.floor(-yMax) - pad
+    width = math.ceil(xMax) - math.floor(xMin) + 2 * pad
+    height = math.ceil(yMax) - math.floor(yMin) + 2 * pad
+    polylines = [
+        polyline * (scale, -scale) + (-left, -top) for polyline in glyph.flatten(scale)
+    ]
+    with PROFILER.stage("sdf.field"):
+        field = distanceField(polylines, width, height, spread + 1)
+    encoded = np.clip(np.round(128 + field * (127 / spread)), 0, 255)
+    return encoded.astype(np.uint8), (left, top)
+
+
+class SdfAtlas:
+    # Signed distance fields of the glyphs of a font, packed one after the
+    # other. Field i spans fieldStarts[i]:fieldStarts[i + 1] with shape
+    # shapes[i] and its top left corner at origins[i] field pixels from the
+    # glyph origin, y pointing down. An atlas with glyphs builds the fields
+    # it doesn't have yet the first time they are needed and keeps them in
+    # added until toArrays packs them with the rest.
+    emSize: int
+    spread: int
+    scale: float
+    fields: np.ndarray
+    fieldStarts: np.ndarray
+    shapes: np.ndarray
+    origins: np.ndarray
+    built: np.ndarray
+    added: Dict[int, np.ndarray]
+    glyphs: Optional[Sequence[Glyph]]
+
+    def __init__(
+        self,
+        unitsPerEm: int,
+        fields: np.ndarray,
+        fieldStarts: np.ndarray,
+        shapes: np.ndarray,
+        origins: np.ndarray,
+        emSize: int = SDF_EM_SIZE,
+        spread: int = SDF_SPREAD,
+        built: Optional[np.ndarray] = None,
+        glyphs: Optional[Sequence[Glyph]] = None,
+    ) -> None:
+        self.emSize = emSize
+        self.spread = spread
+        self.scale = emSize / unitsPerEm
+        self.fields = fields
+        self.fieldStarts = fieldStarts
+        # Copies, cached arrays are read only and new fields fill these in
+        self.shapes = np.array(shapes, dtype=np.int32).reshape(-1, 2)
+        self.origins = np.array(origins, dtype=np.int32).reshape(-1, 2)
+        if built is None:
+            built = np.ones(len(self.shapes), dtype=bool)
+        self.built = np.array(built, dtype=bool)
+        self.added = {}
+        self.glyphs = glyphs
+
+    def __len__(self) -> int:
+        return len(self.shapes)
+
+    @staticmethod
+    def build(
+        glyphs: Sequence[Glyph],
+        unitsPerEm: int,
+        emSize: int = SDF_EM_SIZE,
+        spread: int = SDF_SPREAD,
+    ) -> "SdfAtlas":
+        scale = emSize / unitsPerEm
+        fields = []
+        shapes = np.zeros((len(glyphs), 2), dtype=np.int32)
+        origins = np.zeros((len(glyphs), 2), dtype=np.int32)
+        for glyphId in range(len(glyphs)):
+            field, origin = glyphField(glyphs[glyphId], scale, spread)
+            fields.append(field.reshape(-1))
+            shapes[glyphId] = field.shape
+            origins[glyphId] = origin
+
+        sizes = shapes[:, 0].astype(np.int64) * shapes[:, 1]
+        return SdfAtlas(
+            unitsPerEm,
+            np.concatenate(fields) if fields else np.zeros(0, dtype=np.uint8),
+            np.cumsum(np.concatenate(([0], sizes))),
+            shapes,
+            origins,
+            emSize,
+            spread,
+        )
+
+    @staticmethod
+    def lazy(
+        glyphs: Sequence[Glyph],
+        unitsPerEm: int,
+        emSize: int = SDF_EM_SIZE,
+        spread: int = SDF_SPREAD,
+    ) -> "SdfAtlas":
+        # No fields yet, each is built when its glyph is first drawn
+        count = len(glyphs)
+        return SdfAtlas(
+            unitsPerEm,
+            np.zeros(0, dtype=np.uint8),
+            np.zeros(count + 1, dtype=np.int64),
+            np.zeros((count, 2), dtype=np.int32),
+            np.zeros((count, 2), dtype=np.int32),
+            emSize,
+            spread,
+            np.zeros(count, dtype=bool),
+            glyphs,
+        )
+
+    def toArrays(self) -> Dict[str, np.ndarray]:
+        if self.added:
+            # Packs the fields built since the last time
+            glyphIds = np.flatnonzero(self.built).tolist()
+            fields = [self.field(glyphId).reshape(-1) for glyphId in glyphIds]
+            sizes = self.shapes[:, 0].astype(np.int64) * self.shapes[:, 1]
+            self.fields = (
+                np.concatenate(fields) if fields else np.zeros(0, dtype=np.uint8)
+            )
+            self.fieldStarts = np.cumsum(np.concatenate(([0], sizes)))
+            self.added = {}
+        return {
+            "sdfParams": np.array([self.emSize, self.spread], dtype=np.int64),
+            "fields": self.fields,
+            "fieldStarts": self.fieldStarts,
+            "shapes": self.shapes,
+            "origins": self.origins,
+            "built": self.built.astype(np.uint8),
+        }
+
+    @staticmethod
+    def fromArrays(
+        arrays: Dict[str, np.ndarray],
+        unitsPerEm: int,
+        emSize: int = SDF_EM_SIZE,
+        spread: int = SDF_SPREAD,
+    ) -> Optional["SdfAtlas"]:
+        # None when the arrays were built with other parameters
+        if arrays["sdfParams"].tolist() != [emSize, spread]:
+            return None
+        return SdfAtlas(
+            unitsPerEm,
+            arrays["fields"],
+            arrays["fieldStarts"],
+            arrays["shapes"],
+            arrays["origins"],
+            emSize,
+            spread,
+            arrays.get("built"),
+        )
+
+    def buildField(self, glyphId: int) -> None:
+        if self.glyphs is None:
+            raise ValueError(
+                f"No distance field for glyph {glyphId} and no glyphs to build it"
+            )
+        field, origin = glyphField(self.glyphs[glyphId], self.scale, self.spread)
+        self.added[glyphId] = field
+        self.shapes[glyphId] = field.shape
+        self.origins[glyphId] = origin
+        self.built[glyphId] = True
+
+    def field(self, glyphId: int) -> np.ndarray:
+        if not self.built[glyphId]:
+            self.buildField(glyphId)
+        field = self.added.get(glyphId)
+        if field is not None:
+            return field
+        start, end = self.fieldStarts[glyphId : glyphId + 2].tolist()
+        return self.fields[start:end].reshape(self.shapes[glyphId])
+
+    def bounds(self, glyphId: int, fontSize=0.05) -> Tuple[int, int, int, int]:
+        # (left, top, width, height) of the mask render returns, relative to
+        # the loc the glyph is drawn at like Glyph.bounds
+        if not self.built[glyphId]:
+            self.buildField(glyphId)
+        height, width = self.shapes[glyphId].tolist()
+        if width == 0:
+            return 0, 0, 0, 0
+        left, top = self.origins[glyphId].tolist()
+        ratio = fontSize / self.scale
+        right = math.ceil((left + width) * ratio)
+        bottom = math.ceil((top + height) * ratio)
+        left = math.floor(left * ratio)
+        top = math.floor(top * ratio)
+        return left, 300 + top, right - left, bottom - top
+
+    def render(self, glyphId: int, fontSize=0.05) -> GlyphMask:
+        # Alpha mask at any size from bilinear samples of the field, the
+        # outline is never touched
+        left, top, width, height = self.bounds(glyphId, fontSize)
+        if width == 0:
+            return np.zeros((0, 0), dtype=np.uint8), 0, 0
+
+        ratio = fontSize / self.scale
+        field = self.field(glyphId).astype(np.float32)
+        fieldLeft, fieldTop = self.origins[glyphId].tolist()
+        columns, columnWeights = samplePositions(
+            (np.arange(left, left + width) + 0.5) / ratio - fieldLeft - 0.5,
+            field.shape[1],
+        )
+        rows, rowWeights = samplePositions(
+            (np.arange(top - 300, top - 300 + height) + 0.5) / ratio - fieldTop - 0.5,
+            field.shape[0],
+        )
+        blended = (
+            field[:, columns[0]] * (1 - columnWeights)
+            + field[:, columns[1]] * columnWeights
+        )
+        sampled = (
+            blended[rows[0]] * (1 - rowWeights)[:, None]
+            + blended[rows[1]] * rowWeights[:, None]
+        )
+
+        # Distance in screen pixels, the outline falls half way through alpha
+        distance = (sampled - 128) * (self.spread / 127 * ratio)
+        alpha = np.clip(distance + 0.5, 0, 1)
+        if PROFILER.enabled:
+            PROFILER.count("sdf.pixels", width * height)
+        return np.round(alpha * 255).astype(np.uint8), left, top
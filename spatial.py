@@ -0,0 +1,123 @@
+from typing import Optional
+import math
+import numpy as np
+
+# Cell size when there is nothing to measure one from, in pixels
+DEFAULT_CELL_SIZE = 64.0
+# Cells per box before sparse scenes get coarser cells
+MAX_CELLS_PER_BOX = 4
+MIN_CELLS = 1024
+
+
+class SpatialIndex:
+    # Uniform grid over boxes given as (left, top, right, bottom). Every box
+    # is listed in each cell it touches, ordered by cell and then by box, so
+    # a row of cells is one slice of entries and queries only look at the
+    # cells they cover. Boxes without area are never found.
+    boxes: np.ndarray
+    cellSize: float
+    originX: float
+    originY: float
+    columns: int
+    rows: int
+    cellStarts: np.ndarray
+    entries: np.ndarray
+
+    def __init__(self, boxes: np.ndarray, cellSize: Optional[float] = None) -> None:
+        self.boxes = boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        filled = np.flatnonzero(
+            (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+        )
+        if cellSize is None:
+            # A couple of glyphs per cell
+            sizes = np.concatenate(
+                (
+                    boxes[filled, 2] - boxes[filled, 0],
+                    boxes[filled, 3] - boxes[filled, 1],
+                )
+            )
+            cellSize = 2 * float(np.median(sizes)) if len(sizes) else DEFAULT_CELL_SIZE
+        if not len(filled):
+            self.cellSize, self.originX, self.originY = cellSize, 0.0, 0.0
+            self.columns = self.rows = 0
+            self.cellStarts = np.zeros(1, dtype=np.int64)
+            self.entries = np.zeros(0, dtype=np.int64)
+            return
+
+        self.originX, self.originY = boxes[filled, :2].min(axis=0).tolist()
+        width, height = (
+            boxes[filled, 2:].max(axis=0) - (self.originX, self.originY)
+        ).tolist()
+        maxCells = max(MAX_CELLS_PER_BOX * len(filled), MIN_CELLS)
+        while (
+            math.ceil(width / cellSize + 1e-9) * math.ceil(height / cellSize + 1e-9)
+            > maxCells
+        ):
+            cellSize *= 2
+        self.cellSize = cellSize
+        self.columns = max(math.ceil(width / cellSize + 1e-9), 1)
+        self.rows = max(math.ceil(height / cellSize + 1e-9), 1)
+
+        first = self.cellsOf(boxes[filled, :2])
+        last = self.cellsOf(boxes[filled, 2:])
+        spans = last - first + 1
+        counts = spans[:, 0] * spans[:, 1]
+        box = np.repeat(np.arange(len(filled)), counts)
+        local = np.arange(int(counts.sum())) - (np.cumsum(counts) - counts)[box]
+        column = first[box, 0] + local % spans[box, 0]
+        row = first[box, 1] + local // spans[box, 0]
+        cells = row * self.columns + column
+        order = np.argsort(cells, kind="stable")
+        self.entries = filled[box[order]]
+        self.cellStarts = np.searchsorted(
+            cells[order], np.arange(self.columns * self.rows + 1)
+        ).astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def cellsOf(self, points: np.ndarray) -> np.ndarray:
+        # (column, row) of the cells points fall in, clamped to the grid
+        cells = np.floor((points - (self.originX, self.originY)) / self.cellSize)
+        return np.clip(cells, 0, (self.columns - 1, self.rows - 1)).astype(np.int64)
+
+    def candidates(
+        self, left: float, top: float, right: float, bottom: float
+    ) -> np.ndarray:
+        # Boxes listed in the cells the area covers, with repeats
+        if not self.rows:
+            return self.entries
+        (column0, row0), (column1, row1) = self.cellsOf(
+            np.array([[left, top], [right, bottom]], dtype=np.float64)
+        ).tolist()
+        starts = self.cellStarts[np.arange(row0, row1 + 1) * self.columns + column0]
+        ends = self.cellStarts[np.arange(row0, row1 + 1) * self.columns + column1 + 1]
+        return np.concatenate(
+            [self.entries[start:end] for start, end in zip(starts, ends)]
+        )
+
+    def query(self, left: float, top: float, right: float, bottom: float) -> np.ndarray:
+        # Sorted indices of the boxes overlapping the area, touching edges
+        # don't count, the same as pygame.Rect.colliderect
+        found = np.unique(self.candidates(left, top, right, bottom))
+        boxes = self.boxes[found]
+        overlap = (
+            (boxes[:, 0] < right)
+            & (boxes[:, 2] > left)
+            & (boxes[:, 1] < bottom)
+            & (boxes[:, 3] > top)
+        )
+        return found[overlap]
+
+    def queryPoint(self, x: float, y: float) -> np.ndarray:
+        # Sorted indices of the boxes containing the point, the last one is
+        # drawn on top
+        found = np.unique(self.candidates(x, y, x, y))
+        boxes = self.boxes[found]
+        inside = (
+            (boxes[:, 0] <= x)
+            & (x < boxes[:, 2])
+            & (boxes[:, 1] <= y)
+            & (y < boxes[:, 3])
+        )
+        return found[inside]
@@ -0,0 +1,289 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+import argparse
+import struct
+import time
+import numpy as np
+from font import Font
+from font_writer import (
+    HHEA_EXTREMES,
+    HHEA_NUMBER_OF_HMETRICS,
+    MAXP_NUM_GLYPHS,
+    buildCmap,
+    buildFont,
+    buildGlyf,
+    buildHead,
+    buildHmtx,
+    buildKern,
+    buildMaxp,
+    buildPost,
+    setField,
+)
+from glyph import (
+    ARG_1_AND_2_ARE_WORDS,
+    MORE_COMPONENTS,
+    WE_HAVE_A_SCALE,
+    WE_HAVE_A_TWO_BY_TWO,
+    WE_HAVE_AN_X_AND_Y_SCALE,
+)
+from tables import MaxpTable
+
+# numberOfContours and bounding box at the start of every glyph
+GLYPH_HEADER = struct.Struct(">hhhhh")
+
+# Copied as they are, none of them refers to glyph ids. Layout tables
+# (GDEF, GSUB, GPOS) and per glyph device tables are dropped, pair kerning
+# is kept as a kern table.
+COPIED_TABLES = ("OS/2", "name", "cvt ", "fpgm", "prep", "gasp")
+
+# Kerning pairs checked at once when collecting the subset's kerning
+MAX_PAIRS = 1 << 20
+
+
+class SubsetResult(NamedTuple):
+    path: Path
+    glyphs: int
+    sourceSize: int
+    size: int
+    seconds: float
+
+
+def isCompound(data: bytes) -> bool:
+    return len(data) >= GLYPH_HEADER.size and GLYPH_HEADER.unpack_from(data)[0] < 0
+
+
+def componentRecords(data: bytes) -> List[Tuple[int, int]]:
+    # (offset of the glyph index, glyph index) of every component in the raw
+    # data of a compound glyph
+    records: List[Tuple[int, int]] = []
+    offset = GLYPH_HEADER.size
+    flags = MORE_COMPONENTS
+    while flags & MORE_COMPONENTS:
+        flags, glyphIndex = struct.unpack_from(">HH", data, offset)
+        records.append((offset + 2, glyphIndex))
+        offset += 8 if flags & ARG_1_AND_2_ARE_WORDS else 6
+        if flags & WE_HAVE_A_SCALE:
+            offset += 2
+        elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+            offset += 4
+        elif flags & WE_HAVE_A_TWO_BY_TWO:
+            offset += 8
+    return records
+
+
+def glyphClosure(font: Font, glyphIds: Iterable[int]) -> List[int]:
+    # Sorted ids of the glyphs needed to draw glyphIds, with .notdef and
+    # every component of a compound glyph, however deeply nested
+    needed = set()
+    pending = [0, *glyphIds]
+    while pending:
+        glyphId = pending.pop()
+        if glyphId in needed:
+            continue
+        needed.add(glyphId)
+        data = font.glyphData(glyphId)
+        if isCompound(data):
+            pending += [component for _, component in componentRecords(data)]
+    return sorted(needed)
+
+
+def renumberComponents(data: bytes, newIds: Dict[int, int]) -> bytes:
+    if not isCompound(data):
+        return data
+    patched = bytearray(data)
+    for offset, glyphIndex in componentRecords(data):
+        struct.pack_into(">H", patched, offset, newIds[glyphIndex])
+    return bytes(patched)
+
+
+def subsetMaxp(font: Font, glyphIds: Sequence[int]) -> MaxpTable:
+    # Outline maximums over the kept glyphs, the hinting limits stay
+    maxpTable = font.maxpTable._replace(
+        numGlyphs=len(glyphIds),
+        maxPoints=0,
+        maxContours=0,
+        maxCompositePoints=0,
+        maxCompositeContours=0,
+        maxComponentElements=0,
+        maxComponentDepth=0,
+    )
+    for glyphId in glyphIds:
+        glyph = font.glyphs[glyphId]
+        if glyph.isCompound:
+            maxpTable = maxpTable._replace(
+                maxCompositePoints=max(maxpTable.maxCompositePoints, len(glyph.points)),
+                maxCompositeContours=max(
+                    maxpTable.maxCompositeContours, glyph.numberOfContours
+                ),
+                maxComponentElements=max(
+                    maxpTable.maxComponentElements, len(glyph.components)
+                ),
+                maxComponentDepth=max(maxpTable.maxComponentDepth, glyph.depth),
+            )
+        else:
+            maxpTable = maxpTable._replace(
+                maxPoints=max(maxpTable.maxPoints, len(glyph.points)),
+                maxContours=max(maxpTable.maxContours, glyph.numberOfContours),
+            )
+    return maxpTable
+
+
+def subsetKerning(font: Font, glyphIds: Sequence[int]) -> List[Tuple[int, int, int]]:
+    # (left, right, value) in new glyph ids for every kerned pair of the subset
+    kerningIndex = font.getKerningIndex()
+    if not kerningIndex:
+        return []
+    ids = np.asarray(glyphIds, dtype=np.int64)
+    count = len(ids)
+    pairs: List[Tuple[int, int, int]] = []
+    rowsPerChunk = max(1, MAX_PAIRS // count)
+    for first in range(0, count, rowsPerChunk):
+        lefts = np.repeat(np.arange(first, min(first + rowsPerChunk, count)), count)
+        rights = np.tile(np.arange(count), len(lefts) // count)
+        values = kerningIndex.adjustments(ids[lefts], ids[rights])
+        kerned = np.flatnonzero(values)
+        pairs += zip(
+            lefts[kerned].tolist(), rights[kerned].tolist(), values[kerned].tolist()
+        )
+    return pairs
+
+
+def subsetTables(
+    font: Font, codes: Iterable[int], kerning: bool = True
+) -> Dict[str, bytes]:
+    # Tables of a font holding only the glyphs of codes. Glyphs are
+    # renumbered in their original order, .notdef stays glyph 0. Class based
+    # kerning is written out pair by pair and can make up most of the file.
+    codes = sorted(set(codes))
+    glyphIds = font.cmapTable.getGlyphIds(codes, default=0).tolist()
+    mapping = {code: glyphId for code, glyphId in zip(codes, glyphIds) if glyphId}
+    kept = glyphClosure(font, mapping.values())
+    newIds = {glyphId: newId for newId, glyphId in enumerate(kept)}
+
+    glyphData = [
+        renumberComponents(font.glyphData(glyphId), newIds) for glyphId in kept
+    ]
+    loca, glyf, indexToLocFormat = buildGlyf(glyphData)
+    metrics = [font.hmtxTable.getMetric(glyphId) for glyphId in kept]
+    hmtx, numberOfHMetrics = buildHmtx(metrics)
+
+    # Boxes of the glyphs with an outline come from their headers, empty
+    # glyphs don't count towards the extremes
+    boxes = np.array(
+        [GLYPH_HEADER.unpack_from(data)[1:] for data in glyphData if data],
+        dtype=np.int64,
+    ).reshape(-1, 4)
+    inked = np.array(metrics, dtype=np.int64)[[bool(data) for data in glyphData]]
+    if not len(boxes):
+        boxes = inked = np.zeros((1, 4), dtype=np.int64)
+    xMin, yMin = boxes[:, :2].min(axis=0).tolist()
+    xMax, yMax = boxes[:, 2:].max(axis=0).tolist()
+    extents = inked[:, 1] + boxes[:, 2] - boxes[:, 0]
+    hhea = setField(
+        font.tableData("hhea"),
+        HHEA_EXTREMES,
+        ">Hhhh",
+        max(advance for advance, _ in metrics),
+        int(inked[:, 1].min()),
+        int((inked[:, 0] - extents).min()),
+        int(extents.max()),
+    )
+
+    tables = {
+        tag: font.tableData(tag) for tag in COPIED_TABLES if tag in font.fontDirectory
+    }
+    tables.update(
+        head=buildHead(
+            font.headTable._replace(
+                xMin=xMin,
+                yMin=yMin,
+                xMax=xMax,
+                yMax=yMax,
+                indexToLocFormat=indexToLocFormat,
+            )
+        ),
+        hhea=setField(hhea, HHEA_NUMBER_OF_HMETRICS, ">H", numberOfHMetrics),
+        maxp=buildMaxp(subsetMaxp(font, kept)),
+        cmap=buildCmap({code: newIds[glyphId] for code, glyphId in mapping.items()}),
+        loca=loca,
+        glyf=glyf,
+        hmtx=hmtx,
+    )
+    if "post" in font.fontDirectory:
+        tables["post"] = buildPost(font.tableData("post"))
+    pairs = subsetKerning(font, kept) if kerning else []
+    if pairs:
+        tables["kern"] = buildKern(pairs)
+    return tables
+
+
+def subsetFont(
+    font: Font, codes: Iterable[int], path: str, kerning: bool = True
+) -> SubsetResult:
+    start = time.perf_counter()
+    tables = subsetTables(font, codes, kerning)
+    data = buildFont(tables)
+    seconds = time.perf_counter() - start
+    Path(path).write_bytes(data)
+    return SubsetResult(
+        path=Path(path),
+        glyphs=struct.unpack_from(">H", tables["maxp"], MAXP_NUM_GLYPHS)[0],
+        sourceSize=Path(font.file).stat().st_size,
+        size=len(data),
+        seconds=seconds,
+    )
+
+
+def parseUnicodes(value: str) -> List[int]:
+    # Comma separated hex code points and ranges, eg. "20-7E,A9,U+2014"
+    codes: List[int] = []
+    try:
+        for part in value.replace("U+", "").replace("u+", "").split(","):
+            if not part.strip():
+                continue
+            first, _, last = part.partition("-")
+            codes += range(int(first, 16), int(last or first, 16) + 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a code point list: {value}")
+    return codes
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Write a font with only the glyphs of some text"
+    )
+    parser.add_argument("font", help="path to a .ttf file")
+    parser.add_argument("output", help="path of the subset .ttf file")
+    parser.add_argument(
+        "-t", "--text", default="", help="keep the characters of this text"
+    )
+    parser.add_argument(
+        "-u",
+        "--unicodes",
+        type=parseUnicodes,
+        default=[],
+        help="keep these hex code points and ranges, eg. 20-7E,A9",
+    )
+    parser.add_argument("-f", "--file", help="keep the characters of a UTF-8 text file")
+    parser.add_argument(
+        "--no-kerning", action="store_true", help="leave out the kern table"
+    )
+    args = parser.parse_args(arguments)
+
+    codes = set(map(ord, args.text)) | set(args.unicodes)
+    if args.file:
+        codes |= set(map(ord, Path(args.file).read_text(encoding="utf-8")))
+    if not codes:
+        parser.error("no characters to keep")
+
+    result = subsetFont(
+        Font(args.font), codes, args.output, kerning=not args.no_kerning
+    )
+    print(
+        f"{result.glyphs} glyphs, {result.sourceSize} -> {result.size} bytes "
+        f"({result.size / result.sourceSize:.1%}) in {result.seconds * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
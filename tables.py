@@ -1,5 +1,25 @@
-from typing import NamedTuple, List, Dict, Tuple
+from bisect import bisect_left
+from typing import NamedTuple, Iterable, List, Dict, Optional, Tuple
 from file_reader import BinaryFileReader
+import numpy as np
+import struct
+
+TABLE_RECORD = struct.Struct(">4sIII")
+ENCODING_RECORD = struct.Struct(">HHI")
+LONG_HOR_METRIC = struct.Struct(">Hh")
+
+
+def mergeRanges(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Inclusive ranges sorted, with empty ones dropped and the ones that
+    # overlap or touch joined
+    keep = starts <= ends
+    order = np.argsort(starts[keep], kind="stable")
+    starts, ends = starts[keep][order], ends[keep][order]
+    if not len(starts):
+        return starts, ends
+    reach = np.maximum.accumulate(ends)
+    first = np.flatnonzero(np.concatenate(([True], starts[1:] > reach[:-1] + 1)))
+    return starts[first], np.maximum.reduceat(ends, first)
 
 
 class TableRecord(NamedTuple):
@@ -54,96 +74,247 @@ class MaxpTable(NamedTuple):
     maxComponentDepth: int
 
 
+# (platformID, encodingID, format) in order of preference, full Unicode
+# coverage first, then the BMP only subtables
+CMAP_PREFERENCES = [
+    (3, 10, 12),
+    (0, 6, 12),
+    (0, 4, 12),
+    (3, 1, 4),
+    (0, 3, 4),
+    (0, 2, 4),
+    (0, 1, 4),
+    (0, 0, 4),
+]
+
+
 class CmapTable:
-    startCodes: List[int] = []
-    endCodes: List[int] = []
-    idDeltas: List[int] = []
-    idRangeOffsets: List[int] = []
-    glyphIndexMap: Dict[int, int] = {}
+    format: int
+    startCodes: List[int]
+    endCodes: List[int]
+    idDeltas: List[int]
+    idRangeOffsets: List[int]
+    glyphIdArray: List[int]
     segCount: int
+    segmentArrays: Optional[Tuple[np.ndarray, ...]]
+    coverage: Optional[Tuple[np.ndarray, np.ndarray]]
+
+    def __init__(
+        self,
+        format: int,
+        startCodes: List[int],
+        endCodes: List[int],
+        idDeltas: List[int],
+        idRangeOffsets: List[int],
+        glyphIdArray: List[int],
+    ) -> None:
+        # For format 4 glyphIdArray holds the idRangeOffsets words followed by
+        # the subtable's glyphIdArray, so a range offset resolves to the index
+        # segment + idRangeOffset / 2 + (charCode - startCode). Format 12
+        # groups are stored as segments with idDelta = startGlyphID - startCode.
+        self.format = format
+        self.startCodes = startCodes
+        self.endCodes = endCodes
+        self.idDeltas = idDeltas
+        self.idRangeOffsets = idRangeOffsets
+        self.glyphIdArray = glyphIdArray
+        self.segCount = len(endCodes)
+        self.segmentArrays = None
+        self.coverage = None
 
-    def __init__(self, reader: BinaryFileReader) -> None:
+    @staticmethod
+    def fromReader(reader: BinaryFileReader) -> "CmapTable":
+        tableStart = reader.index
         version = reader.parseUint16()
         numberSubtables = reader.parseUint16()
 
-        encodingRecords: List[EncodingRecord] = []
-
-        for i in range(numberSubtables):
-            platformID = reader.parseUint16()
-            encodingID = reader.parseUint16()
-            offset = reader.parseUint32()
+        encodingRecords: List[EncodingRecord] = [
+            EncodingRecord(platformID=platformID, encodingID=encodingID, offset=offset)
+            for platformID, encodingID, offset in reader.parseRecords(
+                ENCODING_RECORD, numberSubtables
+            )
+        ]
 
-            encodingRecords.append(
-                EncodingRecord(
-                    offset=offset, platformID=platformID, encodingID=encodingID
-                )
+        subtables: Dict[Tuple[int, int, int], int] = {}
+        for record in encodingRecords:
+            reader.goto(tableStart + record.offset)
+            format = reader.parseUint16()
+            subtables.setdefault(
+                (record.platformID, record.encodingID, format), reader.index - 2
             )
 
-        format = reader.parseUint16()
+        # Unicode subtables first, then any other one in a format we can read,
+        # like the (3, 0) Symbol or (1, 0) Mac Roman ones, in table order
+        keys = [key for key in CMAP_PREFERENCES if key in subtables]
+        keys += [key for key in subtables if key[2] in (4, 12) and key not in keys]
+        if not keys:
+            raise ValueError(f"No supported cmap subtable in {sorted(subtables)}")
+
+        reader.goto(subtables[keys[0]] + 2)
+        if keys[0][2] == 12:
+            return CmapTable.parseFormat12(reader)
+        return CmapTable.parseFormat4(reader)
+
+    @staticmethod
+    def parseFormat4(reader: BinaryFileReader) -> "CmapTable":
         length = reader.parseUint16()
         language = reader.parseUint16()
-        segCount2x = reader.parseUint16()
-        self.segCount = int(segCount2x / 2)
+        segCount = reader.parseUint16() // 2
         searchRange = reader.parseUint16()
         entrySelector = reader.parseUint16()
         rangeShift = reader.parseUint16()
 
-        for i in range(self.segCount):
-            self.endCodes.append(reader.parseUint16())
-
+        endCodes = reader.parseUint16Array(segCount).tolist()
         reservedPad = reader.parseUint16()
+        startCodes = reader.parseUint16Array(segCount).tolist()
+        idDeltas = reader.parseInt16Array(segCount).tolist()
+        rangeWords = (length - 16 - 6 * segCount) // 2
+        glyphIdArray = reader.parseUint16Array(rangeWords).tolist()
+
+        return CmapTable(
+            format=4,
+            startCodes=startCodes,
+            endCodes=endCodes,
+            idDeltas=idDeltas,
+            idRangeOffsets=glyphIdArray[:segCount],
+            glyphIdArray=glyphIdArray,
+        )
 
-        for i in range(self.segCount):
-            self.startCodes.append(reader.parseUint16())
-
-        for i in range(self.segCount):
-            self.idDeltas.append(reader.parseInt16())
-
-        idRangeOffsetsStart = reader.index
-
-        for i in range(self.segCount):
-            self.idRangeOffsets.append(reader.parseUint16())
-
-        # Copy pasted code please beware
-        for i in range(1, self.segCount):
-            glyphIndex = 0
-            endCode = self.endCodes[i]
-            startCode = self.startCodes[i]
-            idDelta = self.idDeltas[i]
-            idRangeOffset = self.idRangeOffsets[i]
-
-            for c in range(startCode, endCode):
-                if idRangeOffset != 0:
-                    startCodeOffset = (c - startCode) * 2
-                    currentRangeOffset = i * 2
-                    glyphIndexOffset = (
-                        idRangeOffsetsStart
-                        + currentRangeOffset
-                        + idRangeOffset
-                        + startCodeOffset
-                    )
-
-                    reader.goto(glyphIndexOffset)
-                    glyphIndex = reader.parseUint16()
-                    if glyphIndex != 0:
-                        glyphIndex = (glyphIndex + idDelta) & 0xFFFF
-                else:
-                    glyphIndex = (c + idDelta) & 0xFFFF
-                self.glyphIndexMap[c] = glyphIndex
+    @staticmethod
+    def parseFormat12(reader: BinaryFileReader) -> "CmapTable":
+        reserved = reader.parseUint16()
+        length = reader.parseUint32()
+        language = reader.parseUint32()
+        numGroups = reader.parseUint32()
+        groups = reader.parseUint32Array(3 * numGroups)
+
+        startCodes = groups[0::3].tolist()
+        return CmapTable(
+            format=12,
+            startCodes=startCodes,
+            endCodes=groups[1::3].tolist(),
+            idDeltas=[
+                startGlyph - startCode
+                for startGlyph, startCode in zip(groups[2::3], startCodes)
+            ],
+            idRangeOffsets=[0] * numGroups,
+            glyphIdArray=[],
+        )
 
     def getGlyphId(self, charCode: int) -> int:
-        return self.glyphIndexMap[charCode]
+        i = bisect_left(self.endCodes, charCode)
+        if i == self.segCount or self.startCodes[i] > charCode:
+            raise KeyError(charCode)
+
+        idDelta = self.idDeltas[i]
+        if self.format == 12:
+            return charCode + idDelta
 
+        idRangeOffset = self.idRangeOffsets[i]
+        if idRangeOffset == 0:
+            return (charCode + idDelta) & 0xFFFF
+        glyphIndex = self.glyphIdArray[
+            i + idRangeOffset // 2 + (charCode - self.startCodes[i])
+        ]
+        return (glyphIndex + idDelta) & 0xFFFF if glyphIndex != 0 else 0
 
-class HmtxTable(NamedTuple):
+    def getGlyphIds(
+        self, charCodes: Iterable[int], default: Optional[int] = None
+    ) -> np.ndarray:
+        # Without a default, a code point outside every segment raises KeyError
+        if self.segmentArrays is None:
+            self.segmentArrays = (
+                np.array(self.startCodes, dtype=np.int64),
+                np.array(self.endCodes, dtype=np.int64),
+                np.array(self.idDeltas, dtype=np.int64),
+                np.array(self.idRangeOffsets, dtype=np.int64),
+                np.array(self.glyphIdArray or [0], dtype=np.int64),
+            )
+        startCodes, endCodes, idDeltas, idRangeOffsets, glyphIdArray = (
+            self.segmentArrays
+        )
+
+        codes = np.fromiter(charCodes, dtype=np.int64)
+        segments = np.minimum(np.searchsorted(endCodes, codes), self.segCount - 1)
+        starts = startCodes[segments]
+        covered = (starts <= codes) & (codes <= endCodes[segments])
+        if default is None and not covered.all():
+            raise KeyError(int(codes[~covered][0]))
+
+        deltas = idDeltas[segments]
+        if self.format == 12:
+            glyphIds = codes + deltas
+        else:
+            rangeOffsets = idRangeOffsets[segments]
+            viaRange = rangeOffsets != 0
+            indices = segments + rangeOffsets // 2 + (codes - starts)
+            fromRange = glyphIdArray[np.clip(indices, 0, len(glyphIdArray) - 1)]
+            glyphIds = np.where(viaRange, fromRange, codes)
+            glyphIds = np.where(
+                viaRange & (fromRange == 0), 0, (glyphIds + deltas) & 0xFFFF
+            )
+
+        if default is not None:
+            glyphIds[~covered] = default
+        return glyphIds
+
+    def coverageRanges(self) -> Tuple[np.ndarray, np.ndarray]:
+        # (starts, ends) of the inclusive code point ranges that map to a
+        # glyph other than .notdef, sorted and merged
+        if self.coverage is not None:
+            return self.coverage
+        starts = np.array(self.startCodes, dtype=np.int64)
+        ends = np.array(self.endCodes, dtype=np.int64)
+        deltas = np.array(self.idDeltas, dtype=np.int64)
+        direct = np.array(self.idRangeOffsets, dtype=np.int64) == 0
+
+        # A segment without a range offset maps every code to code + idDelta,
+        # which is glyph 0 for at most one code
+        zero = -deltas if self.format == 12 else -deltas & 0xFFFF
+        hole = direct & (starts <= zero) & (zero <= ends)
+        rangeStarts = [starts[direct], zero[hole] + 1]
+        rangeEnds = [np.where(hole, zero - 1, ends)[direct], ends[hole]]
+
+        # Codes that go through glyphIdArray are looked up one by one
+        lengths = (ends - starts + 1)[~direct]
+        codes = np.repeat(starts[~direct] - (np.cumsum(lengths) - lengths), lengths)
+        codes = codes + np.arange(len(codes))
+        codes = codes[self.getGlyphIds(codes) != 0]
+        # Each one is a range of its own until they are merged
+        rangeStarts.append(codes)
+        rangeEnds.append(codes)
+
+        self.coverage = mergeRanges(
+            np.concatenate(rangeStarts), np.concatenate(rangeEnds)
+        )
+        return self.coverage
+
+
+class HmtxTable:
     hMetrics: List[Tuple[int, int]]
     leftSideBearings: List[int]
+    advanceWidths: np.ndarray
+    sideBearings: np.ndarray
+
+    def __init__(
+        self, hMetrics: List[Tuple[int, int]], leftSideBearings: List[int]
+    ) -> None:
+        # Glyphs past hMetrics repeat the last advance width, the flat
+        # arrays hold both values for every glyph
+        self.hMetrics = hMetrics
+        self.leftSideBearings = leftSideBearings
+        metrics = np.array(hMetrics, dtype=np.int32).reshape(-1, 2)
+        lastAdvance = metrics[-1, 0] if len(metrics) else 0
+        self.advanceWidths = np.concatenate(
+            (metrics[:, 0], np.full(len(leftSideBearings), lastAdvance, dtype=np.int32))
+        )
+        self.sideBearings = np.concatenate(
+            (metrics[:, 1], np.array(leftSideBearings, dtype=np.int32))
+        )
 
     def getMetric(self, idx: int) -> Tuple[int, int]:
-        if idx < len(self.hMetrics):
-            return self.hMetrics[idx]
-        else:
-            return [
-                self.hMetrics[-1][0],
-                self.leftSideBearings[idx - len(self.hMetrics)],
-            ]
+        return int(self.advanceWidths[idx]), int(self.sideBearings[idx])
+
+    def getMetrics(self, glyphIds: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # (advance widths, left side bearings) of many glyphs at once
+        return self.advanceWidths[glyphIds], self.sideBearings[glyphIds]
@@ -0,0 +1,298 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import argparse
+import math
+import os
+import time
+import numpy as np
+from atlas import GlyphMask
+from batch_renderer import Color, colorize, parseColor, pngBytes
+from font import Font
+from profiler import PROFILER
+from spatial import SpatialIndex
+from styles import Colors
+
+# Tiles are squares of this many pixels, small enough that a page has a few
+# per core and big enough that most glyphs fall in one
+TILE_SIZE = 256
+# Line height in ems
+LINE_SPACING = 1.2
+
+
+class PageLayout(NamedTuple):
+    # Every glyph of a page. Glyph i is drawn at locs[i] like Font.drawGlyf,
+    # its mask covers boxes[i] as (left, top, right, bottom) page pixels.
+    glyphIds: np.ndarray
+    locs: np.ndarray
+    boxes: np.ndarray
+    width: int
+    height: int
+
+
+class TileTask(NamedTuple):
+    # (left, top, right, bottom) of a tile and the glyphs that touch it
+    bounds: Tuple[int, int, int, int]
+    glyphIds: np.ndarray
+    locs: np.ndarray
+
+
+class TileRasterizer:
+    # Fills tiles of a page canvas with one font at one size. Every worker
+    # process keeps one, with the masks of the glyphs it has rasterized.
+    font: Font
+    fontSize: float
+    masks: Dict[int, GlyphMask]
+    segment: Optional[SharedMemory]
+
+    def __init__(self, font: Font, fontSize: float) -> None:
+        self.font = font
+        self.fontSize = fontSize
+        self.masks = {}
+        self.segment = None
+
+    def glyphMask(self, glyphId: int) -> GlyphMask:
+        glyphMask = self.masks.get(glyphId)
+        if glyphMask is None:
+            glyphMask = self.font.instanceGlyph(glyphId).rasterize(self.fontSize)
+            self.masks[glyphId] = glyphMask
+        return glyphMask
+
+    def rasterizeTile(self, canvas: np.ndarray, task: TileTask) -> None:
+        # Each glyph's mask is clipped to the tile, so a glyph over a tile
+        # edge is drawn in parts by several tiles. Tiles don't overlap and
+        # workers never write the same pixels.
+        left, top, right, bottom = task.bounds
+        tile = canvas[top:bottom, left:right]
+        for glyphId, (x, y) in zip(task.glyphIds.tolist(), task.locs.tolist()):
+            mask, offsetX, offsetY = self.glyphMask(glyphId)
+            # Placed like Font.glyphRect places it
+            column = round(x) + offsetX - left
+            row = round(y) + offsetY - top
+            height, width = mask.shape
+            clipLeft, clipTop = max(-column, 0), max(-row, 0)
+            clipRight = min(width, tile.shape[1] - column)
+            clipBottom = min(height, tile.shape[0] - row)
+            if clipLeft >= clipRight or clipTop >= clipBottom:
+                continue
+            region = tile[
+                row + clipTop : row + clipBottom, column + clipLeft : column + clipRight
+            ]
+            # Overlapping glyphs keep the stronger coverage, like composeMasks
+            np.maximum(region, mask[clipTop:clipBottom, clipLeft:clipRight], out=region)
+
+    def sharedCanvas(self, name: str, shape: Tuple[int, int]) -> np.ndarray:
+        # The page being rendered, attached once per page
+        if self.segment is None or self.segment.name != name:
+            if self.segment is not None:
+                self.segment.close()
+            self.segment = SharedMemory(name)
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.segment.buf)
+
+
+# The rasterizer of a worker process, set up by initWorker
+WORKER: Optional[TileRasterizer] = None
+
+
+def initWorker(font: Font, fontSize: float) -> None:
+    global WORKER
+    WORKER = TileRasterizer(font, fontSize)
+
+
+def rasterizeShared(name: str, shape: Tuple[int, int], task: TileTask) -> None:
+    WORKER.rasterizeTile(WORKER.sharedCanvas(name, shape), task)
+
+
+class TileRenderer:
+    # Renders pages of text by splitting them into tiles that worker
+    # processes rasterize straight into one shared memory canvas. The pool
+    # lives as long as the renderer, close it when done.
+    font: Font
+    fontSize: float
+    letterSpacing: float
+    tileSize: int
+    workers: int
+    local: TileRasterizer
+    executor: Optional[ProcessPoolExecutor]
+
+    def __init__(
+        self,
+        font: Font,
+        fontSize=0.05,
+        letterSpacing=0.0,
+        workers: Optional[int] = None,
+        tileSize: int = TILE_SIZE,
+    ) -> None:
+        self.font = font
+        # Same quarter pixel snapping as Font.drawGlyf
+        quarterPixels, self.fontSize = font.snapFontSize(fontSize)
+        self.letterSpacing = letterSpacing
+        self.tileSize = tileSize
+        self.workers = workers or os.cpu_count() or 1
+        self.local = TileRasterizer(font, self.fontSize)
+        self.executor = None
+
+    def __enter__(self) -> "TileRenderer":
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def layoutPage(self, text: str, width: int, padding: int = 10) -> PageLayout:
+        # Word wrapped lines, one line height apart, inside width pixels
+        font = self.font
+        fontSize = self.fontSize
+        lineHeight = font.headTable.unitsPerEm * fontSize * LINE_SPACING
+        ascent = font.headTable.yMax * fontSize
+        lines = font.layoutParagraph(
+            text, width - 2 * padding, fontSize, self.letterSpacing
+        )
+
+        glyphIds: List[np.ndarray] = []
+        locs: List[np.ndarray] = []
+        boxes: List[np.ndarray] = []
+        runs = {}
+        for row, line in enumerate(lines):
+            if line.text not in runs:
+                runs[line.text] = font.layoutRun(
+                    line.text, fontSize, self.letterSpacing
+                )
+            run = runs[line.text]
+            # The baseline of a glyph is 300 pixels below its loc
+            y = round(padding + ascent + row * lineHeight) - 300
+            glyphIds.append(run.glyphIds)
+            locs.append(np.stack((run.xs + padding, np.full(len(run.xs), y)), axis=1))
+            inked = (run.boxes[:, 2] > run.boxes[:, 0])[:, None]
+            boxes.append(run.boxes + np.where(inked, (padding, y, padding, y), 0))
+
+        height = math.ceil(2 * padding + len(lines) * lineHeight)
+        if not glyphIds:
+            return PageLayout(
+                np.zeros(0, dtype=np.int64),
+                np.zeros((0, 2)),
+                np.zeros((0, 4)),
+                width,
+                height,
+            )
+        return PageLayout(
+            np.concatenate(glyphIds),
+            np.concatenate(locs),
+            np.concatenate(boxes),
+            width,
+            height,
+        )
+
+    def tiles(self, page: PageLayout) -> List[TileTask]:
+        # Tiles with any ink, most glyphs first so the slowest tiles don't
+        # start last. A glyph is listed in every tile it touches.
+        index = SpatialIndex(page.boxes)
+        tasks = []
+        for top in range(0, page.height, self.tileSize):
+            for left in range(0, page.width, self.tileSize):
+                bounds = (
+                    left,
+                    top,
+                    min(left + self.tileSize, page.width),
+                    min(top + self.tileSize, page.height),
+                )
+                # Header boxes can be a pixel short of the masks
+                found = index.query(left - 1, top - 1, bounds[2] + 1, bounds[3] + 1)
+                if len(found):
+                    tasks.append(
+                        TileTask(bounds, page.glyphIds[found], page.locs[found])
+                    )
+        tasks.sort(key=lambda task: -len(task.glyphIds))
+        return tasks
+
+    def renderMask(self, page: PageLayout) -> np.ndarray:
+        # height x width alpha of the whole page
+        with PROFILER.stage("tiles.bin"):
+            tasks = self.tiles(page)
+        shape = (page.height, page.width)
+        if self.workers == 1 or len(tasks) <= 1:
+            canvas = np.zeros(shape, dtype=np.uint8)
+            with PROFILER.stage("tiles.rasterize"):
+                for task in tasks:
+                    self.local.rasterizeTile(canvas, task)
+            return canvas
+
+        if self.executor is None:
+            # Workers share the parent's resource tracker, the parent unlinks
+            # every canvas and worker exits don't unlink it a second time
+            resource_tracker.ensure_running()
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=initWorker,
+                initargs=(self.font, self.fontSize),
+            )
+        # New shared memory is zeroed, tiles without ink are left alone
+        segment = SharedMemory(create=True, size=max(page.height * page.width, 1))
+        try:
+            with PROFILER.stage("tiles.rasterize"):
+                list(
+                    self.executor.map(
+                        rasterizeShared,
+                        [segment.name] * len(tasks),
+                        [shape] * len(tasks),
+                        tasks,
+                    )
+                )
+            return np.ndarray(shape, dtype=np.uint8, buffer=segment.buf).copy()
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def renderImage(
+        self,
+        page: PageLayout,
+        color: Color = Colors.Text.value,
+        background: Optional[Color] = None,
+    ) -> np.ndarray:
+        return colorize(self.renderMask(page), color, background)
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Render a page of text to PNG, rasterizing tiles on every core"
+    )
+    parser.add_argument("font", help="path to a .ttf file")
+    parser.add_argument("text", help="text file to render")
+    parser.add_argument("output", help="path of the .png file")
+    parser.add_argument("-s", "--size", type=float, default=16, help="pixels per em")
+    parser.add_argument("--width", type=int, default=1200, help="page width in pixels")
+    parser.add_argument("--spacing", type=float, default=0.0, help="letter spacing")
+    parser.add_argument("--color", type=parseColor, default=Colors.Text.value)
+    parser.add_argument("--background", type=parseColor, default=None)
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("--tile-size", type=int, default=TILE_SIZE)
+    args = parser.parse_args(arguments)
+
+    font = Font(args.font)
+    text = Path(args.text).read_text(encoding="utf-8")
+    with TileRenderer(
+        font,
+        fontSize=args.size / font.headTable.unitsPerEm,
+        letterSpacing=args.spacing,
+        workers=args.workers,
+        tileSize=args.tile_size,
+    ) as renderer:
+        start = time.perf_counter()
+        page = renderer.layoutPage(text, args.width)
+        image = renderer.renderImage(page, args.color, args.background)
+        seconds = time.perf_counter() - start
+    Path(args.output).write_bytes(pngBytes(image))
+    print(
+        f"rendered {len(page.glyphIds)} glyphs on a {page.width}x{page.height} page "
+        f"with {renderer.workers} workers in {seconds:.3f}s to {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
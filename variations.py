@@ -0,0 +1,440 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from file_reader import BinaryFileReader
+from glyph import Glyph
+import numpy as np
+import struct
+
+# tag, minValue, defaultValue, maxValue (16.16 fixed), flags, axisNameID
+VARIATION_AXIS = struct.Struct(">4siiiHH")
+FIXED = 1 << 16
+F2DOT14 = 1 << 14
+
+# Bits of GlyphVariationData.tupleVariationCount
+SHARED_POINT_NUMBERS = 0x8000
+TUPLE_COUNT_MASK = 0x0FFF
+# Bits of a tuple variation header's tupleIndex
+EMBEDDED_PEAK_TUPLE = 0x8000
+INTERMEDIATE_REGION = 0x4000
+PRIVATE_POINT_NUMBERS = 0x2000
+TUPLE_INDEX_MASK = 0x0FFF
+# Run headers of packed point numbers and packed deltas
+POINTS_ARE_WORDS = 0x80
+POINT_RUN_COUNT_MASK = 0x7F
+DELTAS_ARE_ZERO = 0x80
+DELTAS_ARE_WORDS = 0x40
+DELTA_RUN_COUNT_MASK = 0x3F
+
+# Left, right, top and bottom metrics points after a glyph's own points
+PHANTOM_POINTS = 4
+
+# Normalized location of an instance, one F2Dot14 number per axis. Empty for
+# the default instance.
+Coords = Tuple[int, ...]
+
+
+class InstanceGlyph(NamedTuple):
+    # A glyph at one location. glyph is drawn at the pen like a default
+    # glyph, component is the outline compounds place, without the shift of
+    # the left phantom point. advanceDelta is in font units.
+    glyph: Glyph
+    component: Glyph
+    advanceDelta: float
+
+
+class VariationAxis(NamedTuple):
+    tag: str
+    minValue: float
+    defaultValue: float
+    maxValue: float
+    flags: int
+    axisNameID: int
+
+
+class NamedInstance(NamedTuple):
+    subfamilyNameID: int
+    flags: int
+    coordinates: Tuple[float, ...]
+    postScriptNameID: Optional[int]
+
+
+class FvarTable(NamedTuple):
+    axes: List[VariationAxis]
+    instances: List[NamedInstance]
+
+    def namedLocation(self, index: int) -> Dict[str, float]:
+        # {tag: value} of a named instance, eg. {"wght": 700.0}
+        coordinates = self.instances[index].coordinates
+        return {axis.tag: value for axis, value in zip(self.axes, coordinates)}
+
+
+def parseFvarTable(reader: BinaryFileReader, offset: int) -> FvarTable:
+    reader.goto(offset)
+    majorVersion = reader.parseUint16()
+    minorVersion = reader.parseUint16()
+    axesArrayOffset = reader.parseUint16()
+    reserved = reader.parseUint16()
+    axisCount = reader.parseUint16()
+    axisSize = reader.parseUint16()
+    instanceCount = reader.parseUint16()
+    instanceSize = reader.parseUint16()
+
+    axes: List[VariationAxis] = []
+    for index in range(axisCount):
+        reader.goto(offset + axesArrayOffset + index * axisSize)
+        tag, minValue, defaultValue, maxValue, flags, axisNameID = reader.parseRecords(
+            VARIATION_AXIS, 1
+        )[0]
+        axes.append(
+            VariationAxis(
+                tag.decode("latin-1"),
+                minValue / FIXED,
+                defaultValue / FIXED,
+                maxValue / FIXED,
+                flags,
+                axisNameID,
+            )
+        )
+
+    # Instances follow the axes, the PostScript name id is optional
+    instancesOffset = offset + axesArrayOffset + axisCount * axisSize
+    instances: List[NamedInstance] = []
+    for index in range(instanceCount):
+        reader.goto(instancesOffset + index * instanceSize)
+        subfamilyNameID = reader.parseUint16()
+        flags = reader.parseUint16()
+        coordinates = tuple(
+            value / FIXED for value in reader.parseArray("i", axisCount)
+        )
+        postScriptNameID = None
+        if instanceSize >= 4 * axisCount + 6:
+            postScriptNameID = reader.parseUint16()
+        instances.append(
+            NamedInstance(subfamilyNameID, flags, coordinates, postScriptNameID)
+        )
+    return FvarTable(axes, instances)
+
+
+def parseAvarTable(reader: BinaryFileReader, offset: int) -> List[np.ndarray]:
+    # (fromCoordinate, toCoordinate) maps of every axis, the extra data of
+    # version 2 is not read
+    reader.goto(offset)
+    majorVersion = reader.parseUint16()
+    minorVersion = reader.parseUint16()
+    reserved = reader.parseUint16()
+    axisCount = reader.parseUint16()
+    segmentMaps: List[np.ndarray] = []
+    for _ in range(axisCount):
+        positionMapCount = reader.parseUint16()
+        values = reader.parseInt16Array(2 * positionMapCount)
+        segmentMaps.append(
+            np.asarray(values, dtype=np.float64).reshape(-1, 2) / F2DOT14
+        )
+    return segmentMaps
+
+
+def normalizeLocation(
+    axes: List[VariationAxis],
+    segmentMaps: Optional[List[np.ndarray]],
+    location: Dict[str, float],
+) -> Coords:
+    # User axis values to normalized F2Dot14 coordinates, axes not in
+    # location stay at their default. The value is rounded to F2Dot14 before
+    # and after the avar mapping like the spec does, so nearby values share
+    # their instance.
+    tags = {axis.tag for axis in axes}
+    for tag in location:
+        if tag not in tags:
+            raise ValueError(f"No variation axis {tag!r}, the font has {sorted(tags)}")
+
+    coords = []
+    for index, axis in enumerate(axes):
+        value = min(
+            max(location.get(axis.tag, axis.defaultValue), axis.minValue), axis.maxValue
+        )
+        normalized = 0.0
+        if value < axis.defaultValue:
+            normalized = (value - axis.defaultValue) / (
+                axis.defaultValue - axis.minValue
+            )
+        elif value > axis.defaultValue:
+            normalized = (value - axis.defaultValue) / (
+                axis.maxValue - axis.defaultValue
+            )
+        normalized = round(normalized * F2DOT14) / F2DOT14
+        if segmentMaps and index < len(segmentMaps) and len(segmentMaps[index]):
+            segmentMap = segmentMaps[index]
+            normalized = float(
+                np.interp(normalized, segmentMap[:, 0], segmentMap[:, 1])
+            )
+        coords.append(round(normalized * F2DOT14))
+    return tuple(coords) if any(coords) else ()
+
+
+def tupleScalars(
+    coords: np.ndarray, peaks: np.ndarray, starts: np.ndarray, ends: np.ndarray
+) -> np.ndarray:
+    # How much of each tuple variation applies at coords, the product over
+    # axes of a tent that is 1 at the peak and 0 at the region's ends. Axes
+    # with a zero peak or an invalid region don't limit the tuple.
+    location = coords[None, :]
+    ignored = (
+        (peaks == 0)
+        | (starts > peaks)
+        | (peaks > ends)
+        | ((starts < 0) & (ends > 0))
+        | (location == peaks)
+    )
+    outside = (location <= starts) | (location >= ends)
+    below = location < peaks
+    # Where a side has zero width the point is outside the region anyway
+    lower = np.where(ignored | (peaks == starts), 1, peaks - starts)
+    upper = np.where(ignored | (peaks == ends), 1, peaks - ends)
+    factors = np.where(below, (location - starts) / lower, (location - ends) / upper)
+    factors = np.where(ignored, 1.0, np.where(outside, 0.0, factors))
+    return factors.prod(axis=1)
+
+
+def unpackPoints(data: memoryview, offset: int) -> Tuple[Optional[np.ndarray], int]:
+    # Packed point numbers at offset and the offset after them, None means
+    # every point of the glyph
+    count = data[offset]
+    offset += 1
+    if count == 0:
+        return None, offset
+    if count & POINTS_ARE_WORDS:
+        count = ((count & POINT_RUN_COUNT_MASK) << 8) | data[offset]
+        offset += 1
+
+    runs: List[np.ndarray] = []
+    read = 0
+    while read < count:
+        control = data[offset]
+        offset += 1
+        length = (control & POINT_RUN_COUNT_MASK) + 1
+        dtype = ">u2" if control & POINTS_ARE_WORDS else np.uint8
+        runs.append(np.frombuffer(data, dtype=dtype, count=length, offset=offset))
+        offset += length * np.dtype(dtype).itemsize
+        read += length
+    # Numbers are stored as the difference to the previous one
+    return np.cumsum(np.concatenate(runs)[:count], dtype=np.int64), offset
+
+
+def unpackDeltas(data: memoryview, offset: int, count: int) -> Tuple[np.ndarray, int]:
+    runs: List[np.ndarray] = []
+    read = 0
+    while read < count:
+        control = data[offset]
+        offset += 1
+        length = (control & DELTA_RUN_COUNT_MASK) + 1
+        if control & DELTAS_ARE_ZERO and control & DELTAS_ARE_WORDS:
+            # Both bits set mark 32 bit deltas
+            runs.append(np.frombuffer(data, dtype=">i4", count=length, offset=offset))
+            offset += 4 * length
+        elif control & DELTAS_ARE_ZERO:
+            runs.append(np.zeros(length, dtype=np.int64))
+        elif control & DELTAS_ARE_WORDS:
+            runs.append(np.frombuffer(data, dtype=">i2", count=length, offset=offset))
+            offset += 2 * length
+        else:
+            runs.append(np.frombuffer(data, dtype=np.int8, count=length, offset=offset))
+            offset += length
+        read += length
+    return np.concatenate(runs)[:count].astype(np.float64), offset
+
+
+def interpolateUntouched(
+    points: np.ndarray, endPts: np.ndarray, pointNumbers: np.ndarray, deltas: np.ndarray
+) -> np.ndarray:
+    # Deltas of every point plus the phantom points when only pointNumbers
+    # have one. The rest of a contour moves with its nearest touched points
+    # before and after: between them in x (or y) it's interpolated, outside
+    # them it takes the delta of the closer one. Contours without touched
+    # points and untouched phantom points don't move.
+    numPoints = len(points)
+    result = np.zeros((numPoints + PHANTOM_POINTS, 2))
+    inRange = pointNumbers < len(result)
+    pointNumbers = pointNumbers[inRange]
+    result[pointNumbers] = deltas[inRange]
+    touched = np.zeros(len(result), dtype=bool)
+    touched[pointNumbers] = True
+    touched = touched[:numPoints]
+    if numPoints == 0 or touched.all() or not touched.any():
+        return result
+
+    lengths = np.diff(np.concatenate(([0], endPts.astype(np.int64) + 1)))
+    contourEnds = np.cumsum(lengths)
+    contourStarts = contourEnds - lengths
+    contour = np.repeat(np.arange(len(lengths)), lengths)[:numPoints]
+    index = np.arange(numPoints)
+    touchedIndex = np.flatnonzero(touched)
+    lastTouched = np.full(len(lengths), -1)
+    lastTouched[contour[touchedIndex]] = touchedIndex
+    firstTouched = np.full(len(lengths), -1)
+    firstTouched[contour[touchedIndex[::-1]]] = touchedIndex[::-1]
+
+    # The touched points before and after every point, wrapping around
+    # inside its contour
+    before = np.maximum.accumulate(np.where(touched, index, -1))
+    before = np.where(before < contourStarts[contour], lastTouched[contour], before)
+    after = np.minimum.accumulate(np.where(touched, index, numPoints)[::-1])[::-1]
+    after = np.where(after >= contourEnds[contour], firstTouched[contour], after)
+
+    moved = np.flatnonzero(~touched & (lastTouched[contour] >= 0))
+    coords = points[moved].astype(np.float64)
+    coords1 = points[before[moved]].astype(np.float64)
+    coords2 = points[after[moved]].astype(np.float64)
+    deltas1 = result[before[moved]]
+    deltas2 = result[after[moved]]
+    ordered = coords1 <= coords2
+    low = np.where(ordered, coords1, coords2)
+    high = np.where(ordered, coords2, coords1)
+    lowDeltas = np.where(ordered, deltas1, deltas2)
+    highDeltas = np.where(ordered, deltas2, deltas1)
+    same = low == high
+    span = np.where(same, 1, high - low)
+    interpolated = lowDeltas + (coords - low) * (highDeltas - lowDeltas) / span
+    interpolated = np.where(
+        coords <= low, lowDeltas, np.where(coords >= high, highDeltas, interpolated)
+    )
+    # Touched points in the same place only pass on a delta they agree on
+    interpolated = np.where(
+        same, np.where(deltas1 == deltas2, deltas1, 0), interpolated
+    )
+    result[moved] = interpolated
+    return result
+
+
+class GvarTable:
+    # Header and offsets only, a glyph's variation data is read when an
+    # instance of it is first needed
+    axisCount: int
+    sharedTuples: np.ndarray
+    # Absolute start of every glyph's GlyphVariationData, glyphCount + 1
+    dataOffsets: np.ndarray
+
+    def __init__(
+        self, axisCount: int, sharedTuples: np.ndarray, dataOffsets: np.ndarray
+    ) -> None:
+        self.axisCount = axisCount
+        self.sharedTuples = sharedTuples
+        self.dataOffsets = dataOffsets
+
+    @staticmethod
+    def fromReader(reader: BinaryFileReader, offset: int) -> "GvarTable":
+        reader.load(offset, 20)
+        reader.goto(offset)
+        majorVersion = reader.parseUint16()
+        minorVersion = reader.parseUint16()
+        axisCount = reader.parseUint16()
+        sharedTupleCount = reader.parseUint16()
+        sharedTuplesOffset = reader.parseUint32()
+        glyphCount = reader.parseUint16()
+        flags = reader.parseUint16()
+        glyphVariationDataArrayOffset = reader.parseUint32()
+
+        # Short offsets are stored halved
+        longOffsets = flags & 1
+        reader.load(reader.index, (glyphCount + 1) * (4 if longOffsets else 2))
+        if longOffsets:
+            dataOffsets = np.asarray(
+                reader.parseUint32Array(glyphCount + 1), dtype=np.int64
+            )
+        else:
+            dataOffsets = (
+                np.asarray(reader.parseUint16Array(glyphCount + 1), dtype=np.int64) * 2
+            )
+        dataOffsets += offset + glyphVariationDataArrayOffset
+
+        reader.load(offset + sharedTuplesOffset, 2 * axisCount * sharedTupleCount)
+        reader.goto(offset + sharedTuplesOffset)
+        sharedTuples = (
+            np.asarray(
+                reader.parseInt16Array(axisCount * sharedTupleCount), dtype=np.float64
+            ).reshape(sharedTupleCount, axisCount)
+            / F2DOT14
+        )
+        return GvarTable(axisCount, sharedTuples, dataOffsets)
+
+    def glyphDeltas(
+        self,
+        reader: BinaryFileReader,
+        glyphId: int,
+        coords: Coords,
+        points: np.ndarray,
+        endPts: np.ndarray,
+    ) -> Optional[np.ndarray]:
+        # Summed deltas at coords of a glyph's points followed by its phantom
+        # points, None when no tuple variation applies there. Compounds pass
+        # their component offsets as points, one contour each.
+        if glyphId + 1 >= len(self.dataOffsets):
+            return None
+        start, end = self.dataOffsets[glyphId : glyphId + 2].tolist()
+        if end <= start:
+            return None
+        reader.load(start, end - start)
+        data = reader.buf
+        tupleVariationCount, dataOffset = struct.unpack_from(">HH", data, start)
+        count = tupleVariationCount & TUPLE_COUNT_MASK
+        if count == 0:
+            return None
+
+        # Headers are variable length and are walked one by one, the scalars
+        # of every tuple are then worked out together
+        axisCount = self.axisCount
+        sizes: List[int] = []
+        tupleFlags: List[int] = []
+        peaks = np.empty((count, axisCount))
+        position = start + 4
+        for index in range(count):
+            variationDataSize, tupleIndex = struct.unpack_from(">HH", data, position)
+            position += 4
+            sizes.append(variationDataSize)
+            tupleFlags.append(tupleIndex)
+            if tupleIndex & EMBEDDED_PEAK_TUPLE:
+                peaks[index] = np.frombuffer(data, ">i2", axisCount, position) / F2DOT14
+                position += 2 * axisCount
+            else:
+                peaks[index] = self.sharedTuples[tupleIndex & TUPLE_INDEX_MASK]
+            if tupleIndex & INTERMEDIATE_REGION:
+                position += 4 * axisCount
+        # Without an intermediate region a tuple reaches from 0 to its peak
+        starts = np.minimum(peaks, 0)
+        ends = np.maximum(peaks, 0)
+        position = start + 4
+        for index in range(count):
+            position += 4
+            if tupleFlags[index] & EMBEDDED_PEAK_TUPLE:
+                position += 2 * axisCount
+            if tupleFlags[index] & INTERMEDIATE_REGION:
+                region = np.frombuffer(data, ">i2", 2 * axisCount, position) / F2DOT14
+                starts[index], ends[index] = region[:axisCount], region[axisCount:]
+                position += 4 * axisCount
+        location = np.asarray(coords, dtype=np.float64) / F2DOT14
+        scalars = tupleScalars(location, peaks, starts, ends).tolist()
+        if not any(scalars):
+            return None
+
+        numPoints = len(points) + PHANTOM_POINTS
+        total = np.zeros((numPoints, 2))
+        position = start + dataOffset
+        sharedPoints = None
+        if tupleVariationCount & SHARED_POINT_NUMBERS:
+            sharedPoints, position = unpackPoints(data, position)
+        for size, flags, scalar in zip(sizes, tupleFlags, scalars):
+            tupleEnd = position + size
+            if scalar:
+                pointNumbers = sharedPoints
+                if flags & PRIVATE_POINT_NUMBERS:
+                    pointNumbers, position = unpackPoints(data, position)
+                deltaCount = numPoints if pointNumbers is None else len(pointNumbers)
+                deltas, position = unpackDeltas(data, position, 2 * deltaCount)
+                deltas = deltas.reshape(2, deltaCount).T
+                if pointNumbers is None:
+                    total += deltas * scalar
+                else:
+                    total += (
+                        interpolateUntouched(points, endPts, pointNumbers, deltas)
+                        * scalar
+                    )
+            position = tupleEnd
+        return total